@@ -0,0 +1,81 @@
+import json
+import random
+from datetime import datetime
+
+# Opinion words and fillers mixed into synthetic comments so the sentiment
+# analyzer does real work (modifiers, negations and exclamations included).
+OPINION_WORDS = (
+    'good', 'great', 'amazing', 'excellent', 'love', 'perfect', 'nice', 'happy', 'useful', 'fast',
+    'bad', 'terrible', 'awful', 'poor', 'broken', 'cheap', 'slow', 'disappointing', 'flimsy', 'hate',
+)
+MODIFIERS = ('very', 'really', 'extremely', 'not', 'never', 'quite', 'so')
+FILLER_WORDS = (
+    'the', 'product', 'it', 'was', 'and', 'but', 'arrived', 'after', 'a', 'week', 'battery', 'screen',
+    'price', 'for', 'this', 'quality', 'my', 'kids', 'use', 'daily', 'box', 'shipping', 'with', 'is',
+)
+
+
+def comment_length(rng, distribution, mean_words, max_words):
+    """Draws a comment length in words from the named distribution."""
+    if distribution == 'fixed':
+        words = mean_words
+    elif distribution == 'uniform':
+        words = rng.randint(1, 2 * mean_words)
+    elif distribution == 'lognormal':
+        # Long-tailed, like real reviews: most are short, a few are essays.
+        words = int(rng.lognormvariate(0, 0.75) * mean_words / 1.32)
+    else:
+        raise ValueError(f"Unknown comment length distribution: {distribution}")
+    return max(1, min(words, max_words))
+
+
+def make_comment(rng, words):
+    tokens = []
+    for _ in range(words):
+        roll = rng.random()
+        if roll < 0.15:
+            tokens.append(rng.choice(OPINION_WORDS))
+        elif roll < 0.22:
+            tokens.append(rng.choice(MODIFIERS))
+        else:
+            tokens.append(rng.choice(FILLER_WORDS))
+    comment = ' '.join(tokens).capitalize()
+    return comment + rng.choice(('.', '!', '!!', '?', ' :)', ' :('))
+
+
+def generate_reviews(count, seed=0, distribution='lognormal', mean_words=30, max_words=400,
+                     duplicate_rate=0.0, malformed_rate=0.0):
+    """
+    Returns `count` encoded ProductReviewSubmitted message bodies.
+
+    Args:
+        count (int): Number of messages.
+        seed (int): Random seed, so runs are repeatable.
+        distribution (str): Comment length distribution: fixed, uniform or lognormal.
+        mean_words (int): Mean comment length in words.
+        max_words (int): Upper bound on comment length.
+        duplicate_rate (float): Fraction of messages that redeliver an earlier reviewId.
+        malformed_rate (float): Fraction of messages that are not valid JSON.
+    """
+    rng = random.Random(seed)
+    bodies = []
+    sent = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < malformed_rate:
+            bodies.append(b'{"reviewId": "broken"')
+            continue
+        if sent and roll < malformed_rate + duplicate_rate:
+            bodies.append(rng.choice(sent))
+            continue
+        body = json.dumps({
+            "reviewId": f"rv_bench_{seed}_{i}",
+            "productId": f"prod_{rng.randint(1, 500)}",
+            "userId": f"user_{rng.randint(1, 10000)}",
+            "rating": rng.randint(1, 5),
+            "comment": make_comment(rng, comment_length(rng, distribution, mean_words, max_words)),
+            "timestamp": datetime.utcnow().isoformat()
+        }).encode('utf-8')
+        sent.append(body)
+        bodies.append(body)
+    return bodies
@@ -0,0 +1,123 @@
+"""
+Broker bytes versus CPU for each payload format.
+
+Encodes and decodes the synthetic review corpus, and ReviewProcessed events,
+with every content type / encoding combination whose library is installed, and
+reports the mean body size (and its ratio to plain JSON) alongside the encode
+and decode time per message. Comment lengths follow the corpus's long-tailed
+distribution, at each requested mean. The corpus draws from a small vocabulary,
+so it compresses somewhat better than real reviews do.
+
+Usage:
+    python -m benchmarks.payloads --messages 5000 --mean-words 15,30,120
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.corpus import generate_reviews
+from src import payloads
+
+FORMATS = (
+    (payloads.JSON, None),
+    (payloads.JSON, 'gzip'),
+    (payloads.JSON, 'zstd'),
+    (payloads.MSGPACK, None),
+    (payloads.MSGPACK, 'gzip'),
+    (payloads.MSGPACK, 'zstd'),
+)
+
+
+def available_formats():
+    """The FORMATS whose libraries are installed."""
+    supported = []
+    for content_type, encoding in FORMATS:
+        try:
+            payloads.check_supported(content_type, encoding)
+        except payloads.PayloadError:
+            continue
+        supported.append((content_type, encoding))
+    return supported
+
+
+def measure(records, content_type, encoding):
+    """Returns size and per-message encode/decode cost of `records` in one format."""
+    started = time.perf_counter()
+    bodies = [payloads.dumps(record, content_type, encoding)[0] for record in records]
+    encode_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    for body in bodies:
+        payloads.loads(body, content_type, encoding)
+    decode_seconds = time.perf_counter() - started
+    total = sum(len(body) for body in bodies)
+    return {
+        'mean_bytes': round(total / len(bodies), 1),
+        'encode_us': round(encode_seconds / len(bodies) * 1e6, 2),
+        'decode_us': round(decode_seconds / len(bodies) * 1e6, 2),
+    }
+
+
+def run(messages=5000, mean_words=(15, 30, 120), seed=0, formats=None):
+    """
+    Measures every format on reviews at each mean comment length, and on events.
+
+    Returns:
+        dict: {workload: {"<content_type>+<encoding>": result}}, where each result
+        also has `ratio`, its size relative to plain JSON.
+    """
+    formats = available_formats() if formats is None else formats
+    workloads = {}
+    for words in mean_words:
+        bodies = generate_reviews(messages, seed=seed, mean_words=words, max_words=max(400, words * 4))
+        workloads[f"reviews_{words}w"] = [json.loads(body) for body in bodies]
+    now = datetime.utcnow().isoformat()
+    workloads['events'] = [
+        {"reviewId": review['reviewId'], "sentiment": "POSITIVE", "processedTimestamp": now}
+        for review in workloads[f"reviews_{mean_words[0]}w"]
+    ]
+
+    report = {}
+    for name, records in workloads.items():
+        results = {}
+        for content_type, encoding in formats:
+            results[f"{content_type}+{encoding or 'identity'}"] = measure(records, content_type, encoding)
+        baseline = results.get(f"{payloads.JSON}+identity")
+        for result in results.values():
+            result['ratio'] = round(result['mean_bytes'] / baseline['mean_bytes'], 3) if baseline else None
+        report[name] = results
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--mean-words', default='15,30,120', help="Comma-separated mean comment lengths in words")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write the JSON report here")
+    args = parser.parse_args(argv)
+
+    mean_words = tuple(int(words) for words in args.mean_words.split(',') if words)
+    report = run(args.messages, mean_words, args.seed)
+    skipped = [f"{t}+{e or 'identity'}" for t, e in FORMATS if (t, e) not in available_formats()]
+    if skipped:
+        print(f"Skipped (library not installed): {', '.join(skipped)}")
+
+    for name, results in report.items():
+        print(name)
+        for fmt, result in results.items():
+            print(f"  {fmt:30s} {result['mean_bytes']:>9.1f} B  x{result['ratio']:<6}  "
+                  f"encode {result['encode_us']:>7.2f}us  decode {result['decode_us']:>7.2f}us")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
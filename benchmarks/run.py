@@ -0,0 +1,217 @@
+"""
+Throughput/latency benchmarks for the review processor.
+
+Runs the real process_message / process_batch / EventPublisher / analyze_sentiment
+code against an in-memory channel and a SQLite (or any SQLAlchemy URL) database,
+driven by a synthetic review corpus. Each scenario runs in a fresh process so its
+peak RSS is its own.
+
+Usage:
+    python -m benchmarks.run --messages 5000 --output baseline.json
+    python -m benchmarks.run --messages 5000 --baseline baseline.json --tolerance 0.15
+
+Numbers depend on the machine, so no baseline is committed: record one (first
+command) on the machine that will run the comparison, with the same options.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.corpus import generate_reviews
+from benchmarks.stand_ins import InMemoryChannel, Method
+
+SCENARIOS = ('single', 'batch', 'sentiment', 'sentiment_batch')
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS.
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _summarize(latencies, elapsed, messages):
+    latencies_ms = np.asarray(latencies) * 1000.0
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99]) if len(latencies_ms) else (0.0, 0.0, 0.0)
+    return {
+        'messages': messages,
+        'seconds': round(elapsed, 4),
+        'msgs_per_sec': round(messages / elapsed, 1) if elapsed else 0.0,
+        'latency_ms': {'p50': round(float(p50), 4), 'p95': round(float(p95), 4), 'p99': round(float(p99), 4)},
+        'peak_rss_mb': round(_peak_rss_mb(), 1),
+    }
+
+
+def _consumer(database_url):
+    """Imports the consumer against a fresh database and returns (consumer module, deduplicator)."""
+    from src import database
+    database.configure_engine(database_url)
+    database.init_db()
+
+    import src.consumer as consumer
+    from src.dedup import ReviewDeduplicator
+    # Malformed messages log an error each; keep the console quiet while timing.
+    logging.disable(logging.CRITICAL)
+    return consumer, ReviewDeduplicator() if consumer.DEDUP_ENABLED else None
+
+
+def run_scenario(name, options):
+    """Runs one scenario and returns its summary. Executed in a child process."""
+    bodies = generate_reviews(
+        options['messages'], seed=options['seed'], distribution=options['distribution'],
+        mean_words=options['mean_words'], max_words=options['max_words'],
+        duplicate_rate=options['duplicate_rate'], malformed_rate=options['malformed_rate'],
+    )
+    from src.sentiment import analyze_sentiment, analyze_sentiment_batch, sentiment_cache, warm_up
+    warm_up(vectorized=True)
+    sentiment_cache.clear()
+    batch_size = options['batch_size']
+    latencies = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = options['database_url'] or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+
+        if name in ('single', 'batch'):
+            consumer, deduplicator = _consumer(database_url)
+            from src.publisher import EventPublisher
+            channel = InMemoryChannel()
+            publisher = EventPublisher(channel)
+            deliveries = [(Method(tag), None, body) for tag, body in enumerate(bodies, start=1)]
+
+            started = time.perf_counter()
+            if name == 'single':
+                for method, properties, body in deliveries:
+                    t0 = time.perf_counter()
+                    consumer.process_message(channel, method, properties, body, publisher, deduplicator)
+                    latencies.append(time.perf_counter() - t0)
+            else:
+                for i in range(0, len(deliveries), batch_size):
+                    batch = deliveries[i:i + batch_size]
+                    t0 = time.perf_counter()
+                    consumer.process_batch(channel, batch, publisher, deduplicator)
+                    # Every message in a batch waits for the whole batch.
+                    latencies.extend([time.perf_counter() - t0] * len(batch))
+            elapsed = time.perf_counter() - started
+        else:
+            comments = []
+            for body in bodies:
+                try:
+                    comments.append(json.loads(body).get('comment', ''))
+                except ValueError:
+                    continue
+            started = time.perf_counter()
+            if name == 'sentiment':
+                for comment in comments:
+                    t0 = time.perf_counter()
+                    analyze_sentiment(comment)
+                    latencies.append(time.perf_counter() - t0)
+            else:
+                for i in range(0, len(comments), batch_size):
+                    chunk = comments[i:i + batch_size]
+                    t0 = time.perf_counter()
+                    analyze_sentiment_batch(chunk)
+                    latencies.extend([time.perf_counter() - t0] * len(chunk))
+            elapsed = time.perf_counter() - started
+            bodies = comments
+
+    return _summarize(latencies, elapsed, len(bodies))
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compares results with a baseline report.
+
+    Returns:
+        list: One message per regression (throughput down, or p95/p99 latency up,
+        by more than `tolerance`, a fraction).
+    """
+    regressions = []
+    for name, current in results['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if previous is None:
+            continue
+        if current['msgs_per_sec'] < previous['msgs_per_sec'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {current['msgs_per_sec']} msgs/s < baseline {previous['msgs_per_sec']}")
+        for percentile in ('p95', 'p99'):
+            now, then = current['latency_ms'][percentile], previous['latency_ms'][percentile]
+            if now > then * (1 + tolerance):
+                regressions.append(f"{name}: {percentile} latency {now}ms > baseline {then}ms")
+    return regressions
+
+
+def run(options, scenarios=SCENARIOS):
+    """Runs each scenario in its own process and returns the full report."""
+    report = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': 'sqlite' if not options['database_url'] else options['database_url'].split(':', 1)[0],
+            'options': {k: v for k, v in options.items() if k != 'database_url'},
+        },
+        'results': {},
+    }
+    for name in scenarios:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+            report['results'][name] = pool.submit(run_scenario, name, options).result()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"Comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument('--distribution', default='lognormal', choices=('fixed', 'uniform', 'lognormal'))
+    parser.add_argument('--mean-words', type=int, default=30)
+    parser.add_argument('--max-words', type=int, default=400)
+    parser.add_argument('--duplicate-rate', type=float, default=0.02)
+    parser.add_argument('--malformed-rate', type=float, default=0.01)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--database-url', default='', help="SQLAlchemy URL; a temporary SQLite file by default")
+    parser.add_argument('--output', help="Write the JSON report here")
+    parser.add_argument('--baseline', help="Compare against this JSON report and fail on regressions")
+    parser.add_argument('--tolerance', type=float, default=0.10)
+    args = parser.parse_args(argv)
+    if args.baseline and not os.path.exists(args.baseline):
+        parser.error(f"baseline {args.baseline} not found; record one first with --output {args.baseline}")
+
+    options = {
+        'messages': args.messages, 'distribution': args.distribution, 'mean_words': args.mean_words,
+        'max_words': args.max_words, 'duplicate_rate': args.duplicate_rate, 'malformed_rate': args.malformed_rate,
+        'batch_size': args.batch_size, 'seed': args.seed, 'database_url': args.database_url,
+    }
+    report = run(options, [s for s in args.scenarios.split(',') if s])
+
+    for name, result in report['results'].items():
+        latency = result['latency_ms']
+        print(f"{name:16s} {result['msgs_per_sec']:>10.1f} msgs/s  p50 {latency['p50']:.3f}ms  "
+              f"p95 {latency['p95']:.3f}ms  p99 {latency['p99']:.3f}ms  peak RSS {result['peak_rss_mb']:.1f}MB")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,40 @@
+from collections import namedtuple
+
+Method = namedtuple('Method', ['delivery_tag'])
+
+
+class InMemoryChannel:
+    """
+    An AMQP channel stand-in for benchmarks: records acks, rejects and publishes.
+
+    Implements the calls made by process_message, process_batch and EventPublisher
+    without any network I/O, so measurements cover only the consumer's own work.
+    """
+
+    def __init__(self):
+        self.acked = 0
+        self.rejected = 0
+        self.published = 0
+        self.published_bytes = 0
+
+    def exchange_declare(self, **kwargs):
+        pass
+
+    def queue_declare(self, **kwargs):
+        pass
+
+    def queue_bind(self, **kwargs):
+        pass
+
+    def basic_qos(self, **kwargs):
+        pass
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        self.published += 1
+        self.published_bytes += len(body)
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        self.acked += 1
+
+    def basic_reject(self, delivery_tag, requeue=True):
+        self.rejected += 1
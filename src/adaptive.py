@@ -0,0 +1,211 @@
+import logging
+import os
+import time
+
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+# Adaptive Tuning Configuration
+ADAPTIVE_ENABLED = os.getenv('ADAPTIVE_ENABLED', 'false').lower() == 'true'
+ADAPTIVE_INTERVAL = float(os.getenv('ADAPTIVE_INTERVAL', '5'))
+ADAPTIVE_TARGET_LATENCY_MS = float(os.getenv('ADAPTIVE_TARGET_LATENCY_MS', '1000'))
+ADAPTIVE_TARGET_COMMIT_MS = float(os.getenv('ADAPTIVE_TARGET_COMMIT_MS', '200'))
+ADAPTIVE_PREFETCH_MIN = int(os.getenv('ADAPTIVE_PREFETCH_MIN', '1'))
+ADAPTIVE_PREFETCH_MAX = int(os.getenv('ADAPTIVE_PREFETCH_MAX', '500'))
+ADAPTIVE_PREFETCH_STEP = int(os.getenv('ADAPTIVE_PREFETCH_STEP', '5'))
+ADAPTIVE_BATCH_MIN = int(os.getenv('ADAPTIVE_BATCH_MIN', '1'))
+ADAPTIVE_BATCH_MAX = int(os.getenv('ADAPTIVE_BATCH_MAX', '500'))
+ADAPTIVE_BATCH_STEP = int(os.getenv('ADAPTIVE_BATCH_STEP', '5'))
+ADAPTIVE_DECREASE_FACTOR = float(os.getenv('ADAPTIVE_DECREASE_FACTOR', '0.5'))
+# Prefetch only grows while at least this fraction of it is unacked, i.e. while it is the bottleneck.
+ADAPTIVE_SATURATION = float(os.getenv('ADAPTIVE_SATURATION', '0.8'))
+# Restarting the consumers requeues every prefetched but undispatched message, so a new prefetch is
+# only applied once it differs from the running one by this fraction (or reaches MIN/MAX), and
+# increases are applied at most every ADAPTIVE_RESTART_INTERVAL seconds.
+ADAPTIVE_RESTART_RATIO = float(os.getenv('ADAPTIVE_RESTART_RATIO', '0.25'))
+ADAPTIVE_RESTART_INTERVAL = float(os.getenv('ADAPTIVE_RESTART_INTERVAL', '60'))
+
+
+class AIMD:
+    """An additive-increase/multiplicative-decrease value kept within [floor, ceiling]."""
+
+    def __init__(self, value, floor, ceiling, step, factor=ADAPTIVE_DECREASE_FACTOR):
+        self.floor = floor
+        self.ceiling = max(ceiling, floor)
+        self.step = step
+        self.factor = factor
+        self.value = self.clamp(value)
+
+    def clamp(self, value):
+        return max(self.floor, min(self.ceiling, int(value)))
+
+    def increase(self):
+        self.value = self.clamp(self.value + self.step)
+        return self.value
+
+    def decrease(self):
+        self.value = self.clamp(self.value * self.factor)
+        return self.value
+
+
+class _WindowMean:
+    """Mean of a histogram child's observations since the previous call."""
+
+    def __init__(self, child):
+        self.child = child
+        self.count, self.sum = self._totals()
+
+    def _totals(self):
+        return sum(self.child.counts), self.child.sum
+
+    def take(self):
+        count, total = self._totals()
+        observed, elapsed = count - self.count, total - self.sum
+        self.count, self.sum = count, total
+        return observed, (elapsed / observed if observed else None)
+
+
+class AdaptiveTuner:
+    """
+    Tunes consumer prefetch (and the micro-batch size, when batching) from observed latency.
+
+    Every `interval` seconds it looks at the mean end-to-end processing time
+    (delivery to ack, review_processing_seconds), the mean DB commit time and the
+    number of unacked deliveries, then applies an AIMD rule:
+
+    - latency or commit time above target: multiply prefetch and batch size by
+      the decrease factor (the DB or the consumer is overloaded);
+    - otherwise, if unacked deliveries fill at least ADAPTIVE_SATURATION of the
+      live window, prefetch is what limits throughput, so add one step to each;
+    - otherwise (idle, or the queue cannot keep the consumer busy) hold.
+
+    Unacked deliveries only build up when the consumer hands them off (batching,
+    the scoring pool); one-at-a-time processing never has more than one, so
+    main() does not tune it. A new prefetch is applied by restarting the
+    consumers with their new windows (consumers.set_prefetch), since RabbitMQ
+    fixes a consumer's window when it starts. A restart requeues whatever was
+    prefetched but not yet dispatched, so the prefetch value moves every step
+    but is only applied once it differs from the running one by `restart_ratio`
+    (or reaches its floor or ceiling); increases are applied at most every
+    `restart_interval` seconds, decreases straight away. The batch size never exceeds the
+    live window, the most one consumer can be sent, or a batch could only flush
+    on its timeout. Runs on the connection thread via connection.call_later. Current
+    values are exported as review_prefetch_count / review_batch_size, every
+    decision as review_adaptive_adjustments_total{direction,reason}, and changes
+    are logged with their reason.
+
+    Args:
+        connection: The BlockingConnection, used for call_later.
+        channel: The MeteredChannel the consumer acks through (for unsettled).
+        prefetch (AIMD): Prefetch controller.
+        consumers: The LaneConsumers whose prefetch windows are tuned.
+        batcher: Optional ReviewBatcher whose max_size is tuned.
+        batch (AIMD): Batch size controller, required with a batcher.
+        restart_ratio (float): Smallest relative prefetch change worth restarting the consumers for.
+        restart_interval (float): Minimum seconds between restarts that increase prefetch.
+    """
+
+    def __init__(self, connection, channel, prefetch, consumers, batcher=None, batch=None, interval=ADAPTIVE_INTERVAL,
+                 target_latency_ms=ADAPTIVE_TARGET_LATENCY_MS, target_commit_ms=ADAPTIVE_TARGET_COMMIT_MS,
+                 saturation=ADAPTIVE_SATURATION, restart_ratio=ADAPTIVE_RESTART_RATIO,
+                 restart_interval=ADAPTIVE_RESTART_INTERVAL):
+        self.connection = connection
+        self.channel = channel
+        self.prefetch = prefetch
+        self.consumers = consumers
+        self.window = prefetch.value
+        self.applied = None  # prefetch the running consumers were started with
+        self.restart_ratio = restart_ratio
+        self.restart_interval = restart_interval
+        self._restarted_at = None
+        self.batcher = batcher
+        self.batch = batch
+        self.interval = interval
+        self.target_latency = target_latency_ms / 1000.0
+        self.target_commit = target_commit_ms / 1000.0
+        self.saturation = saturation
+        self._latency = _WindowMean(metrics.PROCESSING_SECONDS.labels())
+        self._commit = _WindowMean(metrics.STAGE_COMMIT)
+
+    def start(self):
+        """Applies the initial values and schedules the first adjustment."""
+        self._apply()
+        self.connection.call_later(self.interval, self._tick)
+
+    def _tick(self):
+        try:
+            self.adjust()
+        except Exception as e:
+            logger.warning(f"Adaptive tuning failed: {e}")
+        finally:
+            self.connection.call_later(self.interval, self._tick)
+
+    def adjust(self):
+        """
+        Runs one AIMD step.
+
+        Returns:
+            tuple: (direction, reason), e.g. ('decrease', 'latency').
+        """
+        processed, latency = self._latency.take()
+        _, commit = self._commit.take()
+        unacked = self.channel.unsettled
+
+        if not processed:
+            direction, reason, detail = 'hold', 'idle', "no messages settled"
+        elif latency > self.target_latency:
+            direction, reason = 'decrease', 'latency'
+            detail = f"latency {latency * 1000:.0f}ms > {self.target_latency * 1000:.0f}ms target"
+        elif commit is not None and commit > self.target_commit:
+            direction, reason = 'decrease', 'commit'
+            detail = f"commit {commit * 1000:.0f}ms > {self.target_commit * 1000:.0f}ms target"
+        elif unacked >= self.window * self.saturation:
+            direction, reason = 'increase', 'saturated'
+            detail = f"{unacked} of {self.window} prefetched unacked, latency {latency * 1000:.0f}ms"
+        else:
+            direction, reason = 'hold', 'underutilised'
+            detail = f"only {unacked} of {self.window} prefetched unacked"
+
+        metrics.ADAPTIVE_ADJUSTMENTS.labels(direction, reason).inc()
+        if direction == 'hold':
+            return direction, reason
+
+        before = (self.applied, self.batch.value if self.batch else None)
+        step = AIMD.increase if direction == 'increase' else AIMD.decrease
+        step(self.prefetch)
+        if self.batch is not None:
+            step(self.batch)
+        self._apply(direction)
+        after = (self.applied, self.batch.value if self.batch else None)
+        if after != before:
+            batch_change = f", batch {before[1]} -> {after[1]}" if self.batch is not None else ""
+            logger.info(f"Adaptive: prefetch {before[0]} -> {after[0]}{batch_change} ({detail}).")
+        elif self.prefetch.value != self.applied:
+            logger.debug(f"Adaptive: prefetch {self.applied} -> {self.prefetch.value} deferred ({detail}).")
+        return direction, reason
+
+    def _should_restart(self, direction):
+        target = self.prefetch.value
+        if self.applied is None:
+            return True
+        if target == self.applied:
+            return False
+        if (direction == 'increase' and self._restarted_at is not None
+                and time.monotonic() - self._restarted_at < self.restart_interval):
+            return False
+        if target in (self.prefetch.floor, self.prefetch.ceiling):
+            return True
+        return abs(target - self.applied) >= self.restart_ratio * self.applied
+
+    def _apply(self, direction=None):
+        if self._should_restart(direction):
+            self.window = self.consumers.set_prefetch(self.prefetch.value)
+            self.applied = self.prefetch.value
+            self._restarted_at = time.monotonic()
+        if self.batch is not None:
+            # A batch larger than the broker will deliver can only ever flush on its timeout.
+            self.batch.value = min(self.batch.value, self.window)
+            self.batcher.max_size = self.batch.value
+            metrics.BATCH_SIZE.set(self.batch.value)
+        metrics.PREFETCH.set(self.applied)
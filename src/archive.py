@@ -0,0 +1,210 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import text
+
+# Add the current directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src import database
+from src.database import REVIEW_COLUMNS, add_months, month_start
+from src.logs import configure_logging
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# Archive Configuration
+ARCHIVE_AFTER_MONTHS = int(os.getenv('ARCHIVE_AFTER_MONTHS', '12'))
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', 'archive')
+ARCHIVE_ROWS_PER_FILE = int(os.getenv('ARCHIVE_ROWS_PER_FILE', '500000'))
+# `partitions --interval` default: seconds between passes of the partition-maintenance service.
+PARTITION_MAINTENANCE_INTERVAL = float(os.getenv('PARTITION_MAINTENANCE_INTERVAL', '86400'))
+
+TEXT_COLUMNS = ('review_id', 'product_id', 'user_id', 'comment')
+
+
+def encode_columns(rows):
+    """
+    Lays out review rows column by column as NumPy arrays.
+
+    Text columns become one UTF-8 byte buffer plus an offsets array (so a column
+    costs its text plus 8 bytes a row, however long the longest value is),
+    sentiment becomes codes into a small label table, rating a small integer and
+    processed_timestamp datetime64[us].
+
+    Args:
+        rows (list): Tuples in REVIEW_COLUMNS order.
+
+    Returns:
+        dict: Array name to array, as written by np.savez_compressed.
+    """
+    columns = dict(zip(REVIEW_COLUMNS, zip(*rows))) if rows else {name: () for name in REVIEW_COLUMNS}
+    arrays = {}
+    for name in TEXT_COLUMNS:
+        encoded = [value.encode('utf-8') for value in columns[name]]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        arrays[f'{name}_data'] = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        arrays[f'{name}_offsets'] = offsets
+    labels = sorted(set(columns['sentiment']))
+    codes = {label: code for code, label in enumerate(labels)}
+    arrays['sentiment_labels'] = np.array(labels, dtype=str)
+    arrays['sentiment_codes'] = np.array([codes[value] for value in columns['sentiment']], dtype=np.uint8)
+    arrays['rating'] = np.array(columns['rating'], dtype=np.int16)
+    arrays['processed_timestamp'] = np.array(columns['processed_timestamp'], dtype='datetime64[us]')
+    return arrays
+
+
+def decode_columns(arrays):
+    """Turns arrays written by encode_columns back into review dicts."""
+    texts = {}
+    for name in TEXT_COLUMNS:
+        data, offsets = arrays[f'{name}_data'].tobytes(), arrays[f'{name}_offsets']
+        texts[name] = [data[start:end].decode('utf-8') for start, end in zip(offsets[:-1], offsets[1:])]
+    labels = arrays['sentiment_labels'].tolist()
+    return [
+        {
+            'review_id': texts['review_id'][i],
+            'product_id': texts['product_id'][i],
+            'user_id': texts['user_id'][i],
+            'rating': int(rating),
+            'comment': texts['comment'][i],
+            'sentiment': labels[code],
+            'processed_timestamp': timestamp.astype(datetime),
+        }
+        for i, (rating, code, timestamp) in enumerate(
+            zip(arrays['rating'], arrays['sentiment_codes'], arrays['processed_timestamp']))
+    ]
+
+
+def write_archive_file(path, rows):
+    """Writes rows to a compressed .npz file, atomically, and checks it reads back whole."""
+    partial = f"{path}.partial"
+    with open(partial, 'wb') as f:
+        np.savez_compressed(f, **encode_columns(rows))
+    with np.load(partial) as arrays:
+        if len(arrays['review_id_offsets']) - 1 != len(rows):
+            raise IOError(f"{partial} does not hold the {len(rows)} rows written to it")
+    os.replace(partial, path)
+
+
+def read_archive(directory, name):
+    """Yields the reviews archived from partition `name`, file by file."""
+    with open(os.path.join(directory, f"{name}.json")) as f:
+        manifest = json.load(f)
+    for file_name in manifest['files']:
+        with np.load(os.path.join(directory, file_name)) as arrays:
+            yield from decode_columns(arrays)
+
+
+def cold_partitions(partitions, after_months=ARCHIVE_AFTER_MONTHS, now=None):
+    """
+    Picks the partitions old enough to archive.
+
+    Args:
+        partitions (list): (month, name) tuples, as from list_review_partitions.
+        after_months (int): Keep this many whole months before the current one.
+
+    Returns:
+        list: The (month, name) tuples of partitions entirely older than that.
+    """
+    cutoff = add_months(month_start(now or datetime.utcnow()), -after_months)
+    return [(month, name) for month, name in partitions if month < cutoff]
+
+
+def archive_partition(engine, name, directory=ARCHIVE_DIR, rows_per_file=ARCHIVE_ROWS_PER_FILE, drop=True):
+    """
+    Exports one partition to .npz files in `directory` and detaches it.
+
+    Rows are streamed into files of up to `rows_per_file` rows. A JSON manifest
+    listing the files and the row count is written last, and the partition is
+    detached (and dropped, unless `drop` is False) only after that.
+
+    Returns:
+        int: The number of rows archived.
+    """
+    os.makedirs(directory, exist_ok=True)
+    files = []
+    rows_archived = 0
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(
+            text(f"SELECT {', '.join(REVIEW_COLUMNS)} FROM {name}")
+        )
+        for rows in result.partitions(rows_per_file):
+            file_name = f"{name}.{len(files):04d}.npz"
+            write_archive_file(os.path.join(directory, file_name), [tuple(row) for row in rows])
+            files.append(file_name)
+            rows_archived += len(rows)
+
+    manifest = {'partition': name, 'rows': rows_archived, 'files': files, 'columns': list(REVIEW_COLUMNS),
+                'archived_at': datetime.utcnow().isoformat()}
+    with open(os.path.join(directory, f"{name}.json.partial"), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(os.path.join(directory, f"{name}.json.partial"), os.path.join(directory, f"{name}.json"))
+
+    with engine.begin() as connection:
+        database.detach_review_partition(connection, name, drop=drop)
+    logger.info(f"Archived {rows_archived} reviews from {name} to {len(files)} files in {directory}.")
+    return rows_archived
+
+
+def maintain_partitions(engine, interval=PARTITION_MAINTENANCE_INTERVAL, sleep=time.sleep):
+    """
+    Creates upcoming monthly partitions every `interval` seconds, forever.
+
+    Any pass well within PARTITION_MONTHS_AHEAD months of the previous one keeps
+    writes out of the default partition; a failed pass (e.g. the database is
+    restarting) is logged and retried at the next interval.
+    """
+    while True:
+        try:
+            with engine.begin() as connection:
+                database.ensure_review_partitions(connection)
+        except Exception as e:
+            logger.error(f"Partition maintenance failed: {e}. Retrying in {interval:.0f}s.")
+        sleep(interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the monthly processed_reviews partitions.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    partitions = commands.add_parser('partitions', help="Create upcoming monthly partitions (run at least monthly)")
+    partitions.add_argument('--interval', type=float, nargs='?', const=PARTITION_MAINTENANCE_INTERVAL,
+                            help="Keep running, creating partitions every INTERVAL seconds "
+                                 f"(default {PARTITION_MAINTENANCE_INTERVAL:.0f})")
+    archive = commands.add_parser('archive', help="Export cold partitions to .npz files and detach them")
+    archive.add_argument('--after-months', type=int, default=ARCHIVE_AFTER_MONTHS,
+                         help="Archive partitions older than this many months")
+    archive.add_argument('--directory', default=ARCHIVE_DIR)
+    archive.add_argument('--keep-detached', action='store_true',
+                         help="Keep the detached tables instead of dropping them")
+    commands.add_parser('migrate', help="Convert a processed_reviews table created before partitioning")
+    args = parser.parse_args(argv)
+
+    if args.command == 'migrate':
+        with database.engine.begin() as connection:
+            moved = database.partition_legacy_reviews(connection)
+        logger.info(f"Moved {moved} reviews into the partitioned processed_reviews.")
+
+    # Also creates the upcoming partitions, and the id registry on first run.
+    database.init_db()
+    if args.command == 'archive':
+        with database.engine.connect() as connection:
+            partitions = database.list_review_partitions(connection)
+        cold = cold_partitions(partitions, args.after_months)
+        for _, name in cold:
+            archive_partition(database.engine, name, args.directory, drop=not args.keep_detached)
+        if not cold:
+            logger.info("No partitions old enough to archive.")
+    elif args.command == 'partitions' and args.interval:
+        maintain_partitions(database.engine, args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,400 @@
+import asyncio
+import logging
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from src import metrics
+from src.database import add_outbox_events, bulk_insert_reviews, fetch_existing_review_ids, increment_product_rollups, SessionLocal
+from src.logs import sampled
+from src.retry import dead_letter, retry_or_reject
+from src.schema import InvalidMessage, ReviewMessage
+from src.sentiment import analyze_sentiment
+
+logger = logging.getLogger(__name__)
+
+# Asyncio Engine Configuration
+ASYNC_QUEUE_SIZE = int(os.getenv('ASYNC_QUEUE_SIZE', '256'))
+ASYNC_SCORE_CONCURRENCY = int(os.getenv('ASYNC_SCORE_CONCURRENCY', '4'))
+ASYNC_PERSIST_BATCH = int(os.getenv('ASYNC_PERSIST_BATCH', '100'))
+
+# `queue` is the queue the delivery was consumed from.
+Delivery = namedtuple('Delivery', ['delivery_tag', 'body', 'properties', 'routing_key', 'queue'],
+                      defaults=(None, None))
+
+_STOP = object()
+
+
+def _event(row):
+    return {
+        "reviewId": row['review_id'],
+        "sentiment": row['sentiment'],
+        "processedTimestamp": row['processed_timestamp'].isoformat()
+    }
+
+
+class PikaBroker:
+    """
+    Adapts a pika BlockingConnection, running on its own thread, to the asyncio engine.
+
+    Deliveries are forwarded into the event loop with call_soon_threadsafe; acks,
+    rejects and publishes are marshalled back onto the connection thread with
+    connection.add_callback_threadsafe, the only thread-safe BlockingConnection call.
+    """
+
+    def __init__(self, connect, setup_queues, queue_names, publisher_factory, prefetch_count, on_delivery=None,
+                 retry_queue=None, dead_letter_exchange=None, bulk_queues=(), lane_prefetch=None):
+        self._connect = connect
+        self._bulk_queues = list(bulk_queues)
+        self._lane_prefetch = lane_prefetch
+        self._retry_queue = retry_queue
+        self._dead_letter_exchange = dead_letter_exchange
+        self._on_delivery = on_delivery
+        self._setup_queues = setup_queues
+        self._queue_names = list(queue_names)
+        self._publisher_factory = publisher_factory
+        self._prefetch_count = prefetch_count
+        self._loop = None
+        self._incoming = None
+        self._ready = threading.Event()
+        self._startup_error = None
+        self.connection = None
+        self.channel = None
+        self.publisher = None
+
+    async def start(self):
+        """Starts the connection thread and waits until it is consuming; re-raises its startup error."""
+        self._loop = asyncio.get_running_loop()
+        self._incoming = asyncio.Queue()
+        threading.Thread(target=self._run, name='pika-io', daemon=True).start()
+        await self._loop.run_in_executor(None, self._ready.wait)
+        if self._startup_error is not None:
+            raise self._startup_error
+
+    def _run(self):
+        try:
+            self._open()
+        except BaseException as e:
+            self._startup_error = e
+            return
+        finally:
+            self._ready.set()
+        try:
+            self.channel.start_consuming()
+        finally:
+            self._loop.call_soon_threadsafe(self._incoming.put_nowait, _STOP)
+
+    def _open(self):
+        """Connects, declares the queues and starts the consumers."""
+        self.connection = self._connect()
+        channel = self.connection.channel()
+        self._setup_queues(channel)
+        # Events get their own channel, so retry and DLQ republishes cannot shift its confirm tags.
+        self.publisher = self._publisher_factory(self.connection.channel())
+        # Acks and rejects go through the metered channel so outcomes and in-flight are counted.
+        self.channel = metrics.MeteredChannel(channel)
+        if self._bulk_queues and self._lane_prefetch is not None:
+            live, bulk = self._lane_prefetch(self._prefetch_count)
+        else:
+            live, bulk = self._prefetch_count, self._prefetch_count
+        # basic_qos applies to consumers started after it, so each lane gets its own window.
+        channel.basic_qos(prefetch_count=live)
+        for queue in self._queue_names:
+            channel.basic_consume(queue=queue, on_message_callback=self._on_message, consumer_tag=queue)
+        if self._bulk_queues:
+            channel.basic_qos(prefetch_count=bulk)
+            for queue in self._bulk_queues:
+                channel.basic_consume(queue=queue, on_message_callback=self._on_message, consumer_tag=queue)
+        metrics.QueueDepthSampler(self.connection, channel, self._queue_names, background=self._bulk_queues).start()
+
+    def _on_message(self, ch, method, properties, body):
+        if self._on_delivery is not None:
+            self._on_delivery()
+        self.channel.track(method.delivery_tag)
+        # Consumers are tagged with their queue's name.
+        delivery = Delivery(method.delivery_tag, body, properties, method.routing_key, method.consumer_tag)
+        self._loop.call_soon_threadsafe(self._incoming.put_nowait, delivery)
+
+    async def deliveries(self):
+        while True:
+            delivery = await self._incoming.get()
+            if delivery is _STOP:
+                return
+            yield delivery
+
+    def _call(self, fn):
+        """Runs fn on the connection thread and returns an awaitable for its result."""
+        future = self._loop.create_future()
+
+        def run():
+            try:
+                result = fn()
+            except Exception as e:
+                self._loop.call_soon_threadsafe(future.set_exception, e)
+            else:
+                self._loop.call_soon_threadsafe(future.set_result, result)
+
+        self.connection.add_callback_threadsafe(run)
+        return future
+
+    async def ack(self, delivery_tag):
+        await self._call(lambda: self.channel.basic_ack(delivery_tag=delivery_tag))
+
+    async def reject(self, delivery_tag, requeue=False):
+        await self._call(lambda: self.channel.basic_reject(delivery_tag=delivery_tag, requeue=requeue))
+
+    async def retry_or_reject(self, delivery, error):
+        """Sends a failed delivery to a delayed retry queue if the error is transient, else to the DLQ."""
+        if self._retry_queue is None:
+            await self.reject(delivery.delivery_tag, requeue=False)
+            return
+        # Retries return to the queue the delivery came from: the bulk lane, a shard queue, or the main queue.
+        queue = delivery.queue if delivery.queue in self._queue_names + self._bulk_queues else self._retry_queue
+        await self._call(lambda: retry_or_reject(self.channel, delivery.delivery_tag, delivery.properties,
+                                                 delivery.body, error, queue))
+
+    async def dead_letter(self, delivery, reason):
+        """Sends an invalid delivery to the DLQ with `reason` in its x-reject-reason header."""
+        if self._dead_letter_exchange is None:
+            await self.reject(delivery.delivery_tag, requeue=False)
+            return
+        await self._call(lambda: dead_letter(self.channel, delivery.delivery_tag, delivery.properties,
+                                             delivery.body, reason, self._dead_letter_exchange))
+
+    async def publish_event(self, event):
+        await self._call(lambda: self.publisher.publish(event))
+
+
+class AsyncReviewPipeline:
+    """
+    Processes reviews as concurrent stages joined by bounded asyncio queues:
+
+        decode -> dedup -> score -> persist -> publish
+
+    Validation, idempotency and publish semantics match process_message: poison
+    messages are rejected (to DLQ), already-processed reviews are acked without
+    an event, and a review is acked only after its ReviewProcessed event is
+    published. Database work runs in threads and scoring in `scoring_executor`,
+    so broker I/O, DB I/O and CPU work overlap.
+
+    Args:
+        broker: Provides deliveries(), ack(), reject(), retry_or_reject(), dead_letter() and
+            publish_event() coroutines.
+        session_factory: Creates SQLAlchemy sessions (SessionLocal by default).
+        scoring_executor: Executor for analyze_sentiment (the loop's default if None).
+        deduplicator: Optional ReviewDeduplicator consulted before the database.
+        outbox (bool): Write events to the outbox table with their reviews instead of
+            publishing them; the review is acked once the transaction commits.
+    """
+
+    def __init__(self, broker, session_factory=SessionLocal, scoring_executor=None,
+                 queue_size=ASYNC_QUEUE_SIZE, score_concurrency=ASYNC_SCORE_CONCURRENCY,
+                 persist_batch=ASYNC_PERSIST_BATCH, deduplicator=None, outbox=False):
+        self.broker = broker
+        self.session_factory = session_factory
+        self.deduplicator = deduplicator
+        self.outbox = outbox
+        self.scoring_executor = scoring_executor
+        self.score_concurrency = score_concurrency
+        self.persist_batch = persist_batch
+        self._to_dedup = asyncio.Queue(maxsize=queue_size)
+        self._to_score = asyncio.Queue(maxsize=queue_size)
+        self._to_persist = asyncio.Queue(maxsize=queue_size)
+        self._to_publish = asyncio.Queue(maxsize=queue_size)
+
+    async def run(self):
+        """Runs every stage until the broker's delivery stream ends and all work drains."""
+        scorers = [asyncio.create_task(self._score()) for _ in range(self.score_concurrency)]
+        stages = [
+            asyncio.create_task(self._decode()),
+            asyncio.create_task(self._dedup()),
+            asyncio.create_task(self._persist()),
+            asyncio.create_task(self._publish()),
+        ]
+        await stages[0]
+        await stages[1]
+        await asyncio.gather(*scorers)
+        await self._to_persist.put(_STOP)
+        await asyncio.gather(*stages[2:])
+
+    async def _decode(self):
+        async for delivery in self.broker.deliveries():
+            try:
+                with metrics.STAGE_DECODE.time():
+                    review = ReviewMessage.decode(delivery.body, delivery.properties)
+                metrics.observe_message_age(review.timestamp)
+            except InvalidMessage as e:
+                logger.error(f"Invalid message for review {e.review_id}: {e.reason}. Rejecting (to DLQ). "
+                             f"Body: {delivery.body[:50]}...")
+                await self.broker.dead_letter(delivery, e.reason)
+                continue
+            except Exception as e:
+                logger.error(f"Error decoding message: {e}")
+                await self.broker.retry_or_reject(delivery, e)
+                continue
+            await self._to_dedup.put((delivery, review))
+        await self._to_dedup.put(_STOP)
+
+    async def _drain(self, queue, first, limit):
+        """Returns `first` plus whatever else is already queued, up to limit items."""
+        items = [first]
+        while len(items) < limit and not queue.empty():
+            item = queue.get_nowait()
+            if item is _STOP:
+                queue.put_nowait(_STOP)
+                break
+            items.append(item)
+        return items
+
+    def _existing_ids(self, review_ids):
+        session = self.session_factory()
+        try:
+            if self.deduplicator is not None:
+                return self.deduplicator.find_existing(session, review_ids)
+            return fetch_existing_review_ids(session, review_ids)
+        finally:
+            session.close()
+
+    async def _dedup(self):
+        while True:
+            first = await self._to_dedup.get()
+            if first is _STOP:
+                break
+            items = await self._drain(self._to_dedup, first, self.persist_batch)
+            try:
+                with metrics.STAGE_DEDUP.time():
+                    existing = await asyncio.to_thread(self._existing_ids, [review.review_id for _, review in items])
+            except Exception as e:
+                # Not fatal: the primary key still prevents duplicate rows.
+                logger.warning(f"Idempotency lookup failed: {e}. Relying on insert conflicts.")
+                existing = set()
+            for delivery, review in items:
+                if review.review_id in existing:
+                    logger.debug(f"Review {review.review_id} already processed. Skipping.")
+                    metrics.DUPLICATES.inc()
+                    await self.broker.ack(delivery.delivery_tag)
+                else:
+                    await self._to_score.put((delivery, review))
+        for _ in range(self.score_concurrency):
+            await self._to_score.put(_STOP)
+
+    async def _score(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._to_score.get()
+            if item is _STOP:
+                return
+            delivery, review = item
+            try:
+                with metrics.STAGE_SENTIMENT.time():
+                    sentiment = await loop.run_in_executor(self.scoring_executor, analyze_sentiment, review.comment)
+            except Exception as e:
+                logger.error(f"Error processing message {review.review_id}: {e}")
+                await self.broker.retry_or_reject(delivery, e)
+                continue
+            await self._to_persist.put((delivery, review, sentiment))
+
+    def _insert(self, rows):
+        session = self.session_factory()
+        try:
+            inserted = bulk_insert_reviews(session, rows)
+            increment_product_rollups(session, [row for row in rows if row['review_id'] in inserted])
+            if self.outbox:
+                events = {row['review_id']: _event(row) for row in rows if row['review_id'] in inserted}
+                add_outbox_events(session, list(events.values()))
+            session.commit()
+            return inserted
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def _insert_one(self, row):
+        try:
+            return self._insert([row])
+        except IntegrityError:
+            return set()
+
+    async def _persist(self):
+        while True:
+            first = await self._to_persist.get()
+            if first is _STOP:
+                break
+            items = await self._drain(self._to_persist, first, self.persist_batch)
+            rows = {}
+            for delivery, review, sentiment in items:
+                rows[delivery.delivery_tag] = review.row(sentiment, datetime.utcnow())
+
+            try:
+                with metrics.STAGE_COMMIT.time():
+                    inserted = await asyncio.to_thread(self._insert, list(rows.values()))
+                failed = {}
+            except Exception as e:
+                # Isolate the bad row(s) by retrying one review at a time.
+                logger.error(f"Batch insert of {len(rows)} reviews failed: {e}. Retrying individually.")
+                inserted, failed = set(), {}
+                for tag, row in rows.items():
+                    try:
+                        inserted |= await asyncio.to_thread(self._insert_one, row)
+                    except Exception as row_error:
+                        logger.error(f"Error processing message {row['review_id']}: {row_error}")
+                        failed[tag] = row_error
+
+            if self.deduplicator is not None:
+                self.deduplicator.mark_processed(inserted)
+
+            announced = set()
+            for delivery, review, sentiment in items:
+                review_id = review.review_id
+                if delivery.delivery_tag in failed:
+                    await self.broker.retry_or_reject(delivery, failed[delivery.delivery_tag])
+                elif review_id in inserted and review_id not in announced:
+                    announced.add(review_id)
+                    if sampled():
+                        logger.info(f"Saved review {review_id} to DB.",
+                                    extra={'review_id': review_id, 'sentiment': sentiment})
+                    if self.outbox:
+                        # The event was committed with the review; the outbox relay publishes it.
+                        await self.broker.ack(delivery.delivery_tag)
+                    else:
+                        await self._to_publish.put((delivery, _event(rows[delivery.delivery_tag])))
+                else:
+                    logger.warning(f"Review {review_id} already exists. Treating as duplicate and Acking.")
+                    metrics.DUPLICATES.inc()
+                    await self.broker.ack(delivery.delivery_tag)
+        await self._to_publish.put(_STOP)
+
+    async def _publish(self):
+        while True:
+            item = await self._to_publish.get()
+            if item is _STOP:
+                return
+            delivery, event = item
+            try:
+                with metrics.STAGE_PUBLISH.time():
+                    await self.broker.publish_event(event)
+            except Exception as e:
+                logger.error(f"Error processing message {event['reviewId']}: {e}")
+                await self.broker.retry_or_reject(delivery, e)
+                continue
+            await self.broker.ack(delivery.delivery_tag)
+
+
+async def run_async_consumer(connect, setup_queues, queue_names, publisher_factory,
+                             prefetch_count=ASYNC_QUEUE_SIZE, deduplicator=None, outbox=False, on_delivery=None,
+                             retry_queue=None, dead_letter_exchange=None, bulk_queues=(), lane_prefetch=None):
+    """
+    Entry point used by consumer.main() when CONSUMER_ENGINE=asyncio.
+
+    `bulk_queues` are consumed as a lower-priority lane; `lane_prefetch` splits
+    prefetch_count into (live, bulk) windows.
+    """
+    broker = PikaBroker(connect, setup_queues, queue_names, publisher_factory, prefetch_count, on_delivery,
+                        retry_queue, dead_letter_exchange, bulk_queues, lane_prefetch)
+    await broker.start()
+    logger.info('Waiting for messages (asyncio engine).')
+    await AsyncReviewPipeline(broker, deduplicator=deduplicator, outbox=outbox).run()
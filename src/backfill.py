@@ -0,0 +1,245 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+# Add the current directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.database import SessionLocal, add_outbox_events, copy_merge_reviews, increment_product_rollups, init_db
+from src.schema import InvalidMessage, ReviewMessage
+from src.sentiment import analyze_sentiment_batch, warm_up
+
+logger = logging.getLogger(__name__)
+
+# Backfill Configuration
+BACKFILL_CHUNK_SIZE = int(os.getenv('BACKFILL_CHUNK_SIZE', '5000'))
+BACKFILL_WORKERS = int(os.getenv('BACKFILL_WORKERS', str(os.cpu_count() or 1)))
+
+EVENT_MODES = ('none', 'publish', 'outbox')
+
+
+def _warm_up_worker():
+    warm_up(vectorized=True)
+
+
+def read_records(path, start=0):
+    """
+    Streams review records from a JSONL or CSV file.
+
+    Records are numbered from 0 in file order (JSONL lines, or CSV rows after the
+    header); blank JSONL lines are skipped but still counted, so offsets stay
+    stable across runs.
+
+    Args:
+        path (str): A .jsonl/.json file with one review per line, or a .csv file
+            with a header row of review field names.
+        start (int): Offset of the first record to yield.
+
+    Yields:
+        tuple: (offset, record), where record is None if it could not be parsed.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.csv'):
+            for offset, row in islice(enumerate(csv.DictReader(f)), start, None):
+                try:
+                    row['rating'] = int(row['rating']) if row.get('rating') else None
+                except ValueError:
+                    row = None
+                yield offset, row
+        else:
+            for offset, line in islice(enumerate(f), start, None):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    record = None
+                yield offset, record if isinstance(record, dict) else None
+
+
+def chunked(records, size):
+    """Groups (offset, record) pairs into lists of up to `size`."""
+    chunk = []
+    for item in records:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def load_checkpoint(path):
+    """Returns the next offset recorded in the checkpoint file, or 0 if there is none."""
+    try:
+        with open(path) as f:
+            return int(json.load(f)['offset'])
+    except FileNotFoundError:
+        return 0
+
+
+def save_checkpoint(path, offset):
+    """Atomically records `offset` as the next record to load."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'offset': offset, 'updated_at': datetime.utcnow().isoformat()}, f)
+    os.replace(tmp_path, path)
+
+
+class Backfill:
+    """
+    Loads historical reviews into processed_reviews without going through the broker.
+
+    Records are read lazily and validated with the consumer's rules, then
+    scored chunk by chunk in a process pool with analyze_sentiment_batch. Up to
+    `max_pending` chunks are scored ahead while earlier ones are written, in file
+    order, with copy_merge_reviews (COPY into a staging table plus a dedup merge
+    on Postgres). After each chunk commits, the offset of the next record is saved
+    to the checkpoint, so an interrupted run resumes where it stopped. Reviews
+    that already exist are skipped, so reloading a chunk is harmless.
+
+    Args:
+        session_factory: Creates SQLAlchemy sessions (SessionLocal by default).
+        executor: Pool used for scoring (a ProcessPoolExecutor by default).
+        chunk_size (int): Records per scoring/write chunk.
+        events (str): 'none', 'publish' (ReviewProcessed events via
+            publisher.publish_many after each commit) or 'outbox' (events written
+            to the outbox in the chunk's transaction, for src/outbox_relay.py).
+        publisher: EventPublisher used when events == 'publish'.
+        checkpoint_path (str): Where to record progress; None disables checkpoints.
+        max_pending (int): Chunks scored ahead of the writer.
+    """
+
+    def __init__(self, session_factory=SessionLocal, executor=None, chunk_size=BACKFILL_CHUNK_SIZE,
+                 events='none', publisher=None, checkpoint_path=None, max_pending=None):
+        if events not in EVENT_MODES:
+            raise ValueError(f"Unknown events mode: {events}")
+        if events == 'publish' and publisher is None:
+            raise ValueError("events='publish' needs a publisher")
+        self.session_factory = session_factory
+        self.executor = executor or ProcessPoolExecutor(max_workers=BACKFILL_WORKERS, initializer=_warm_up_worker)
+        self.chunk_size = chunk_size
+        self.events = events
+        self.publisher = publisher
+        self.checkpoint_path = checkpoint_path
+        self.max_pending = max_pending or 2 * getattr(self.executor, '_max_workers', 1)
+        self.stats = {'read': 0, 'invalid': 0, 'inserted': 0, 'duplicates': 0, 'published': 0, 'unpublished': 0}
+
+    def run(self, path, start=None):
+        """
+        Loads `path` from `start` (or the checkpoint offset) to the end.
+
+        Returns:
+            dict: Counts of records read, invalid, inserted, duplicates and events published.
+        """
+        if start is None:
+            start = load_checkpoint(self.checkpoint_path) if self.checkpoint_path else 0
+        if start:
+            logger.info(f"Resuming backfill of {path} at record {start}.")
+
+        started = time.monotonic()
+        pending = deque()
+        for chunk in chunked(read_records(path, start), self.chunk_size):
+            pending.append(self._submit(chunk))
+            if len(pending) >= self.max_pending:
+                self._write(*pending.popleft())
+        while pending:
+            self._write(*pending.popleft())
+
+        elapsed = time.monotonic() - started
+        logger.info(f"Backfill of {path} finished in {elapsed:.1f}s: {self.stats}")
+        return dict(self.stats)
+
+    def _submit(self, chunk):
+        """Validates a chunk and submits its comments for scoring."""
+        valid = []
+        for offset, record in chunk:
+            try:
+                if record is None:
+                    raise InvalidMessage("unparseable")
+                valid.append(ReviewMessage.from_dict(record))
+            except InvalidMessage as e:
+                logger.warning(f"Skipping invalid record at offset {offset}: {e.reason}.")
+                self.stats['invalid'] += 1
+        self.stats['read'] += len(chunk)
+        future = self.executor.submit(analyze_sentiment_batch, [review.comment for review in valid])
+        return chunk[-1][0] + 1, valid, future
+
+    def _write(self, next_offset, valid, future):
+        """Writes one scored chunk, emits its events and advances the checkpoint."""
+        sentiments = future.result()
+        now = datetime.utcnow()
+        rows = [review.row(sentiment, now) for review, sentiment in zip(valid, sentiments)]
+
+        session = self.session_factory()
+        try:
+            inserted_ids = copy_merge_reviews(session, rows)
+            increment_product_rollups(session, [row for row in rows if row['review_id'] in inserted_ids])
+            events = [
+                {"reviewId": row['review_id'], "sentiment": row['sentiment'], "processedTimestamp": now.isoformat()}
+                for row in rows if row['review_id'] in inserted_ids
+            ]
+            if self.events == 'outbox':
+                add_outbox_events(session, events)
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+        self.stats['inserted'] += len(inserted_ids)
+        self.stats['duplicates'] += len(rows) - len(inserted_ids)
+
+        if self.events == 'publish' and events:
+            failed = self.publisher.publish_many(events)
+            self.stats['published'] += len(events) - len(failed)
+            self.stats['unpublished'] += len(failed)
+            if failed:
+                logger.error(f"{len(failed)} ReviewProcessed events were not published: "
+                             f"{[events[position]['reviewId'] for position in failed[:10]]}...")
+
+        if self.checkpoint_path:
+            save_checkpoint(self.checkpoint_path, next_offset)
+        logger.info(f"Backfilled {len(inserted_ids)} of {len(rows)} reviews up to record {next_offset}.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load historical reviews into processed_reviews.")
+    parser.add_argument('path', help="JSONL (one review per line) or CSV (with a header row) file")
+    parser.add_argument('--chunk-size', type=int, default=BACKFILL_CHUNK_SIZE)
+    parser.add_argument('--workers', type=int, default=BACKFILL_WORKERS)
+    parser.add_argument('--events', choices=EVENT_MODES, default='none',
+                        help="Emit ReviewProcessed events: publish them directly, or queue them in the outbox")
+    parser.add_argument('--checkpoint', help="Checkpoint file (default: <path>.checkpoint)")
+    parser.add_argument('--from-offset', type=int, help="Start at this record instead of the checkpoint")
+    args = parser.parse_args(argv)
+
+    init_db()
+    publisher = None
+    if args.events == 'publish':
+        from src.consumer import PUBLISH_CONFIRMS, connect
+        from src.publisher import ConfirmingEventPublisher, EventPublisher
+        publisher = (ConfirmingEventPublisher if PUBLISH_CONFIRMS else EventPublisher)(connect().channel())
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_warm_up_worker) as executor:
+        backfill = Backfill(
+            executor=executor, chunk_size=args.chunk_size, events=args.events, publisher=publisher,
+            checkpoint_path=args.checkpoint or f"{args.path}.checkpoint",
+        )
+        backfill.run(args.path, start=args.from_offset)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print('Interrupted')
@@ -1,47 +1,72 @@
+import asyncio
+import atexit
+import math
 import sys
 import os
 import time
-import json
 import logging
 import pika
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from functools import partial
 from sqlalchemy.exc import IntegrityError
 
 # Add the current directory to sys.path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from src.database import init_db, get_db_session, ProcessedReview
-from src.sentiment import analyze_sentiment
-from src.publisher import EventPublisher
+from src.database import (init_db, get_db_connection, get_db_session, add_outbox_events, bulk_insert_reviews,
+                          fetch_existing_review_ids, increment_product_rollups)
+from src.sentiment import analyze_sentiment, analyze_sentiment_batch, sentiment_cache, warm_up
+from src.publisher import ConfirmingEventPublisher, EventPublisher, PublishNackedError
+from src.adaptive import (ADAPTIVE_BATCH_MAX, ADAPTIVE_BATCH_MIN, ADAPTIVE_BATCH_STEP, ADAPTIVE_ENABLED,
+                          ADAPTIVE_PREFETCH_MAX, ADAPTIVE_PREFETCH_MIN, ADAPTIVE_PREFETCH_STEP, AIMD, AdaptiveTuner)
+from src.dedup import ReviewDeduplicator
+from src.retry import dead_letter, retry_or_reject, setup_retry_queues
+from src.schema import InvalidMessage, ReviewMessage
+from src import metrics, profiling
+from src.logs import configure_logging, sampled
 
-# Configure Structured Logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='{"timestamp": "%(asctime)s", "level": "%(levelname)s", "message": "%(message)s"}',
-    datefmt='%Y-%m-%dT%H:%M:%SZ'
-)
+# Configure Structured Logging: JSON lines written by a background thread (see src/logs.py)
+configure_logging()
 logger = logging.getLogger(__name__)
 
-# Ensure TextBlob corpora is available
-try:
-    from textblob import TextBlob
-    TextBlob("test").sentiment
-except Exception:
-    logger.info("Downloading TextBlob corpora...")
-    import nltk
-    nltk.download('punkt')
-    nltk.download('brown')
-    nltk.download('names')
-    nltk.download('wordnet')
-    nltk.download('averaged_perceptron_tagger')
-    nltk.download('universal_tagset')
-
 # Configuration
 RABBITMQ_HOST = os.getenv('RABBITMQ_HOST', 'localhost')
 RABBITMQ_USER = os.getenv('RABBITMQ_USER', 'guest')
 RABBITMQ_PASS = os.getenv('RABBITMQ_PASS', 'guest')
 QUEUE_NAME = 'product_reviews'
+# Lower-priority lane for DLQ replays and other bulk re-processing, kept apart from live submissions
+BULK_QUEUE_NAME = 'product_reviews.bulk'
 DLQ_NAME = 'product_reviews_dlq'
 DLX_NAME = 'product_reviews_dlx'
+# Consistent-hash exchange that spreads reviews over per-worker shard queues by productId
+SHARD_EXCHANGE = 'product_reviews_sharded'
+
+# Consumer engine: 'blocking' (pika BlockingConnection loop) or 'asyncio' (src/async_consumer.py)
+CONSUMER_ENGINE = os.getenv('CONSUMER_ENGINE', 'blocking').lower()
+
+# Publisher confirms: wait for the broker to confirm ReviewProcessed events before acking their input
+PUBLISH_CONFIRMS = os.getenv('PUBLISH_CONFIRMS', 'false').lower() == 'true'
+
+# Transactional outbox: write events with their review and let src/outbox_relay.py publish them
+OUTBOX_ENABLED = os.getenv('OUTBOX_ENABLED', 'false').lower() == 'true'
+
+# Batching: BATCH_SIZE=1 keeps the original one-message-at-a-time behaviour.
+BATCH_SIZE = int(os.getenv('BATCH_SIZE', '1'))
+BATCH_TIMEOUT_MS = int(os.getenv('BATCH_TIMEOUT_MS', '50'))
+
+# Score whole batches with the vectorized lexicon engine instead of per-review TextBlob
+VECTORIZED_SENTIMENT = os.getenv('VECTORIZED_SENTIMENT', 'false').lower() == 'true'
+
+# Offload scoring to a process pool (0 = score inline on the connection thread)
+SENTIMENT_WORKERS = int(os.getenv('SENTIMENT_WORKERS', '0'))
+SENTIMENT_MAX_IN_FLIGHT = int(os.getenv('SENTIMENT_MAX_IN_FLIGHT', str(max(SENTIMENT_WORKERS, 1) * 2)))
+
+# Dedup: LRU + Bloom filter in front of the processed_reviews idempotency check
+DEDUP_ENABLED = os.getenv('DEDUP_ENABLED', 'true').lower() == 'true'
+
+# Bulk lane: share of deliveries it gets while live traffic also has a backlog (live keeps the rest)
+BULK_LANE_ENABLED = os.getenv('BULK_LANE_ENABLED', 'true').lower() == 'true'
+BULK_LANE_SHARE = float(os.getenv('BULK_LANE_SHARE', '0.2'))
 
 def connect():
     credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASS)
@@ -59,8 +84,8 @@ def connect():
 
 def setup_queues(channel):
     """
-    Declares the main queue, DLX, and DLQ.
-    Configures the main queue to forward dead-lettered messages to DLX.
+    Declares the main queue, the bulk lane queue, DLX, and DLQ.
+    Configures both queues to forward dead-lettered messages to DLX.
     """
     # 1. Declare Dead Letter Exchange (DLX)
     channel.exchange_declare(exchange=DLX_NAME, exchange_type='direct', durable=True)
@@ -77,83 +102,556 @@ def setup_queues(channel):
         'x-dead-letter-routing-key': 'dead_letter'
     }
     channel.queue_declare(queue=QUEUE_NAME, durable=True, arguments=arguments)
-    logger.info("Queues and DLQ configured successfully.")
+    channel.queue_declare(queue=BULK_QUEUE_NAME, durable=True, arguments=arguments)
+
+    # 5. Declare TTL-delayed retry queues that feed back into each lane
+    setup_retry_queues(channel, QUEUE_NAME)
+    setup_retry_queues(channel, BULK_QUEUE_NAME)
+    logger.info("Queues, retry queues and DLQ configured successfully.")
+
+def lane_prefetch(prefetch_count, share=BULK_LANE_SHARE):
+    """
+    Splits prefetch between the live queues and the bulk lane.
+
+    Each lane's consumer gets its own prefetch window. Deliveries are handled in
+    arrival order and each ack frees a slot in its own lane, so while both lanes
+    have a backlog they are served in proportion to their windows: `share` of
+    deliveries come from the bulk lane and the rest from live traffic. The live
+    window is widened if needed to keep that ratio with a bulk window of one.
+
+    Returns:
+        tuple: (live prefetch, bulk prefetch).
+    """
+    share = min(max(share, 0.01), 0.99)
+    bulk = max(1, round(prefetch_count * share / (1 - share)))
+    live = max(prefetch_count, math.ceil(bulk * (1 - share) / share - 1e-9))
+    return live, bulk
+
+class LaneConsumers:
+    """
+    The channel's consumers, one per queue, with prefetch split between the live and bulk lanes.
+
+    RabbitMQ fixes a consumer's prefetch window when the consumer starts, so
+    set_prefetch() restarts the consumers with their new windows. basic_cancel
+    requeues deliveries pika has not yet dispatched to the callback; those already
+    dispatched stay unacked on the channel and are settled as usual.
+
+    Args:
+        channel: The BlockingChannel to consume on.
+        live_queues (list): Live queues, sharing the live window.
+        bulk_queues (list): Bulk lane queues, sharing the bulk window.
+        callback: The basic_consume callback.
+    """
+
+    def __init__(self, channel, live_queues, bulk_queues, callback):
+        self.channel = channel
+        self.live_queues = list(live_queues)
+        self.bulk_queues = list(bulk_queues)
+        self.callback = callback
+        self.windows = None  # (live, bulk) of the running consumers
+        self._tags = []
+
+    def set_prefetch(self, prefetch_count):
+        """
+        (Re)starts the consumers with the lane windows for `prefetch_count`.
+
+        Returns:
+            int: The live lane's window, the most a single live consumer can hold unacked.
+        """
+        windows = lane_prefetch(prefetch_count) if self.bulk_queues else (prefetch_count, 0)
+        if windows == self.windows:
+            return windows[0]
+        for tag in self._tags:
+            self.channel.basic_cancel(tag)
+        self._tags = []
+        for lane_queues, window in ((self.live_queues, windows[0]), (self.bulk_queues, windows[1])):
+            if lane_queues:
+                # Per-consumer: applies to the consumers started below.
+                self.channel.basic_qos(prefetch_count=window)
+            for queue in lane_queues:
+                # The queue name as consumer tag tells source_queue where retries go.
+                self.channel.basic_consume(queue=queue, on_message_callback=self.callback, consumer_tag=queue)
+                self._tags.append(queue)
+        self.windows = windows
+        return windows[0]
+
+def source_queue(method):
+    """
+    The queue a delivery was consumed from, which its retries return to.
+
+    Consumers are started with their queue's name as consumer tag (a shard
+    delivery's routing key is its productId, so the tag is what identifies its
+    shard queue). Deliveries without one fall back to the routing key.
+    """
+    queue = getattr(method, 'consumer_tag', None)
+    if queue.__class__ is str and (queue in (QUEUE_NAME, BULK_QUEUE_NAME) or is_shard_queue(queue)):
+        return queue
+    return BULK_QUEUE_NAME if getattr(method, 'routing_key', None) == BULK_QUEUE_NAME else QUEUE_NAME
+
+def shard_queue_name(index):
+    return f"{QUEUE_NAME}.shard.{index}"
+
+def is_shard_queue(queue):
+    prefix, _, index = queue.rpartition('.')
+    return prefix == f"{QUEUE_NAME}.shard" and index.isdigit()
+
+def setup_shard_queues(channel, shards):
+    """
+    Declares `shards` queues bound to SHARD_EXCHANGE, an x-consistent-hash exchange.
+
+    Producers publish to SHARD_EXCHANGE with the productId as routing key, so every
+    review of a product lands on the same shard queue. Shard queues dead-letter to
+    the same DLX as the main queue, and each has its own retry queues, so a retried
+    review returns to its product's shard. Requires the rabbitmq_consistent_hash_exchange plugin.
+    """
+    channel.exchange_declare(exchange=SHARD_EXCHANGE, exchange_type='x-consistent-hash', durable=True)
+    arguments = {
+        'x-dead-letter-exchange': DLX_NAME,
+        'x-dead-letter-routing-key': 'dead_letter'
+    }
+    for index in range(shards):
+        queue = shard_queue_name(index)
+        channel.queue_declare(queue=queue, durable=True, arguments=arguments)
+        # For a consistent-hash exchange the binding key is the shard's weight.
+        channel.queue_bind(exchange=SHARD_EXCHANGE, queue=queue, routing_key='1')
+        setup_retry_queues(channel, queue)
+    logger.info(f"Declared {shards} shard queues on '{SHARD_EXCHANGE}'.")
+
+def reject_invalid(ch, method, properties, body, error):
+    """Dead-letters a delivery that failed validation, with the reason in its x-reject-reason header."""
+    logger.error(f"Invalid message for review {error.review_id}: {error.reason}. Rejecting (to DLQ). Body: {body[:50]}...")
+    dead_letter(ch, method.delivery_tag, properties, body, error.reason, DLX_NAME)
 
-def process_message(ch, method, properties, body, publisher):
+def process_message(ch, method, properties, body, publisher, deduplicator=None):
     """Callback function to process messages."""
     review_id = "unknown"
+    timings = {} if sampled() else None
     try:
-        data = json.loads(body)
-        review_id = data.get('reviewId')
-        
-        logger.info(f"Received review: {review_id}")
-
-        # 0. Validation Check
-        required_fields = ['productId', 'userId', 'rating', 'reviewId', 'comment']
-        missing_fields = [field for field in required_fields if not data.get(field)]
-        if missing_fields:
-            logger.error(f"Invalid message: Missing fields {missing_fields} for review {review_id}. Rejecting (to DLQ).")
-            ch.basic_reject(delivery_tag=method.delivery_tag, requeue=False)
-            return
+        # 0. Decode and Validate
+        with metrics.STAGE_DECODE.time() as timer:
+            review = ReviewMessage.decode(body, properties)
+        review_id = review.review_id
+        metrics.observe_message_age(review.timestamp)
+        _record(timings, 'decode', timer)
+
+        # 1. Idempotency Check
+        connection = get_db_connection()
+        with metrics.STAGE_DEDUP.time() as timer, connection.begin():
+            existing_review = review_id in find_existing(connection, [review_id], deduplicator)
+        _record(timings, 'dedup', timer)
 
-        # 1. Idempotency Check & DB Session
-        session = next(get_db_session())
-        existing_review = session.query(ProcessedReview).filter_by(review_id=review_id).first()
-        
         if existing_review:
-            logger.info(f"Review {review_id} already processed. Skipping.")
+            if timings is not None:
+                logger.info(f"Review {review_id} already processed. Skipping.", extra={'review_id': review_id})
+            metrics.DUPLICATES.inc()
             ch.basic_ack(delivery_tag=method.delivery_tag)
             return
 
         # 2. Sentiment Analysis
-        sentiment = analyze_sentiment(data.get('comment', ''))
-        logger.info(f"Sentiment for {review_id}: {sentiment}")
-
-        # 3. Save to Database
-        new_review = ProcessedReview(
-            review_id=review_id,
-            product_id=data.get('productId'),
-            user_id=data.get('userId'),
-            rating=data.get('rating'),
-            comment=data.get('comment'),
-            sentiment=sentiment
-        )
-        session.add(new_review)
-        session.commit()
-        logger.info(f"Saved review {review_id} to DB.")
-
-        # 4. Publish Event
-        processed_event = {
-            "reviewId": review_id,
-            "sentiment": sentiment,
-            "processedTimestamp": datetime.utcnow().isoformat()
-        }
-        publisher.publish(processed_event)
-
-        # 5. Acknowledge
-        ch.basic_ack(delivery_tag=method.delivery_tag)
+        with metrics.STAGE_SENTIMENT.time() as timer:
+            sentiment = analyze_sentiment(review.comment)
+        _record(timings, 'sentiment', timer)
 
-    except json.JSONDecodeError:
-        logger.error(f"Failed to decode JSON. Rejecting (to DLQ). Body: {body[:50]}...")
-        # Reject without requeue triggers DLQ
-        ch.basic_reject(delivery_tag=method.delivery_tag, requeue=False)
+        # 3-5. Save, Publish, Acknowledge
+        save_and_publish(ch, method, connection, review, sentiment, publisher, deduplicator, timings)
+
+    except InvalidMessage as e:
+        reject_invalid(ch, method, properties, body, e)
     except IntegrityError:
         logger.warning(f"Integrity Error for {review_id}. Review likely already exists. Treating as duplicate and Acking.")
-        session.rollback()
+        metrics.DUPLICATES.inc()
         ch.basic_ack(delivery_tag=method.delivery_tag)
     except Exception as e:
         logger.error(f"Error processing message {review_id}: {e}")
-        # Retry logic: basic_nack with requeue=True will loop forever if persistent error. 
-        # For production, we might want a retry count header check, but for now we'll requeue once or DLQ?
-        # Let's send to DLQ for generic unknown errors to avoid infinite loops for this task.
-        ch.basic_reject(delivery_tag=method.delivery_tag, requeue=False) 
-    finally:
-        if 'session' in locals():
-            session.close()
+        # Transient failures (e.g. a database blip) go to a delayed retry queue;
+        # permanent ones, and retries that keep failing, go to the DLQ.
+        retry_or_reject(ch, method.delivery_tag, properties, body, e, source_queue(method))
 
 from datetime import datetime
 
-def main():
+def _record(timings, stage, timer):
+    """Adds a stage's duration (ms) to a sampled message's timings; None means the message is not logged."""
+    if timings is not None:
+        timings[stage] = round(timer.elapsed * 1000, 3)
+
+def find_existing(connection, review_ids, deduplicator=None):
+    """Returns the review_ids already processed, via the deduplicator when there is one."""
+    if deduplicator is not None:
+        return deduplicator.find_existing(connection, review_ids)
+    return fetch_existing_review_ids(connection, review_ids)
+
+def save_and_publish(ch, method, connection, review, sentiment, publisher, deduplicator=None, timings=None):
+    """
+    Persists a scored review, publishes its ReviewProcessed event and acks the delivery.
+
+    A review that turns out to exist already (inserted by a concurrent consumer)
+    is acked as a duplicate without publishing. Other exceptions propagate to the
+    caller, which decides whether to ack or reject.
+
+    `timings` is the per-stage dict of a sampled message: if given, one
+    "Saved review" line with the review's stage timings is logged after the ack.
+    Unsampled messages (timings=None) log nothing on success.
+    """
+    review_id = review.review_id
+    now = datetime.utcnow()
+
+    # 3. Save to Database
+    row = review.row(sentiment, now)
+    processed_event = {
+        "reviewId": review_id,
+        "sentiment": sentiment,
+        "processedTimestamp": now.isoformat()
+    }
+    with metrics.STAGE_COMMIT.time() as timer, connection.begin():
+        inserted = bulk_insert_reviews(connection, [row])
+        if inserted:
+            increment_product_rollups(connection, [row])
+            if OUTBOX_ENABLED:
+                # Committed atomically with the review; src/outbox_relay.py publishes it.
+                add_outbox_events(connection, [processed_event])
+    _record(timings, 'commit', timer)
+    if not inserted:
+        if timings is not None:
+            logger.info(f"Review {review_id} already processed. Skipping.", extra={'review_id': review_id})
+        metrics.DUPLICATES.inc()
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+        return
+    if deduplicator is not None:
+        deduplicator.mark_processed([review_id])
+
+    # 4. Publish Event
+    if not OUTBOX_ENABLED:
+        with metrics.STAGE_PUBLISH.time() as timer:
+            publisher.publish(processed_event)
+        _record(timings, 'publish', timer)
+
+    # 5. Acknowledge
+    ch.basic_ack(delivery_tag=method.delivery_tag)
+    if timings is not None:
+        logger.info(f"Saved review {review_id} to DB.",
+                    extra={'review_id': review_id, 'sentiment': sentiment, 'stage_ms': timings})
+
+def process_batch(ch, deliveries, publisher, deduplicator=None):
+    """
+    Processes a micro-batch of deliveries.
+
+    Poison messages are rejected (to DLQ) one by one. The remaining reviews are
+    scored, written with a single INSERT ... ON CONFLICT DO NOTHING and one
+    commit, and then acknowledged together with basic_ack(multiple=True).
+    Deliveries that fail individually (scoring, publishing, a nacked event) go
+    through retry_or_reject, like process_message's failures.
+
+    Args:
+        ch: The channel the deliveries arrived on.
+        deliveries (list): (method, properties, body) tuples in delivery order.
+        publisher: The EventPublisher used for ReviewProcessed events.
+        deduplicator: Optional ReviewDeduplicator used to skip already-processed reviews.
+    """
+    decode_started = time.perf_counter()
+    decoded = []
+    for method, properties, body in deliveries:
+        try:
+            review = ReviewMessage.decode(body, properties)
+        except InvalidMessage as e:
+            reject_invalid(ch, method, properties, body, e)
+            continue
+        except Exception as e:
+            logger.error(f"Error decoding message: {e}")
+            retry_or_reject(ch, method.delivery_tag, properties, body, e, source_queue(method))
+            continue
+        decoded.append((method, properties, body, review))
+    metrics.STAGE_DECODE.observe(time.perf_counter() - decode_started)
+    if decoded:
+        # The oldest message in the batch bounds its lag; sampling one keeps this per-batch.
+        metrics.observe_message_age(decoded[0][3].timestamp)
+
+    if not decoded:
+        return
+
+    connection = get_db_connection()
+    existing_ids = set()
+    if deduplicator is not None:
+        try:
+            with metrics.STAGE_DEDUP.time(), connection.begin():
+                existing_ids = deduplicator.find_existing(connection, [review.review_id for _, _, _, review in decoded])
+        except Exception as e:
+            # Not fatal: ON CONFLICT DO NOTHING still prevents duplicate rows.
+            logger.warning(f"Batch idempotency lookup failed: {e}. Relying on insert conflicts.")
+
+    seen_ids = set()
+    fresh = []
+    for position, (method, properties, body, review) in enumerate(decoded):
+        review_id = review.review_id
+        if review_id not in existing_ids and review_id not in seen_ids:
+            seen_ids.add(review_id)
+            fresh.append(position)
+
+    sentiment_started = time.perf_counter()
+    sentiments = {}
+    if VECTORIZED_SENTIMENT and fresh:
+        try:
+            labels = analyze_sentiment_batch([decoded[position][3].comment for position in fresh])
+            sentiments = dict(zip(fresh, labels))
+        except Exception as e:
+            logger.warning(f"Batch sentiment scoring failed: {e}. Scoring reviews individually.")
+
+    valid = []
+    fresh = set(fresh)
+    for position, (method, properties, body, review) in enumerate(decoded):
+        review_id = review.review_id
+        if position not in fresh:
+            # Already processed, or repeated within the batch: acked with the rest, nothing to write.
+            logger.debug(f"Review {review_id} already processed. Skipping.")
+            metrics.DUPLICATES.inc()
+            valid.append((method, properties, body, None))
+            continue
+
+        try:
+            sentiment = sentiments.get(position) or analyze_sentiment(review.comment)
+        except Exception as e:
+            logger.error(f"Error processing message {review_id}: {e}")
+            retry_or_reject(ch, method.delivery_tag, properties, body, e, source_queue(method))
+            continue
+
+        row = review.row(sentiment, datetime.utcnow())
+        valid.append((method, properties, body, row))
+    metrics.STAGE_SENTIMENT.observe(time.perf_counter() - sentiment_started)
+
+    if not valid:
+        return
+
+    rows = [row for _, _, _, row in valid if row is not None]
+    commit_started = time.perf_counter()
+    try:
+        with connection.begin():
+            inserted_ids = bulk_insert_reviews(connection, rows)
+            increment_product_rollups(connection, [row for row in rows if row['review_id'] in inserted_ids])
+            events = {}
+            for method, properties, body, row in valid:
+                if row is not None and row['review_id'] in inserted_ids:
+                    events[method.delivery_tag] = {
+                        "reviewId": row['review_id'],
+                        "sentiment": row['sentiment'],
+                        "processedTimestamp": row['processed_timestamp'].isoformat()
+                    }
+            if OUTBOX_ENABLED:
+                add_outbox_events(connection, list(events.values()))
+        metrics.STAGE_COMMIT.observe(time.perf_counter() - commit_started)
+    except Exception as e:
+        # One bad row fails the whole statement, so fall back to per-message
+        # processing to isolate it and keep the rest of the batch flowing.
+        logger.error(f"Batch insert of {len(rows)} reviews failed: {e}. Falling back to per-message processing.")
+        for method, properties, body, _ in valid:
+            process_message(ch, method, properties, body, publisher, deduplicator)
+        return
+
+    if deduplicator is not None:
+        deduplicator.mark_processed(inserted_ids)
+
+    logger.info(f"Saved {len(inserted_ids)} of {len(rows)} reviews in batch to DB.")
+    metrics.DUPLICATES.inc(len(rows) - len(inserted_ids))
+
+    # With the outbox enabled the relay publishes the events. With confirms enabled the whole batch is pipelined; either way, the acks of
+    # deliveries whose events were not published (or not confirmed) are held back.
+    failed = {}  # reviewId -> why its event was not published
+    if events and not OUTBOX_ENABLED:
+        batch_events = list(events.values())
+        try:
+            with metrics.STAGE_PUBLISH.time():
+                for position in publisher.publish_many(batch_events):
+                    review_id = batch_events[position]['reviewId']
+                    failed[review_id] = PublishNackedError(f"Event for review {review_id} was not confirmed.")
+        except Exception as e:
+            logger.error(f"Error publishing batch of {len(events)} events: {e}")
+            failed = {event['reviewId']: e for event in batch_events}
+        for review_id in failed:
+            logger.error(f"Event for review {review_id} was not published.")
+
+    ack_tag = None
+    for method, properties, body, row in valid:
+        event = events.get(method.delivery_tag)
+        if event is not None and event['reviewId'] in failed:
+            retry_or_reject(ch, method.delivery_tag, properties, body, failed[event['reviewId']], source_queue(method))
+            continue
+        ack_tag = method.delivery_tag if ack_tag is None else max(ack_tag, method.delivery_tag)
+
+    # Retried and rejected deliveries are already settled, so a multiple-ack up to
+    # the highest handled tag only covers the ones we want to acknowledge.
+    if ack_tag is not None:
+        ch.basic_ack(delivery_tag=ack_tag, multiple=True)
+
+class ReviewBatcher:
+    """
+    Buffers deliveries and hands them to process_batch as one micro-batch.
+
+    A batch is flushed once it holds `max_size` deliveries, or `max_wait_ms`
+    milliseconds after its first delivery arrived, whichever comes first.
+    """
+
+    def __init__(self, connection, channel, publisher, max_size=BATCH_SIZE, max_wait_ms=BATCH_TIMEOUT_MS,
+                 deduplicator=None):
+        self.connection = connection
+        self.channel = channel
+        self.publisher = publisher
+        self.deduplicator = deduplicator
+        self.max_size = max_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.pending = []
+        self._timer = None
+
+    def on_message(self, ch, method, properties, body):
+        """basic_consume callback: buffers the delivery and flushes when full."""
+        self.pending.append((method, properties, body))
+        if len(self.pending) >= self.max_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = self.connection.call_later(self.max_wait, self._on_timeout)
+
+    def _on_timeout(self):
+        self._timer = None
+        self.flush()
+
+    def flush(self):
+        """Processes everything buffered so far."""
+        if self._timer is not None:
+            self.connection.remove_timeout(self._timer)
+            self._timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            process_batch(self.channel, batch, self.publisher, self.deduplicator)
+
+class ScoringOffloader:
+    """
+    Runs sentiment scoring in a pool of warm worker processes.
+
+    Decoding, validation and the idempotency check stay on the connection thread.
+    Scoring is submitted to the pool, and each result is handed back to the
+    connection thread via connection.add_callback_threadsafe, where the review is
+    saved, published and acked. This keeps long comments from blocking pika's I/O
+    (and heartbeats) and spreads scoring across cores. Every review in the pool is
+    unacked, so the channel prefetch (SENTIMENT_MAX_IN_FLIGHT, set by main())
+    bounds the work in flight.
+
+    If a worker dies (e.g. to the OOM killer) the pool breaks: it is replaced, and
+    the reviews it held go through the retry policy.
+    """
+
+    def __init__(self, connection, publisher, executor=None, workers=SENTIMENT_WORKERS, deduplicator=None):
+        self.connection = connection
+        self.publisher = publisher
+        self.deduplicator = deduplicator
+        self.workers = workers
+        self.executor = executor or self._new_executor()
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=warm_up)
+
+    def _replace_broken(self, executor):
+        """Swaps in a fresh pool, unless `executor` was already replaced."""
+        if executor is self.executor:
+            logger.error("Scoring pool is broken (a worker died). Starting a new one.")
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = self._new_executor()
+
+    def on_message(self, ch, method, properties, body):
+        """basic_consume callback: validates and dedups, then submits scoring to the pool."""
+        review_id = "unknown"
+        try:
+            review = ReviewMessage.decode(body, properties)
+            review_id = review.review_id
+
+            connection = get_db_connection()
+            with connection.begin():
+                existing_review = review_id in find_existing(connection, [review_id], self.deduplicator)
+            if existing_review:
+                logger.debug(f"Review {review_id} already processed. Skipping.")
+                ch.basic_ack(delivery_tag=method.delivery_tag)
+                return
+        except InvalidMessage as e:
+            reject_invalid(ch, method, properties, body, e)
+            return
+        except Exception as e:
+            logger.error(f"Error processing message {review_id}: {e}")
+            retry_or_reject(ch, method.delivery_tag, properties, body, e, source_queue(method))
+            return
+
+        executor = self.executor
+        try:
+            future = executor.submit(analyze_sentiment, review.comment)
+        except Exception as e:
+            logger.error(f"Could not submit review {review_id} for scoring: {e}")
+            if isinstance(e, BrokenExecutor):
+                self._replace_broken(executor)
+            retry_or_reject(ch, method.delivery_tag, properties, body, e, source_queue(method))
+            return
+        future.add_done_callback(
+            lambda f: self.connection.add_callback_threadsafe(
+                partial(self._on_scored, ch, method, properties, body, review, f, executor)
+            )
+        )
+
+    def _on_scored(self, ch, method, properties, body, review, future, executor=None):
+        """Runs on the connection thread once a worker has scored the review."""
+        review_id = review.review_id
+        try:
+            try:
+                sentiment = future.result()
+            except BrokenExecutor:
+                self._replace_broken(executor)
+                raise
+            save_and_publish(ch, method, get_db_connection(), review, sentiment, self.publisher, self.deduplicator,
+                             {} if sampled() else None)
+        except IntegrityError:
+            logger.warning(f"Integrity Error for {review_id}. Review likely already exists. Treating as duplicate and Acking.")
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+        except Exception as e:
+            logger.error(f"Error processing message {review_id}: {e}")
+            retry_or_reject(ch, method.delivery_tag, properties, body, e, source_queue(method))
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def first_message_reporter(started_at):
+    """
+    Returns a callable that, on its first call only, logs the time since `started_at`
+    as the time_to_first_message startup metric.
+    """
+    reported = False
+
+    def report():
+        nonlocal reported
+        if not reported:
+            reported = True
+            logger.info(f"Startup metric: time_to_first_message={time.monotonic() - started_at:.3f}s")
+    return report
+
+def _instrumented(callback, report_first_message, channel, profiler=None):
+    """
+    Wraps a basic_consume callback so the first delivery is reported, every
+    delivery is tracked, and settled, through the metered channel, and counted
+    towards the profiler's session.
+    """
+    def on_message(ch, method, properties, body):
+        report_first_message()
+        channel.track(method.delivery_tag)
+        try:
+            return callback(channel, method, properties, body)
+        finally:
+            if profiler is not None:
+                profiler.message_done()
+    return on_message
+
+def main(queues=None):
+    """
+    Runs a consumer.
+
+    Args:
+        queues (list): Live queues to consume from; defaults to the main product_reviews queue.
+            The bulk lane is consumed as well when BULK_LANE_ENABLED.
+    """
+    queues = queues or [QUEUE_NAME]
+    bulk_queues = [BULK_QUEUE_NAME] if BULK_LANE_ENABLED else []
+    started_at = time.monotonic()
     logger.info("Starting Review Processor...")
     
     while True:
@@ -165,24 +663,107 @@ def main():
             logger.warning(f"Database not ready: {e}. Retrying...")
             time.sleep(5)
 
+    # Restore memoized sentiment results so a restarted consumer does not start cold.
+    sentiment_cache.load_snapshot()
+    sentiment_cache.start_snapshots()
+    atexit.register(sentiment_cache.stop_snapshots)
+
+    deduplicator = None
+    if DEDUP_ENABLED:
+        deduplicator = ReviewDeduplicator()
+        session = next(get_db_session())
+        try:
+            deduplicator.seed(session)
+        finally:
+            session.close()
+
+    publisher_factory = ConfirmingEventPublisher if PUBLISH_CONFIRMS else EventPublisher
+
+    # Load the sentiment lexicon(s) now rather than on the first review.
+    warm_up_seconds = warm_up(vectorized=VECTORIZED_SENTIMENT)
+    logger.info(f"Startup metric: warm_up={warm_up_seconds:.3f}s")
+    report_first_message = first_message_reporter(started_at)
+    metrics.start_metrics_server(metrics.METRICS_PORT)
+    profiler = profiling.install()
+
+    if CONSUMER_ENGINE == 'asyncio':
+        from src.async_consumer import run_async_consumer
+
+        logger.info("Using asyncio consumer engine.")
+
+        def on_delivery():
+            report_first_message()
+            profiler.message_done()
+
+        try:
+            asyncio.run(run_async_consumer(connect, setup_queues, queues, publisher_factory,
+                                           deduplicator=deduplicator, outbox=OUTBOX_ENABLED,
+                                           on_delivery=on_delivery, retry_queue=QUEUE_NAME,
+                                           dead_letter_exchange=DLX_NAME, bulk_queues=bulk_queues,
+                                           lane_prefetch=lane_prefetch))
+        except KeyboardInterrupt:
+            logger.info('Interrupted')
+        return
+
     connection = connect()
     channel = connection.channel()
 
     # Setup Queues & DLQ
     setup_queues(channel)
     
-    # Initialize Publisher
-    publisher = EventPublisher(channel)
+    # Initialize Publisher on its own channel: retry and DLQ republishes on the consuming channel
+    # would otherwise take publisher-confirm sequence numbers the publisher does not count.
+    publisher = publisher_factory(connection.channel())
 
-    channel.basic_qos(prefetch_count=1)
-    
-    # Use partial to pass publisher to callback
-    from functools import partial
-    on_message_callback = partial(process_message, publisher=publisher)
-    
-    channel.basic_consume(queue=QUEUE_NAME, on_message_callback=on_message_callback)
+    # Acks and rejects go through the metered channel so outcomes and in-flight are counted.
+    metered = metrics.MeteredChannel(channel)
+    metrics.QueueDepthSampler(connection, channel, queues, background=bulk_queues).start()
+
+    batcher = None
+    if BATCH_SIZE > 1:
+        # Prefetch must cover a whole batch or it can only ever flush on timeout.
+        prefetch_count = BATCH_SIZE
+        batcher = ReviewBatcher(connection, metered, publisher, deduplicator=deduplicator)
+        on_message_callback = batcher.on_message
+        logger.info(f"Batching enabled: up to {BATCH_SIZE} messages or {BATCH_TIMEOUT_MS}ms per batch.")
+    elif SENTIMENT_WORKERS > 0:
+        # Every review in the pool is unacked, so prefetch bounds the in-flight work.
+        prefetch_count = SENTIMENT_MAX_IN_FLIGHT
+        offloader = ScoringOffloader(connection, publisher, deduplicator=deduplicator)
+        atexit.register(offloader.shutdown)
+        on_message_callback = offloader.on_message
+        logger.info(f"Scoring offloaded to {SENTIMENT_WORKERS} worker processes, up to {SENTIMENT_MAX_IN_FLIGHT} in flight.")
+    else:
+        prefetch_count = 1
+
+        # Use partial to pass publisher to callback
+        on_message_callback = partial(process_message, publisher=publisher, deduplicator=deduplicator)
+
+    # Per-consumer prefetch windows weight the live and bulk lanes.
+    consumers = LaneConsumers(channel, queues, bulk_queues,
+                              _instrumented(on_message_callback, report_first_message, metered, profiler))
+    consumers.set_prefetch(prefetch_count)
+    if bulk_queues:
+        live_prefetch, bulk_prefetch = consumers.windows
+        logger.info(f"Bulk lane {BULK_QUEUE_NAME} enabled: prefetch {live_prefetch} live / {bulk_prefetch} bulk.")
+
+    if ADAPTIVE_ENABLED and (batcher is not None or SENTIMENT_WORKERS > 0):
+        # Starts from the configured values and tunes the lane windows (and batch size) from observed latency.
+        prefetch = AIMD(prefetch_count, ADAPTIVE_PREFETCH_MIN, ADAPTIVE_PREFETCH_MAX, ADAPTIVE_PREFETCH_STEP)
+        batch = AIMD(BATCH_SIZE, ADAPTIVE_BATCH_MIN, ADAPTIVE_BATCH_MAX, ADAPTIVE_BATCH_STEP) if batcher else None
+        AdaptiveTuner(connection, metered, prefetch, consumers, batcher=batcher, batch=batch).start()
+        logger.info(f"Adaptive prefetch enabled, starting at {prefetch.value}.")
+    else:
+        if ADAPTIVE_ENABLED:
+            # One message is handled at a time, so at most one is ever unacked and there is nothing to tune.
+            logger.warning("ADAPTIVE_ENABLED needs BATCH_SIZE > 1 or SENTIMENT_WORKERS > 0; "
+                           f"keeping prefetch at {prefetch_count}.")
+        metrics.PREFETCH.set(prefetch_count)
+        if batcher is not None:
+            metrics.BATCH_SIZE.set(BATCH_SIZE)
 
-    logger.info('Waiting for messages.')
+    logger.info(f"Startup metric: time_to_ready={time.monotonic() - started_at:.3f}s")
+    logger.info(f"Waiting for messages on {', '.join(queues + bulk_queues)}.")
     try:
         channel.start_consuming()
     except KeyboardInterrupt:
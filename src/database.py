@@ -1,8 +1,18 @@
-from sqlalchemy import create_engine, Column, String, Integer, Text, DateTime
+from sqlalchemy import create_engine, Column, String, Integer, BigInteger, Text, DateTime, Index, case, delete, func, insert, inspect, select, text, update
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.dialects import postgresql, sqlite
+import csv
+import io
+import json
+import logging
 import os
+import re
+import threading
+import time
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 # Database Configuration
 DB_USER = os.getenv('DB_USER', 'user')
 DB_PASS = os.getenv('DB_PASS', 'password')
@@ -11,24 +21,266 @@ DB_NAME = os.getenv('DB_NAME', 'reviews_db')
 
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:5432/{DB_NAME}"
 
-engine = create_engine(DATABASE_URL)
+# Connection Pool Configuration
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+# A worker's connection idle this many seconds goes back to the pool, and is pinged when checked out again.
+DB_CONNECTION_MAX_IDLE = float(os.getenv('DB_CONNECTION_MAX_IDLE', '30'))
+# Rows per INSERT ... VALUES page when an executemany is batched into multi-row statements.
+DB_INSERT_PAGE_SIZE = int(os.getenv('DB_INSERT_PAGE_SIZE', '1000'))
+
+# Partitioning Configuration: init_db creates monthly processed_reviews partitions this many months ahead
+PARTITION_MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', '3'))
+
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    pool_recycle=DB_POOL_RECYCLE,
+    executemany_mode='values_plus_batch',
+    insertmanyvalues_page_size=DB_INSERT_PAGE_SIZE,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 class ProcessedReview(Base):
+    """
+    A processed review.
+
+    On Postgres the table is range-partitioned by month on processed_timestamp,
+    so its primary key has to include that column. review_id uniqueness across
+    partitions, archived ones included, is enforced by processed_review_ids.
+    """
     __tablename__ = 'processed_reviews'
 
-    review_id = Column(String(255), primary_key=True, index=True)
-    product_id = Column(String(255), nullable=False)
+    review_id = Column(String(255), primary_key=True)
+    product_id = Column(String(255), nullable=False, index=True)
     user_id = Column(String(255), nullable=False)
     rating = Column(Integer, nullable=False)
     comment = Column(Text, nullable=False)
     sentiment = Column(String(50), nullable=False)
-    processed_timestamp = Column(DateTime, default=datetime.utcnow)
+    processed_timestamp = Column(DateTime, primary_key=True, default=datetime.utcnow)
+
+    __table_args__ = {'postgresql_partition_by': 'RANGE (processed_timestamp)'}
+
+class ProcessedReviewId(Base):
+    """Every review_id ever stored, including those of archived partitions; the idempotency registry."""
+    __tablename__ = 'processed_review_ids'
+
+    review_id = Column(String(255), primary_key=True)
+
+class OutboxEvent(Base):
+    """A ReviewProcessed event written in the same transaction as its review, awaiting relay."""
+    __tablename__ = 'outbox'
+
+    id = Column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    review_id = Column(String(255), nullable=False)
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+
+    # Relays only ever scan unsent rows, so keep that index small.
+    __table_args__ = (
+        Index('ix_outbox_unsent', 'id', postgresql_where=sent_at.is_(None), sqlite_where=sent_at.is_(None)),
+    )
+
+class ProductSentimentRollup(Base):
+    """Per-product review counts, kept up to date in the same transaction as each insert."""
+    __tablename__ = 'product_sentiment_rollup'
+
+    product_id = Column(String(255), primary_key=True)
+    positive_count = Column(BigInteger, nullable=False, default=0)
+    negative_count = Column(BigInteger, nullable=False, default=0)
+    neutral_count = Column(BigInteger, nullable=False, default=0)
+    rating_sum = Column(BigInteger, nullable=False, default=0)
+    rating_count = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+_SENTIMENT_COUNT_COLUMNS = {
+    'POSITIVE': 'positive_count',
+    'NEGATIVE': 'negative_count',
+    'NEUTRAL': 'neutral_count',
+}
+
+def configure_engine(url, **kwargs):
+    """
+    Rebinds the module's engine and SessionLocal to another database URL.
+
+    Used by the benchmarks to run the real consumer code against SQLite.
+    """
+    global engine
+    engine = create_engine(url, **kwargs)
+    SessionLocal.configure(bind=engine)
+    _local.__dict__.clear()
+    return engine
 
 def init_db():
-    """Creates the database tables."""
+    """
+    Creates the database tables, and any indexes missing from existing ones.
+
+    The first time processed_review_ids is created it is filled from the reviews
+    already stored. On Postgres, the monthly processed_reviews partitions are
+    created up to PARTITION_MONTHS_AHEAD months ahead.
+    """
+    registry_exists = inspect(engine).has_table(ProcessedReviewId.__tablename__)
     Base.metadata.create_all(bind=engine)
+    # create_all skips tables that already exist, so indexes added later need their own pass.
+    for index in ProcessedReview.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    with engine.begin() as connection:
+        if not registry_exists:
+            # SQLite only parses INSERT ... SELECT ... ON CONFLICT when the SELECT has a WHERE clause.
+            existing = select(ProcessedReview.review_id).where(ProcessedReview.review_id.is_not(None)).distinct()
+            connection.execute(
+                _dialect_insert(connection)(ProcessedReviewId)
+                .from_select(['review_id'], existing)
+                .on_conflict_do_nothing(index_elements=['review_id'])
+            )
+        ensure_review_partitions(connection)
+
+def month_start(value):
+    """The first instant of `value`'s month."""
+    return datetime(value.year, value.month, 1)
+
+def add_months(month, months):
+    """The first instant of the month `months` after (or before, if negative) `month`."""
+    year, index = divmod(month.year * 12 + month.month - 1 + months, 12)
+    return datetime(year, index + 1, 1)
+
+def review_partition_name(month):
+    """The name of the processed_reviews partition holding `month`, e.g. processed_reviews_y2024m03."""
+    return f"processed_reviews_y{month.year:04d}m{month.month:02d}"
+
+_REVIEW_PARTITION_NAME = re.compile(r'^processed_reviews_y(\d{4})m(\d{2})$')
+
+def _review_table_kind(connection):
+    """'p' if processed_reviews is partitioned, 'r' if it is a plain (pre-partitioning) table."""
+    return connection.execute(text(
+        "SELECT relkind FROM pg_class WHERE oid = to_regclass('processed_reviews')"
+    )).scalar()
+
+def _create_review_partition(connection, month):
+    name = review_partition_name(month)
+    bounds = {'lower': month, 'upper': add_months(month, 1)}
+    values = f"FOR VALUES FROM ('{month.isoformat()}') TO ('{bounds['upper'].isoformat()}')"
+    stray = connection.execute(text(
+        "SELECT 1 FROM processed_reviews_default "
+        "WHERE processed_timestamp >= :lower AND processed_timestamp < :upper LIMIT 1"
+    ), bounds).first()
+    if stray is None:
+        connection.execute(text(f"CREATE TABLE {name} PARTITION OF processed_reviews {values}"))
+        return
+    # Attaching a partition fails while the default partition holds rows in its range, so move them first.
+    connection.execute(text(f"CREATE TABLE {name} (LIKE processed_reviews INCLUDING DEFAULTS)"))
+    connection.execute(text(
+        f"WITH moved AS (DELETE FROM processed_reviews_default "
+        f"WHERE processed_timestamp >= :lower AND processed_timestamp < :upper RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), bounds)
+    connection.execute(text(f"ALTER TABLE processed_reviews ATTACH PARTITION {name} {values}"))
+
+def ensure_review_partitions(connection, months_ahead=PARTITION_MONTHS_AHEAD, start=None):
+    """
+    Creates the monthly processed_reviews partitions from `start` to `months_ahead` months from now.
+
+    Also creates a default partition, so a write is never refused for lack of a
+    partition; rows that land there are moved into their month when its partition
+    is created. Does nothing on other dialects, or (with a warning) if
+    processed_reviews predates partitioning.
+
+    Args:
+        connection: An open Core connection, in a transaction.
+        months_ahead (int): How many months after the current one to cover.
+        start (datetime): The earliest month to cover; defaults to the current month.
+
+    Returns:
+        list: The names of the partitions created.
+    """
+    if _dialect_name(connection) != 'postgresql':
+        return []
+    if _review_table_kind(connection) != 'p':
+        logger.warning("processed_reviews is not partitioned; run `python src/archive.py migrate` to convert it.")
+        return []
+    connection.execute(text("CREATE TABLE IF NOT EXISTS processed_reviews_default PARTITION OF processed_reviews DEFAULT"))
+    now = month_start(datetime.utcnow())
+    month = month_start(start) if start is not None else now
+    created = []
+    while month <= add_months(now, months_ahead):
+        name = review_partition_name(month)
+        if connection.execute(text("SELECT to_regclass(:name)"), {'name': name}).scalar() is None:
+            _create_review_partition(connection, month)
+            created.append(name)
+        month = add_months(month, 1)
+    if created:
+        logger.info(f"Created processed_reviews partitions {created}.")
+    return created
+
+def list_review_partitions(connection):
+    """
+    Returns the monthly partitions attached to processed_reviews.
+
+    Returns:
+        list: (month, partition name) tuples, oldest first.
+    """
+    result = connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass('processed_reviews')"
+    ))
+    partitions = []
+    for (name,) in result:
+        match = _REVIEW_PARTITION_NAME.match(name)
+        if match:
+            partitions.append((datetime(int(match.group(1)), int(match.group(2)), 1), name))
+    return sorted(partitions)
+
+def detach_review_partition(connection, name, drop=True):
+    """
+    Detaches a monthly partition from processed_reviews, and drops it unless `drop` is False.
+
+    Its review_ids stay in processed_review_ids, so those reviews are still
+    recognised as duplicates. The caller is responsible for committing.
+    """
+    if not _REVIEW_PARTITION_NAME.match(name):
+        raise ValueError(f"{name!r} is not a monthly processed_reviews partition")
+    connection.execute(text(f"ALTER TABLE processed_reviews DETACH PARTITION {name}"))
+    if drop:
+        connection.execute(text(f"DROP TABLE {name}"))
+
+def partition_legacy_reviews(connection):
+    """
+    Converts a processed_reviews table created before partitioning into monthly partitions.
+
+    The old table is renamed, its rows are copied into a new partitioned table
+    whose partitions cover them, and it is then dropped, all in the caller's
+    transaction. This rewrites the whole table under an exclusive lock, so run it
+    in a maintenance window.
+
+    Returns:
+        int: The number of rows moved (0 if the table is already partitioned).
+    """
+    if _review_table_kind(connection) != 'r':
+        return 0
+    connection.execute(text("ALTER TABLE processed_reviews RENAME TO processed_reviews_legacy"))
+    connection.execute(text(
+        "ALTER TABLE processed_reviews_legacy RENAME CONSTRAINT processed_reviews_pkey TO processed_reviews_legacy_pkey"
+    ))
+    # Index names are per schema; the new table recreates the ones it needs.
+    for index in ('ix_processed_reviews_review_id', *(index.name for index in ProcessedReview.__table__.indexes)):
+        connection.execute(text(f"DROP INDEX IF EXISTS {index}"))
+    ProcessedReview.__table__.create(bind=connection)
+    oldest = connection.execute(text("SELECT min(processed_timestamp) FROM processed_reviews_legacy")).scalar()
+    ensure_review_partitions(connection, start=oldest)
+    columns = ', '.join(REVIEW_COLUMNS)
+    result = connection.execute(text(
+        f"INSERT INTO processed_reviews ({columns}) "
+        f"SELECT review_id, product_id, user_id, rating, comment, sentiment, "
+        f"COALESCE(processed_timestamp, now() AT TIME ZONE 'utc') FROM processed_reviews_legacy"
+    ))
+    connection.execute(text("DROP TABLE processed_reviews_legacy"))
+    return result.rowcount
 
 def get_db_session():
     """Provides a transactional scope around a series of operations."""
@@ -37,3 +289,309 @@ def get_db_session():
         yield session
     finally:
         session.close()
+
+_local = threading.local()
+
+def get_db_connection():
+    """
+    Returns this worker's long-lived Core connection.
+
+    The write path runs Core statements on one connection per process (and
+    thread) instead of checking out a new ORM Session per message. Callers
+    scope their work with `with connection.begin():`. The connection is replaced
+    if it was closed or invalidated (e.g. after a database restart), or if the
+    process was forked since it was opened.
+
+    Outside a transaction, a connection held for DB_POOL_RECYCLE seconds or idle
+    for DB_CONNECTION_MAX_IDLE is returned to the pool and a new one checked out,
+    so pool_recycle and pool_pre_ping still apply: a connection the server timed
+    out while idle is replaced transparently rather than failing a message.
+    """
+    connection = getattr(_local, 'connection', None)
+    now = time.monotonic()
+    if connection is not None and _local.pid == os.getpid() and not connection.in_transaction() and (
+            (DB_POOL_RECYCLE > 0 and now - _local.checked_out_at >= DB_POOL_RECYCLE)
+            or (DB_CONNECTION_MAX_IDLE > 0 and now - _local.used_at >= DB_CONNECTION_MAX_IDLE)):
+        connection.close()
+    if connection is None or connection.closed or connection.invalidated or _local.pid != os.getpid():
+        connection = _local.connection = engine.connect()
+        _local.pid = os.getpid()
+        _local.checked_out_at = now
+    _local.used_at = now
+    return connection
+
+def _dialect_name(bind):
+    """Returns the dialect name of a Session or Connection."""
+    return bind.get_bind().dialect.name if hasattr(bind, 'get_bind') else bind.dialect.name
+
+def _dialect_insert(session):
+    """Returns the dialect-specific insert() that supports ON CONFLICT."""
+    if _dialect_name(session) == 'sqlite':
+        return sqlite.insert
+    return postgresql.insert
+
+_register_review_id_statements = {}
+
+def _register_review_id_statement(session):
+    """The INSERT ... ON CONFLICT DO NOTHING RETURNING review_id statement, built once per dialect."""
+    dialect = _dialect_name(session)
+    stmt = _register_review_id_statements.get(dialect)
+    if stmt is None:
+        stmt = _register_review_id_statements[dialect] = (
+            _dialect_insert(session)(ProcessedReviewId)
+            .on_conflict_do_nothing(index_elements=['review_id'])
+            .returning(ProcessedReviewId.review_id)
+        )
+    return stmt
+
+def bulk_insert_reviews(session, rows):
+    """
+    Inserts many reviews, skipping review_ids that were already processed.
+
+    The ids are first claimed in processed_review_ids with INSERT ... ON CONFLICT
+    (review_id) DO NOTHING, and only the reviews whose id was claimed are then
+    inserted. Both statements are built once and run as an executemany, so their
+    compiled forms are cached whatever the batch size; SQLAlchemy sends them as
+    multi-row VALUES pages of DB_INSERT_PAGE_SIZE rows.
+
+    Args:
+        session: An open database session or Core connection. The caller is
+            responsible for committing.
+        rows (list[dict]): Column values keyed by ProcessedReview column name.
+
+    Returns:
+        set: The review_ids that were actually inserted (existing rows are skipped).
+    """
+    if not rows:
+        return set()
+
+    result = session.execute(_register_review_id_statement(session), [{'review_id': row['review_id']} for row in rows])
+    inserted = {row[0] for row in result}
+    if inserted:
+        # The first row wins if an id appears more than once in the batch.
+        claimed = set(inserted)
+        new_rows = []
+        for row in rows:
+            if row['review_id'] in claimed:
+                claimed.discard(row['review_id'])
+                new_rows.append(row)
+        session.execute(insert(ProcessedReview), new_rows)
+    return inserted
+
+REVIEW_COLUMNS = ('review_id', 'product_id', 'user_id', 'rating', 'comment', 'sentiment', 'processed_timestamp')
+
+def copy_merge_reviews(session, rows):
+    """
+    Bulk-loads reviews, skipping review_ids that already exist.
+
+    On Postgres the rows are streamed with COPY into a temporary staging table; one
+    statement then claims their ids in processed_review_ids (ON CONFLICT DO
+    NOTHING) and inserts SELECT DISTINCT ON (review_id) the claimed rows. The
+    staging table is emptied on commit. Other dialects fall back to
+    bulk_insert_reviews.
+
+    Args:
+        session: An open database session. The caller is responsible for committing.
+        rows (list[dict]): Column values keyed by ProcessedReview column name.
+
+    Returns:
+        set: The review_ids that were actually inserted.
+    """
+    if not rows:
+        return set()
+
+    if _dialect_name(session) != 'postgresql':
+        return bulk_insert_reviews(session, rows)
+
+    columns = ', '.join(REVIEW_COLUMNS)
+    session.execute(text(
+        "CREATE TEMP TABLE IF NOT EXISTS processed_reviews_staging "
+        "(LIKE processed_reviews INCLUDING DEFAULTS) ON COMMIT DELETE ROWS"
+    ))
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row.get(column) for column in REVIEW_COLUMNS])
+    buffer.seek(0)
+
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY processed_reviews_staging ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+    result = session.execute(text(
+        f"WITH claimed AS ("
+        f"INSERT INTO processed_review_ids (review_id) SELECT DISTINCT review_id FROM processed_reviews_staging "
+        f"ON CONFLICT (review_id) DO NOTHING RETURNING review_id) "
+        f"INSERT INTO processed_reviews ({columns}) "
+        f"SELECT DISTINCT ON (review_id) {columns} FROM processed_reviews_staging JOIN claimed USING (review_id) "
+        f"ORDER BY review_id RETURNING review_id"
+    ))
+    return {row[0] for row in result}
+
+def fetch_existing_review_ids(session, review_ids):
+    """
+    Returns the subset of review_ids already processed, including archived reviews.
+
+    Looks them up in processed_review_ids with a single `review_id = ANY(:ids)`
+    round trip on Postgres (IN on other dialects).
+    """
+    review_ids = list(review_ids)
+    if not review_ids:
+        return set()
+
+    if _dialect_name(session) == 'postgresql':
+        result = session.execute(
+            text("SELECT review_id FROM processed_review_ids WHERE review_id = ANY(:ids)"),
+            {'ids': review_ids}
+        )
+    else:
+        result = session.execute(
+            select(ProcessedReviewId.review_id).where(ProcessedReviewId.review_id.in_(review_ids))
+        )
+    return {row[0] for row in result}
+
+def iter_review_ids(session, chunk_size=10000):
+    """Streams every processed review_id, archived ones included, without loading them all into memory."""
+    result = session.execute(
+        select(ProcessedReviewId.review_id).execution_options(yield_per=chunk_size)
+    )
+    for row in result:
+        yield row[0]
+
+def increment_product_rollups(session, rows):
+    """
+    Adds newly inserted reviews to product_sentiment_rollup.
+
+    Rows are aggregated per product first and applied with a single
+    INSERT ... ON CONFLICT (product_id) DO UPDATE that increments the counters, in
+    product_id order so concurrent writers lock rollup rows in the same order.
+    Only pass reviews that were actually inserted, or duplicates get counted twice.
+
+    Args:
+        session: An open database session. The caller is responsible for committing,
+            in the same transaction as the reviews.
+        rows (list[dict]): Reviews with product_id, sentiment and rating.
+    """
+    if not rows:
+        return
+    now = datetime.utcnow()
+    totals = {}
+    for row in rows:
+        total = totals.get(row['product_id'])
+        if total is None:
+            total = totals[row['product_id']] = {
+                'product_id': row['product_id'], 'positive_count': 0, 'negative_count': 0, 'neutral_count': 0,
+                'rating_sum': 0, 'rating_count': 0, 'updated_at': now,
+            }
+        total[_SENTIMENT_COUNT_COLUMNS[row['sentiment']]] += 1
+        total['rating_sum'] += int(row['rating'])
+        total['rating_count'] += 1
+
+    stmt = _dialect_insert(session)(ProductSentimentRollup)
+    rollup = ProductSentimentRollup.__table__.c
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['product_id'],
+        set_={
+            **{column: rollup[column] + stmt.excluded[column] for column in
+               ('positive_count', 'negative_count', 'neutral_count', 'rating_sum', 'rating_count')},
+            'updated_at': stmt.excluded.updated_at,
+        },
+    )
+    session.execute(stmt, [totals[key] for key in sorted(totals)])
+
+def rebuild_product_rollups(session):
+    """
+    Recomputes product_sentiment_rollup from processed_reviews.
+
+    Only reviews still in the database are counted: reviews in archived
+    partitions drop out of the rebuilt rollup. On Postgres, processed_reviews is locked in SHARE mode for the duration, so
+    consumers wait instead of inserting reviews the rebuild would miss. The caller
+    is responsible for committing.
+
+    Returns:
+        int: The number of products in the rebuilt rollup.
+    """
+    if _dialect_name(session) == 'postgresql':
+        session.execute(text("LOCK TABLE processed_reviews IN SHARE MODE"))
+    session.execute(delete(ProductSentimentRollup))
+
+    def count(label):
+        return func.sum(case((ProcessedReview.sentiment == label, 1), else_=0))
+
+    aggregate = select(
+        ProcessedReview.product_id,
+        count('POSITIVE'),
+        count('NEGATIVE'),
+        count('NEUTRAL'),
+        func.sum(ProcessedReview.rating),
+        func.count(),
+        func.max(ProcessedReview.processed_timestamp),
+    ).group_by(ProcessedReview.product_id)
+    result = session.execute(insert(ProductSentimentRollup).from_select(
+        ['product_id', 'positive_count', 'negative_count', 'neutral_count', 'rating_sum', 'rating_count', 'updated_at'],
+        aggregate,
+    ))
+    return result.rowcount
+
+def get_product_stats(session, product_id):
+    """
+    Returns a product's review statistics from its rollup row.
+
+    Returns:
+        dict: Sentiment counts, total reviews, average rating and last update time,
+        or None if the product has no reviews.
+    """
+    rollup = session.get(ProductSentimentRollup, product_id)
+    if rollup is None:
+        return None
+    return {
+        'product_id': rollup.product_id,
+        'positive': rollup.positive_count,
+        'negative': rollup.negative_count,
+        'neutral': rollup.neutral_count,
+        'total': rollup.rating_count,
+        'average_rating': rollup.rating_sum / rollup.rating_count if rollup.rating_count else None,
+        'updated_at': rollup.updated_at,
+    }
+
+def add_outbox_events(session, events):
+    """
+    Queues ReviewProcessed events in the outbox as part of the caller's transaction.
+
+    Args:
+        session: An open database session. The caller is responsible for committing.
+        events (list[dict]): Event payloads; each must carry a reviewId.
+    """
+    if not events:
+        return
+    now = datetime.utcnow()
+    session.execute(insert(OutboxEvent), [
+        {'review_id': event['reviewId'], 'payload': json.dumps(event), 'created_at': now}
+        for event in events
+    ])
+
+def claim_outbox_events(session, limit):
+    """
+    Locks up to `limit` unsent outbox rows, oldest first.
+
+    Uses SELECT ... FOR UPDATE SKIP LOCKED so concurrent relays claim disjoint rows.
+    The locks are held until the caller commits or rolls back.
+    """
+    stmt = (
+        select(OutboxEvent)
+        .where(OutboxEvent.sent_at.is_(None))
+        .order_by(OutboxEvent.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return list(session.execute(stmt).scalars())
+
+def mark_outbox_sent(session, ids):
+    """Marks outbox rows as sent. The caller is responsible for committing."""
+    if not ids:
+        return
+    session.execute(
+        update(OutboxEvent).where(OutboxEvent.id.in_(list(ids))).values(sent_at=datetime.utcnow())
+    )
@@ -0,0 +1,139 @@
+import hashlib
+import logging
+import math
+import os
+from collections import OrderedDict
+
+from src.database import fetch_existing_review_ids, iter_review_ids
+
+logger = logging.getLogger(__name__)
+
+# Dedup Configuration
+DEDUP_LRU_SIZE = int(os.getenv('DEDUP_LRU_SIZE', '100000'))
+DEDUP_BLOOM_CAPACITY = int(os.getenv('DEDUP_BLOOM_CAPACITY', '1000000'))
+DEDUP_BLOOM_FP_RATE = float(os.getenv('DEDUP_BLOOM_FP_RATE', '0.01'))
+DEDUP_BLOOM_MAX_BYTES = int(os.getenv('DEDUP_BLOOM_MAX_BYTES', str(16 * 1024 * 1024)))
+
+
+class LRUSet:
+    """A bounded set that forgets its least recently used members."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+
+    def __contains__(self, key):
+        if key in self._items:
+            self._items.move_to_end(key)
+            return True
+        return False
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, key):
+        if self.max_size <= 0:
+            return
+        self._items[key] = None
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+
+class BloomFilter:
+    """
+    A fixed-size Bloom filter over strings.
+
+    Sized for `capacity` items at `fp_rate`; `max_bytes` caps the bit array,
+    trading a higher false-positive rate for bounded memory.
+    """
+
+    def __init__(self, capacity, fp_rate=0.01, max_bytes=None):
+        capacity = max(1, capacity)
+        num_bits = int(math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2)))
+        if max_bytes and num_bits > max_bytes * 8:
+            logger.warning(
+                f"Bloom filter for {capacity} ids at fp={fp_rate} needs {num_bits // 8} bytes; "
+                f"capping at {max_bytes} bytes (false-positive rate will be higher)."
+            )
+            num_bits = max_bytes * 8
+        self.num_bits = max(8, num_bits)
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Kirsch-Mitzenmacher double hashing from a single 128-bit digest.
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    @property
+    def size_bytes(self):
+        return len(self.bits)
+
+
+class ReviewDeduplicator:
+    """
+    Answers "has this review_id already been processed?" with as few DB round trips as possible.
+
+    Lookups go through three tiers:
+      1. An LRU of recently processed ids (definite duplicates).
+      2. A Bloom filter seeded from processed_review_ids (a miss means definitely new).
+      3. One batched `review_id = ANY(:ids)` query for whatever is still unresolved.
+
+    Ids processed by other consumers after startup are not in the filter, so the
+    primary key of processed_review_ids remains the final arbiter.
+    """
+
+    def __init__(self, lru_size=DEDUP_LRU_SIZE, bloom_capacity=DEDUP_BLOOM_CAPACITY,
+                 bloom_fp_rate=DEDUP_BLOOM_FP_RATE, bloom_max_bytes=DEDUP_BLOOM_MAX_BYTES):
+        self.recent = LRUSet(lru_size)
+        self.bloom = BloomFilter(bloom_capacity, bloom_fp_rate, bloom_max_bytes)
+
+    def seed(self, session):
+        """Loads every stored review_id into the Bloom filter."""
+        seeded = 0
+        for review_id in iter_review_ids(session):
+            self.bloom.add(review_id)
+            seeded += 1
+        logger.info(f"Dedup filter seeded with {seeded} review ids ({self.bloom.size_bytes} bytes).")
+        return seeded
+
+    def find_existing(self, session, review_ids):
+        """
+        Returns the subset of review_ids that have already been processed.
+
+        Args:
+            session: An open database session, used only for unresolved ids.
+            review_ids (iterable): The ids to check.
+        """
+        existing = set()
+        unresolved = []
+        for review_id in set(review_ids):
+            if review_id in self.recent:
+                existing.add(review_id)
+            elif review_id in self.bloom:
+                unresolved.append(review_id)
+
+        if unresolved:
+            found = fetch_existing_review_ids(session, unresolved)
+            for review_id in found:
+                self.recent.add(review_id)
+            existing |= found
+        return existing
+
+    def mark_processed(self, review_ids):
+        """Records ids that are now committed to processed_reviews."""
+        for review_id in review_ids:
+            self.recent.add(review_id)
+            self.bloom.add(review_id)
@@ -0,0 +1,430 @@
+import logging
+import os
+import re
+import sys
+from functools import lru_cache
+from itertools import repeat
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Precompiled lexicon baked into the image at build time (see Dockerfile); compiled from TextBlob if absent.
+SENTIMENT_LEXICON_PATH = os.getenv('SENTIMENT_LEXICON_PATH', '')
+
+# Token kinds in the compiled vocabulary (unknown tokens map to id -1).
+KIND_WORD = 1
+KIND_EMOTICON = 2
+KIND_NEGATION = 3
+KIND_EXCLAMATION = 4
+KIND_SEPARATOR = 5
+
+# Separates documents in the joined batch string; stripped from user text first.
+SEPARATOR = '\x00'
+
+NEGATIONS = ('no', 'not', 'never')  # "n't" never survives TextBlob's quote splitting
+
+# Pattern's tokenizer rules (textblob/_text.py find_tokens), reproduced so the
+# vectorized scorer sees exactly the tokens PatternAnalyzer sees.
+_PUNCTUATION = tuple(",;:!?()[]{}`'\"@#$^&*+-|=~_")
+_TRAILING = _PUNCTUATION + ('.',)
+_ABBREVIATIONS = frozenset((
+    "a.", "adj.", "adv.", "al.", "a.m.", "c.", "cf.", "comp.", "conf.", "def.",
+    "ed.", "e.g.", "esp.", "etc.", "ex.", "f.", "fig.", "gen.", "id.", "i.e.",
+    "int.", "l.", "m.", "Med.", "Mil.", "Mr.", "n.", "n.q.", "orig.", "pl.",
+    "pred.", "pres.", "p.m.", "ref.", "v.", "vs.", "w/"
+))
+_RE_ABBR = re.compile(r"^(?:[A-Za-z]\.|([A-Za-z]\.)+|[A-Z][bcdfghjklmnpqrstvwxz]+.)$")
+_CONTRACTIONS = re.compile(r"('d|'m|'s|'ll|'re|'ve|n't)")
+_QUOTES = ('“', '”', '‘', '’', "'", '"')
+_SARCASM = re.compile(r"\( ?\! ?\)")
+# Trailing punctuation quick_polarity splits off a word itself; any other chunk that
+# is not a plain word (contractions, quotes, glued emoticons) goes through tokenize().
+_QUICK_TRAILING = '.,!?'
+
+
+@lru_cache(maxsize=65536)
+def _split_punctuation(chunk):
+    """Splits leading and trailing punctuation off a whitespace-delimited chunk."""
+    tokens, tail = [], []
+    while chunk.startswith(_PUNCTUATION):
+        tokens.append(chunk[0])
+        chunk = chunk[1:]
+    while chunk.endswith(_TRAILING):
+        if chunk.endswith(_PUNCTUATION):
+            tail.append(chunk[-1])
+            chunk = chunk[:-1]
+        if chunk.endswith('...'):
+            tail.append('...')
+            chunk = chunk[:-3].rstrip('.')
+        if chunk.endswith('.'):
+            if _is_abbreviation(chunk):
+                break
+            tail.append('.')
+            chunk = chunk[:-1]
+    if chunk:
+        tokens.append(chunk)
+    tokens.extend(reversed(tail))
+    return tuple(tokens)
+
+
+def _is_abbreviation(chunk):
+    return chunk in _ABBREVIATIONS or _RE_ABBR.match(chunk) is not None
+
+
+def _build_emoticon_pattern(faces):
+    """Re-joins faces split apart by punctuation splitting, e.g. ": )" -> ":)"."""
+    faces = sorted(faces, key=len, reverse=True)
+    first_chars = re.escape(''.join(sorted({face[0] for face in faces})))
+    alternatives = '|'.join(r' ?'.join(re.escape(c) for c in face) for face in faces)
+    return re.compile(r'(?=[%s])(%s)($|\s)' % (first_chars, alternatives))
+
+
+def _last_before(mask, idx):
+    """For every position, the index of the last earlier position where mask is set (else -1)."""
+    last = np.where(mask, idx, -1)
+    np.maximum.accumulate(last, out=last)
+    return np.concatenate(([-1], last[:-1]))
+
+
+def _first_after(mask, idx, n):
+    """For every position, the index of the first later position where mask is set (else n)."""
+    first = np.where(mask, idx, n)[::-1]
+    np.minimum.accumulate(first, out=first)
+    first = first[::-1]
+    return np.concatenate((first[1:], [n]))
+
+
+def _window_count(cumulative, start, end):
+    """Number of set positions strictly between start and end, given an inclusive cumsum."""
+    before_end = np.concatenate(([0], cumulative[:-1]))[end]
+    return before_end - cumulative[np.maximum(start, 0)]
+
+
+class CompiledLexicon:
+    """
+    TextBlob's PatternAnalyzer sentiment lexicon compiled into flat NumPy arrays.
+
+    Each vocabulary entry has a polarity, an intensity and flags for whether it
+    is an adverbial modifier ("very", "really") and whether it ends in "-ly".
+    Emoticons, negations, "!" and the document separator are appended as
+    special entries so a whole batch is classified with one dictionary lookup
+    per token.
+    """
+
+    def __init__(self, words, polarity, intensity, is_modifier, emoticons=None):
+        self.words = list(words)
+        self.emoticons = dict(emoticons or {})
+        # PatternAnalyzer only scores non-alphabetic faces of up to five characters ("xD" is ignored).
+        scored = {}
+        for face, p in self.emoticons.items():
+            face = face.lower()
+            if not face.isalpha() and len(face) <= 5:
+                scored.setdefault(face, p)
+
+        specials = [(e, KIND_EMOTICON, p) for e, p in scored.items()]
+        specials += [(w, KIND_NEGATION, 0.0) for w in NEGATIONS]
+        specials += [('!', KIND_EXCLAMATION, 0.0), ('(!)', KIND_EMOTICON, 0.0), (SEPARATOR, KIND_SEPARATOR, 0.0)]
+
+        n_words = len(self.words)
+        self.index = {w: i for i, w in enumerate(self.words)}
+        kinds = [KIND_WORD] * n_words
+        special_polarity = []
+        for token, kind, p in specials:
+            if token in self.index:
+                continue
+            self.index[token] = len(kinds)
+            kinds.append(kind)
+            special_polarity.append(p)
+
+        n_special = len(special_polarity)
+        self.kind = np.array(kinds, dtype=np.int8)
+        self.polarity = np.concatenate((np.asarray(polarity, dtype=np.float64), special_polarity))
+        self.intensity = np.concatenate((np.asarray(intensity, dtype=np.float64), np.ones(n_special)))
+        self.is_modifier = np.concatenate((np.asarray(is_modifier, dtype=bool), np.zeros(n_special, dtype=bool)))
+        self.ends_ly = np.array([w.endswith('ly') for w in self.words] + [False] * n_special, dtype=bool)
+        self._emoticon_pattern = _build_emoticon_pattern(self.emoticons) if self.emoticons else None
+        self._quick_table = None
+
+    @classmethod
+    def from_textblob(cls):
+        """Compiles the lexicon TextBlob's PatternAnalyzer loads from en-sentiment.xml."""
+        from textblob.en import sentiment as pattern_sentiment
+        from textblob._text import EMOTICONS
+
+        pattern_sentiment.load()
+        words, polarity, intensity, is_modifier = [], [], [], []
+        for word, senses in dict.items(pattern_sentiment):
+            if not word or None not in senses:
+                continue
+            p, _, i = senses[None]
+            words.append(word)
+            polarity.append(p)
+            intensity.append(i)
+            is_modifier.append('RB' in senses)
+
+        emoticons = {face: p for (_, p), faces in EMOTICONS.items() for face in faces}
+        return cls(words, polarity, intensity, is_modifier, emoticons)
+
+    def save(self, path):
+        """Writes the compiled lexicon to a .npz file."""
+        np.savez_compressed(
+            path,
+            words=np.array(self.words, dtype=object),
+            polarity=self.polarity[:len(self.words)],
+            intensity=self.intensity[:len(self.words)],
+            is_modifier=self.is_modifier[:len(self.words)],
+            emoticon_faces=np.array(list(self.emoticons), dtype=object),
+            emoticon_polarity=np.array(list(self.emoticons.values()), dtype=np.float64),
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Reads a lexicon written by save()."""
+        with np.load(path, allow_pickle=True) as data:
+            emoticons = dict(zip(data['emoticon_faces'].tolist(), data['emoticon_polarity'].tolist()))
+            return cls(data['words'].tolist(), data['polarity'], data['intensity'], data['is_modifier'], emoticons)
+
+    def tokenize(self, texts):
+        """Tokenizes a batch into one flat token list, each document preceded by SEPARATOR."""
+        joined = ''.join(' %s %s' % (SEPARATOR, (text or '').replace(SEPARATOR, ' ')) for text in texts)
+        joined = _CONTRACTIONS.sub(r' \1', joined)
+        for quote in _QUOTES:
+            if quote in joined:
+                joined = joined.replace(quote, ' %s ' % quote)
+        # Plain words need no punctuation splitting; only split the rest.
+        tokens = []
+        append, extend = tokens.append, tokens.extend
+        for chunk in joined.split():
+            if chunk.isalpha() or len(chunk) == 1:
+                append(chunk)
+            else:
+                extend(_split_punctuation(chunk))
+
+        joined = ' '.join(tokens)
+        if '!' in joined:
+            joined = _SARCASM.sub('(!)', joined)
+        if self._emoticon_pattern is not None:
+            joined = self._emoticon_pattern.sub(lambda m: m.group(1).replace(' ', '') + m.group(2), joined)
+        return joined.lower().split()
+
+    def _build_quick_table(self):
+        table = {}
+        for token, i in self.index.items():
+            kind = self.kind[i]
+            if kind == KIND_WORD and "'" in token:
+                continue  # "isn't" etc. never survive tokenize()'s quote splitting
+            if kind == KIND_WORD:
+                table[token] = (float(self.polarity[i]), float(self.intensity[i]), bool(self.is_modifier[i]), True)
+            elif kind == KIND_EMOTICON:
+                table[token] = (float(self.polarity[i]), 1.0, False, False)
+        return table
+
+    def _quick_tokens(self, text):
+        """Returns quick_polarity's lowercased tokens, leaving anything but plain words to tokenize()."""
+        tokens = []
+        append, extend = tokens.append, tokens.extend
+        for chunk in text.split():
+            if chunk.isalpha():
+                append(chunk.lower())
+                continue
+            word = chunk.rstrip(_QUICK_TRAILING)
+            tail = chunk[len(word):]
+            if word.isalpha() and '..' not in tail and not ('.' in tail and _is_abbreviation(word + '.')):
+                append(word.lower())
+                if '!' in tail:
+                    extend(repeat('!', tail.count('!')))
+            elif word == chunk and chunk.lower() in self._quick_table:
+                append(chunk.lower())
+            else:
+                extend(self.tokenize([chunk])[1:])
+        return tokens
+
+    def quick_polarity(self, text):
+        """
+        Scores one text with a cheap, approximate version of polarity_batch's rules.
+
+        Plain words with trailing ".,!?" are split by hand and every other chunk
+        (contractions, quotes, emoticons glued to words) goes through tokenize(),
+        so the tokens match PatternAnalyzer's. The modifier, negation and "!"
+        rules are then applied in a single pass with a plain dict lookup. Some
+        of polarity_batch's rarer rules (a negation after an "-ly" modifier,
+        emoticons split across chunks) are not reproduced, so callers that need
+        the exact score near a decision threshold should fall back to it or
+        TextBlob.
+
+        Returns:
+            float: A polarity in [-1.0, 1.0].
+        """
+        table = self._quick_table
+        if table is None:
+            table = self._quick_table = self._build_quick_table()
+        assessments = []  # [value, negated]
+        modifier = None  # intensity of a pending adverbial modifier
+        negated = False
+        for word in self._quick_tokens(text):
+            if word == '!':
+                if assessments:
+                    assessments[-1][0] *= 1.25
+                continue
+            entry = table.get(word)
+            if entry is None:
+                if word in NEGATIONS:
+                    negated = True
+                else:
+                    # Same clearing rules as polarity_batch: long unknown words drop pending state.
+                    if len(word) > 2:
+                        modifier = None
+                    if len(word) > 1:
+                        negated = False
+            elif not entry[3]:
+                assessments.append([entry[0], False])
+            else:
+                polarity, intensity, is_modifier, _ = entry
+                if negated:
+                    intensity = 1.0 / intensity
+                if modifier is not None and assessments:
+                    assessments[-1][0] = min(max(polarity * modifier, -1.0), 1.0)
+                    assessments[-1][1] = assessments[-1][1] or negated
+                else:
+                    assessments.append([polarity, negated])
+                modifier = intensity if is_modifier else None
+                negated = False
+        if not assessments:
+            return 0.0
+        total = 0.0
+        for value, negated in assessments:
+            value = min(max(value, -1.0), 1.0)
+            total += value * -0.5 if negated else value
+        return total / len(assessments)
+
+    def polarity_batch(self, texts):
+        """
+        Scores a batch of texts, mirroring PatternAnalyzer's assessment rules.
+
+        Known words form assessments. A word preceded by an adverbial modifier is
+        merged into the modifier's assessment and scaled by its intensity; a
+        preceding negation inverts the intensity and halves and flips the final
+        score; each trailing "!" boosts the latest assessment by 25%. The polarity
+        of a text is the mean of its assessments.
+
+        Returns:
+            numpy.ndarray: One polarity in [-1.0, 1.0] per text.
+        """
+        n_docs = len(texts)
+        tokens = self.tokenize(texts)
+        n = len(tokens)
+        ids = np.fromiter(map(self.index.get, tokens, repeat(-1, n)), dtype=np.int64, count=n)
+        lengths = np.fromiter(map(len, tokens), dtype=np.int64, count=n)
+
+        known = ids >= 0
+        safe_ids = np.where(known, ids, 0)
+        kind = np.where(known, self.kind[safe_ids], 0)
+        idx = np.arange(n)
+
+        is_sep = kind == KIND_SEPARATOR
+        is_word = kind == KIND_WORD
+        is_emoticon = kind == KIND_EMOTICON
+        is_neg = kind == KIND_NEGATION
+        is_excl = kind == KIND_EXCLAMATION
+        unknown = ~is_word
+        assesses = is_word | is_emoticon
+
+        boundary = np.maximum.accumulate(np.where(is_sep, idx, -1))
+        next_boundary = _first_after(is_sep, idx, n)
+        doc = np.cumsum(is_sep) - 1
+
+        # Most recent known word (source of a pending modifier) and most recent assessment.
+        last_word = _last_before(is_word, idx)
+        last_word_ok = last_word > boundary
+        last_word_safe = np.where(last_word_ok, last_word, 0)
+        prev_assess = _last_before(assesses, idx)
+        prev_assess_ok = prev_assess > boundary
+        prev_assess_safe = np.where(prev_assess_ok, prev_assess, 0)
+
+        word_is_mod = is_word & self.is_modifier[safe_ids]
+        word_ends_ly = is_word & self.ends_ly[safe_ids]
+        mod_pending = last_word_ok & word_is_mod[last_word_safe]
+        mod_ly = last_word_ok & word_ends_ly[last_word_safe]
+
+        # Long unknown words drop a pending modifier, except a negation right after an -ly modifier.
+        clearing = (unknown & ~is_neg & (lengths > 2)) | (is_neg & (lengths > 2) & ~mod_ly) | is_sep
+        clear_count = np.cumsum(clearing)
+        mod_active = mod_pending & (_window_count(clear_count, last_word, idx) == 0)
+        merged = is_word & mod_active & prev_assess_ok
+        # "really not good": the negation attaches to the modifier's assessment instead.
+        neg_consumed = is_neg & mod_active & mod_ly
+
+        # A negation applies to the next known word unless a longer unknown word intervenes.
+        last_neg = _last_before(is_neg, idx)
+        last_neg_ok = last_neg > np.maximum(last_word, boundary)
+        last_neg_safe = np.where(last_neg_ok, last_neg, 0)
+        breaking = (unknown & ~is_neg & (lengths > 1)) | is_sep
+        break_count = np.cumsum(breaking)
+        negated = (is_word & last_neg_ok & (_window_count(break_count, last_neg, idx) == 0)
+                   & ~neg_consumed[last_neg_safe])
+
+        polarity = np.where(known, self.polarity[safe_ids], 0.0)
+        intensity = np.where(is_word, self.intensity[safe_ids], 1.0)
+        effective_intensity = np.where(negated, 1.0 / intensity, intensity)
+        member_value = np.where(merged, np.clip(polarity * effective_intensity[prev_assess_safe], -1.0, 1.0), polarity)
+
+        starts = assesses & ~merged
+        group = np.cumsum(starts) - 1
+        n_groups = int(starts.sum())
+        if n_groups == 0:
+            return np.zeros(n_docs)
+
+        members = idx[assesses]
+        member_group = group[members]
+        last_member = np.append(member_group[1:] != member_group[:-1], True)
+        first_member = np.flatnonzero(np.append(True, member_group[1:] != member_group[:-1]))
+        value = member_value[members[last_member]]
+
+        group_negated = np.add.reduceat(negated[members].astype(np.int64), first_member) > 0
+        consumed_at = idx[neg_consumed & prev_assess_ok]
+        group_negated[group[consumed_at]] = True
+
+        # "!" boosts the latest assessment unless a modifier merge overwrites it afterwards.
+        next_assess = _first_after(assesses, idx, n)
+        next_assess_safe = np.where(next_assess < n, next_assess, 0)
+        overwritten = (next_assess < next_boundary) & merged[next_assess_safe]
+        boosted = is_excl & prev_assess_ok & ~overwritten
+        boosts = np.bincount(group[boosted], minlength=n_groups)
+
+        value = np.clip(value * np.power(1.25, boosts), -1.0, 1.0)
+        value = np.where(group_negated, value * -0.5, value)
+
+        group_doc = doc[members[first_member]]
+        totals = np.bincount(group_doc, weights=value, minlength=n_docs)
+        counts = np.bincount(group_doc, minlength=n_docs)
+        return totals / np.maximum(counts, 1)
+
+
+_lexicon = None
+
+
+def get_lexicon():
+    """
+    Returns the process-wide compiled lexicon.
+
+    Loaded from SENTIMENT_LEXICON_PATH when that file exists, otherwise compiled
+    from TextBlob's lexicon on first use.
+    """
+    global _lexicon
+    if _lexicon is None:
+        if SENTIMENT_LEXICON_PATH and os.path.exists(SENTIMENT_LEXICON_PATH):
+            _lexicon = CompiledLexicon.load(SENTIMENT_LEXICON_PATH)
+            logger.info(f"Loaded compiled sentiment lexicon from {SENTIMENT_LEXICON_PATH}.")
+        else:
+            _lexicon = CompiledLexicon.from_textblob()
+    return _lexicon
+
+
+if __name__ == '__main__':
+    # Build step: python -m src.lexicon /app/lexicon.npz
+    if len(sys.argv) != 2 or not sys.argv[1].endswith('.npz'):
+        sys.exit("usage: python -m src.lexicon OUTPUT.npz")
+    lexicon = CompiledLexicon.from_textblob()
+    lexicon.save(sys.argv[1])
+    print(f"Wrote {len(lexicon.words)} lexicon entries to {sys.argv[1]}")
@@ -0,0 +1,122 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Logging Configuration
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+# Fraction of per-message success logs that are written; errors and DLQ events are always logged.
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '1.0'))
+
+# Attributes every LogRecord has; anything else was passed via `extra=` and becomes a JSON field.
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+_listener = None
+_listener_pid = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line.
+
+    Always has timestamp, level, logger and message; fields passed with
+    `extra=` (review_id, stage_ms, ...) are added as they are, and exceptions
+    are included as a formatted `exc_info` string.
+    """
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    Enqueues records for the listener thread, leaving JSON encoding and I/O to it.
+
+    The stock prepare() formats the whole record on the calling thread; this one
+    only resolves the message and traceback, which cannot safely be deferred.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _stream_handler():
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def _replace_root_handlers(handler):
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+
+
+def _write_directly_in_child():
+    # A forked child has the queue but not the listener thread; log synchronously
+    # until it calls configure_logging() itself.
+    global _listener
+    if _listener is not None:
+        _listener = None
+        _replace_root_handlers(_stream_handler())
+
+
+def configure_logging(level=None):
+    """
+    Routes all logging through a queue to a background listener that writes JSON lines to stderr.
+
+    Safe to call more than once; a forked process that calls it gets its own listener.
+    """
+    global _listener, _listener_pid
+    logging.getLogger().setLevel(level or LOG_LEVEL)
+    if _listener is not None and _listener_pid == os.getpid():
+        return
+    records = queue.SimpleQueue()
+    _listener = QueueListener(records, _stream_handler(), respect_handler_level=True)
+    _listener_pid = os.getpid()
+    _replace_root_handlers(_DeferredQueueHandler(records))
+    _listener.start()
+
+
+def stop_logging():
+    """Flushes queued records and stops the listener thread."""
+    global _listener
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+        _listener = None
+        _replace_root_handlers(_stream_handler())
+
+
+def sampled():
+    """Decides whether this message's success logs are written (LOG_SAMPLE_RATE of the time)."""
+    return LOG_SAMPLE_RATE >= 1.0 or random.random() < LOG_SAMPLE_RATE
+
+
+atexit.register(stop_logging)
+os.register_at_fork(after_in_child=_write_directly_in_child)
@@ -0,0 +1,444 @@
+import logging
+import math
+import os
+import threading
+from bisect import bisect_left
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter, time
+
+logger = logging.getLogger(__name__)
+
+# Metrics Configuration (METRICS_PORT=0 disables the /metrics endpoint)
+METRICS_PORT = int(os.getenv('METRICS_PORT', '8000'))
+METRICS_QUEUE_DEPTH_INTERVAL = float(os.getenv('METRICS_QUEUE_DEPTH_INTERVAL', '5'))
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+AGE_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0, 21600.0, 86400.0)
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if math.isnan(value):
+        return 'NaN'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _register_default_child(self):
+        if not self.labelnames:
+            self.labels()
+
+    def labels(self, *values):
+        """Returns the child for these label values. Cache it on hot paths."""
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+# Observations are unlocked: every hot path records from a single thread (pika's
+# connection thread or the asyncio loop), and a scrape tolerates a torn read.
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class Counter(_Metric):
+    """A monotonically increasing count, e.g. messages by outcome."""
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _render_child(self, values, child):
+        return [f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}']
+
+
+class _GaugeChild:
+    __slots__ = ('value', 'function')
+
+    def __init__(self):
+        self.value = 0
+        self.function = None
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def set_function(self, function):
+        """Reports function() at scrape time instead of a stored value."""
+        self.function = function
+
+    def get(self):
+        return self.function() if self.function is not None else self.value
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, e.g. in-flight messages or queue depth."""
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set_function(self, function):
+        self.labels().set_function(function)
+
+    def _render_child(self, values, child):
+        return [f'{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}']
+
+
+class _Timer:
+    __slots__ = ('_child', '_start', 'elapsed')
+
+    def __init__(self, child):
+        self._child = child
+        self.elapsed = None
+
+    def __enter__(self):
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = perf_counter() - self._start
+        self._child.observe(self.elapsed)
+
+
+class _HistogramChild:
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # per bucket, not cumulative; last is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def time(self):
+        """Context manager that observes the duration of its block in seconds."""
+        return _Timer(self)
+
+
+class Histogram(_Metric):
+    """Bucketed observations (cumulative `le` buckets, sum and count when rendered)."""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def _render_child(self, values, child):
+        counts, total = list(child.counts), child.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            le = f'le="{_format_value(float(bound))}"'
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}')
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        metric._register_default_child()
+
+    def render(self):
+        """Returns every registered metric in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = Histogram(
+    'review_stage_seconds',
+    'Time spent in each processing stage (per message, or per batch when batching).',
+    labelnames=('stage',), registry=REGISTRY
+)
+MESSAGES = Counter(
+    'review_messages_total',
+    'Settled messages by outcome (acked, retried, dead_lettered).',
+    labelnames=('outcome',), registry=REGISTRY
+)
+DUPLICATES = Counter('review_duplicates_total', 'Reviews skipped because they were already processed.', registry=REGISTRY)
+PROCESSING_SECONDS = Histogram(
+    'review_processing_seconds',
+    'Time from a delivery reaching the consumer to its ack or reject.',
+    registry=REGISTRY
+)
+PREFETCH = Gauge('review_prefetch_count', 'Current channel prefetch count.', registry=REGISTRY)
+BATCH_SIZE = Gauge('review_batch_size', 'Current maximum micro-batch size.', registry=REGISTRY)
+ADAPTIVE_ADJUSTMENTS = Counter(
+    'review_adaptive_adjustments_total',
+    'Adaptive tuner decisions by direction (increase, decrease, hold) and reason.',
+    labelnames=('direction', 'reason'), registry=REGISTRY
+)
+RETRIES = Counter('review_retries_total', 'Failed deliveries scheduled on a delayed retry queue.', registry=REGISTRY)
+IN_FLIGHT = Gauge('review_in_flight', 'Messages received but not yet acked or rejected.', registry=REGISTRY)
+MESSAGE_AGE = Histogram(
+    'review_message_age_seconds',
+    'Time from the review timestamp to consumption.',
+    buckets=AGE_BUCKETS, registry=REGISTRY
+)
+QUEUE_DEPTH = Gauge('review_queue_depth', 'Ready messages in a consumed queue.', labelnames=('queue',), registry=REGISTRY)
+QUEUE_LAG = Gauge(
+    'review_queue_lag_seconds',
+    'Estimated time to drain the consumed queues at the recent processing rate.',
+    registry=REGISTRY
+)
+SENTIMENT_TIERS = Counter(
+    'review_sentiment_tier_total',
+    'Comments labelled by each tier of the sentiment cascade (lexicon, textblob).',
+    labelnames=('tier',), registry=REGISTRY
+)
+SENTIMENT_AUDITS = Counter(
+    'review_sentiment_audits_total',
+    'Sampled lexicon-tier labels re-checked against TextBlob, by result (agree, disagree).',
+    labelnames=('result',), registry=REGISTRY
+)
+
+
+# Hot paths use these pre-resolved children instead of calling labels() per message.
+STAGE_DECODE = STAGE_SECONDS.labels('decode')
+STAGE_DEDUP = STAGE_SECONDS.labels('dedup')
+STAGE_SENTIMENT = STAGE_SECONDS.labels('sentiment')
+STAGE_COMMIT = STAGE_SECONDS.labels('commit')
+STAGE_PUBLISH = STAGE_SECONDS.labels('publish')
+ACKED = MESSAGES.labels('acked')
+RETRIED = MESSAGES.labels('retried')
+DEAD_LETTERED = MESSAGES.labels('dead_lettered')
+_PROCESSING = PROCESSING_SECONDS.labels()
+_MESSAGE_AGE = MESSAGE_AGE.labels()
+
+
+def observe_message_age(timestamp):
+    """Records how long ago the review was submitted, from its ISO `timestamp` field."""
+    if timestamp.__class__ is not str or not timestamp:
+        return
+    try:
+        # fromisoformat() only accepts a trailing "Z" from Python 3.11 on.
+        submitted = datetime.fromisoformat(timestamp[:-1] + '+00:00' if timestamp[-1] == 'Z' else timestamp)
+    except ValueError:
+        return
+    if submitted.tzinfo is None:
+        submitted = submitted.replace(tzinfo=timezone.utc)
+    age = time() - submitted.timestamp()
+    _MESSAGE_AGE.observe(age if age > 0 else 0.0)
+
+
+class MeteredChannel:
+    """
+    Wraps a pika channel so every ack and reject issued through it is counted.
+
+    Deliveries are registered with track(); the set of tracked-but-unsettled
+    delivery tags drives the in-flight gauge, and lets multiple-acks be counted
+    per message. All other attributes pass through to the wrapped channel.
+    """
+
+    def __init__(self, channel):
+        self._channel = channel
+        self._unsettled = {}  # delivery tags in arrival order
+        IN_FLIGHT.set_function(lambda: len(self._unsettled))
+
+    def __getattr__(self, name):
+        return getattr(self._channel, name)
+
+    @property
+    def unsettled(self):
+        """Number of tracked deliveries not yet acked or rejected."""
+        return len(self._unsettled)
+
+    def track(self, delivery_tag):
+        self._unsettled[delivery_tag] = perf_counter()
+
+    def _settle(self, delivery_tag, now):
+        received = self._unsettled.pop(delivery_tag, None)
+        if received is not None:
+            _PROCESSING.observe(now - received)
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        self._channel.basic_ack(delivery_tag=delivery_tag, multiple=multiple)
+        now = perf_counter()
+        if multiple:
+            settled = [tag for tag in self._unsettled if tag <= delivery_tag]
+            for tag in settled:
+                self._settle(tag, now)
+            ACKED.inc(len(settled))
+        else:
+            self._settle(delivery_tag, now)
+            ACKED.inc()
+
+    def basic_reject(self, delivery_tag, requeue=True):
+        self._channel.basic_reject(delivery_tag=delivery_tag, requeue=requeue)
+        self._settle(delivery_tag, perf_counter())
+        if not requeue:
+            DEAD_LETTERED.inc()
+
+    def ack_retried(self, delivery_tag):
+        """Acks a delivery that was republished to a retry queue, counting it as retried."""
+        self._channel.basic_ack(delivery_tag=delivery_tag)
+        self._settle(delivery_tag, perf_counter())
+        RETRIED.inc()
+
+    def ack_dead_lettered(self, delivery_tag):
+        """Acks a delivery that was republished to the DLX, counting it as dead-lettered."""
+        self._channel.basic_ack(delivery_tag=delivery_tag)
+        self._settle(delivery_tag, perf_counter())
+        DEAD_LETTERED.inc()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes would otherwise flood the structured logs
+
+
+def start_metrics_server(port=METRICS_PORT, registry=REGISTRY):
+    """
+    Serves `registry` on http://0.0.0.0:<port>/metrics from a daemon thread.
+
+    Returns:
+        The running server, or None when port is 0.
+    """
+    if not port:
+        return None
+    handler = type('MetricsHandler', (_MetricsHandler,), {'registry': registry})
+    try:
+        server = ThreadingHTTPServer(('', port), handler)
+    except OSError as e:
+        logger.warning(f"Metrics endpoint disabled, cannot listen on :{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    logger.info(f"Serving metrics on :{server.server_address[1]}/metrics")
+    return server
+
+
+class QueueDepthSampler:
+    """
+    Periodically samples the depth of the consumed queues with a passive queue_declare
+    and estimates lag as depth divided by the recent settle rate.
+
+    Depths of `background` queues (the bulk lane) are exported too, but left out of
+    the lag estimate, which is meant to track live traffic.
+
+    Runs on the connection's own thread via connection.call_later.
+    """
+
+    def __init__(self, connection, channel, queues, interval=METRICS_QUEUE_DEPTH_INTERVAL, background=()):
+        self.connection = connection
+        self.channel = channel
+        self.queues = list(queues)
+        self.background = list(background)
+        self.interval = interval
+        self._last_settled = None
+        self._last_time = None
+
+    def _settled(self):
+        return sum(child.value for child in MESSAGES._children.values())
+
+    def start(self):
+        self.connection.call_later(self.interval, self.sample)
+
+    def sample(self):
+        try:
+            depth = 0
+            for queue in self.queues + self.background:
+                count = self.channel.queue_declare(queue=queue, passive=True).method.message_count
+                QUEUE_DEPTH.labels(queue).set(count)
+                if queue not in self.background:
+                    depth += count
+
+            now, settled = perf_counter(), self._settled()
+            if self._last_time is not None:
+                rate = (settled - self._last_settled) / max(now - self._last_time, 1e-9)
+                QUEUE_LAG.set(depth / rate if rate > 0 else (0.0 if depth == 0 else math.inf))
+            self._last_time, self._last_settled = now, settled
+        except Exception as e:
+            logger.warning(f"Queue depth sampling failed: {e}")
+        finally:
+            self.start()
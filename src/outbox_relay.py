@@ -0,0 +1,145 @@
+import sys
+import os
+import json
+import logging
+import time
+
+import pika
+
+# Add the current directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.database import SessionLocal, claim_outbox_events, init_db, mark_outbox_sent
+
+logger = logging.getLogger(__name__)
+
+# Relay Configuration
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '500'))
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', '0.5'))
+
+# Errors that mean the broker connection or channel is gone and must be reopened.
+BROKER_ERRORS = (ConnectionError, pika.exceptions.AMQPConnectionError, pika.exceptions.AMQPChannelError)
+
+
+class OutboxRelay:
+    """
+    Publishes ReviewProcessed events queued in the outbox table.
+
+    Each pass claims up to `batch_size` unsent rows with FOR UPDATE SKIP LOCKED,
+    publishes them with publisher.publish_many and marks the published rows as
+    sent in the same transaction. The publisher must use publisher confirms:
+    without them publish_many cannot tell which events the broker accepted. Rows the broker did not accept stay unsent and
+    are retried on a later pass, so delivery is at-least-once. Because claimed rows
+    are skipped by other relays, any number of relays can run side by side.
+
+    Args:
+        session_factory: Creates SQLAlchemy sessions (SessionLocal by default).
+        publisher: A ConfirmingEventPublisher.
+        batch_size (int): Maximum rows claimed per pass.
+        reconnect: Called by run() after the broker connection is lost; opens a new
+            connection and returns (publisher, sleep) for it.
+    """
+
+    def __init__(self, publisher, session_factory=SessionLocal, batch_size=OUTBOX_BATCH_SIZE, reconnect=None):
+        self.publisher = publisher
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.reconnect = reconnect
+        self.disconnected = False
+
+    def relay_once(self):
+        """Runs one claim/publish/mark pass. Returns the number of events sent."""
+        session = self.session_factory()
+        try:
+            rows = claim_outbox_events(session, self.batch_size)
+            if not rows:
+                session.rollback()
+                return 0
+
+            events = [json.loads(row.payload) for row in rows]
+            try:
+                failed = self.publisher.publish_many(events)
+            except Exception as e:
+                logger.error(f"Failed to publish {len(events)} outbox events: {e}")
+                if isinstance(e, BROKER_ERRORS):
+                    self.disconnected = True
+                session.rollback()
+                return 0
+
+            failed = set(failed)
+            sent = [row.id for position, row in enumerate(rows) if position not in failed]
+            mark_outbox_sent(session, sent)
+            session.commit()
+            if failed:
+                logger.warning(f"{len(failed)} outbox events were not published and will be retried.")
+            logger.info(f"Relayed {len(sent)} outbox events.")
+            return len(sent)
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def run(self, sleep, poll_interval=OUTBOX_POLL_INTERVAL):
+        """
+        Relays forever, pausing `poll_interval` seconds whenever the outbox is drained.
+
+        If the broker connection is lost, the next pass first reopens it through
+        `reconnect` (unsent rows simply wait in the outbox meanwhile).
+
+        Args:
+            sleep: Called with the pause length; pass connection.sleep so the
+                broker connection keeps servicing heartbeats while idle.
+        """
+        while True:
+            if self.disconnected and self.reconnect is not None:
+                try:
+                    self.publisher, sleep = self.reconnect()
+                except Exception as e:
+                    logger.error(f"Could not reconnect to the broker: {e}. Retrying...")
+                    time.sleep(poll_interval)
+                    continue
+                self.disconnected = False
+                logger.info("Outbox relay reconnected to the broker.")
+            try:
+                sent = self.relay_once()
+            except Exception as e:
+                logger.error(f"Outbox relay pass failed: {e}")
+                sent = 0
+            if sent < self.batch_size:
+                try:
+                    sleep(poll_interval)
+                except BROKER_ERRORS as e:
+                    logger.error(f"Lost the broker connection: {e}")
+                    self.disconnected = True
+                    time.sleep(poll_interval)
+
+
+def main():
+    from src.consumer import connect
+    from src.publisher import ConfirmingEventPublisher
+
+    logger.info("Starting Outbox Relay...")
+    init_db()
+    connection = None
+
+    def open_publisher():
+        nonlocal connection
+        if connection is not None and connection.is_open:
+            try:
+                connection.close()
+            except Exception:
+                pass
+        connection = connect()
+        # Always in confirm mode, whatever PUBLISH_CONFIRMS says: a row is only marked sent once the broker has it.
+        return ConfirmingEventPublisher(connection.channel()), connection.sleep
+
+    publisher, sleep = open_publisher()
+    OutboxRelay(publisher, reconnect=open_publisher).run(sleep)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print('Interrupted')
@@ -0,0 +1,162 @@
+import gzip
+import io
+import json
+import os
+import threading
+import zlib
+
+try:
+    # Optional: roughly 2-3x faster than json.loads on review-sized payloads.
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Payload Configuration
+# Use orjson for JSON bodies when it is installed.
+FAST_JSON = os.getenv('FAST_JSON', 'true').lower() == 'true'
+# Compressed bodies may not inflate beyond this; larger ones are rejected rather than decompressed.
+PAYLOAD_MAX_BYTES = int(os.getenv('PAYLOAD_MAX_BYTES', str(1024 * 1024)))
+ZSTD_LEVEL = int(os.getenv('ZSTD_LEVEL', '3'))
+GZIP_LEVEL = int(os.getenv('GZIP_LEVEL', '6'))
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+CONTENT_TYPES = {
+    None: JSON,  # publishers that set no content_type have always sent JSON
+    JSON: JSON,
+    'text/json': JSON,
+    MSGPACK: MSGPACK,
+    'application/x-msgpack': MSGPACK,
+    'application/vnd.msgpack': MSGPACK,
+}
+ENCODINGS = (None, 'gzip', 'zstd')
+
+
+_local = threading.local()
+
+
+class PayloadError(ValueError):
+    """A body that cannot be decoded: unsupported type or encoding, or corrupt data."""
+
+
+def _content_type(content_type):
+    if content_type:
+        content_type = content_type.split(';', 1)[0].strip().lower()
+    if content_type not in CONTENT_TYPES:
+        raise PayloadError(f"unsupported content_type {content_type!r}")
+    return CONTENT_TYPES[content_type]
+
+
+def _encoding(content_encoding):
+    if content_encoding in ('', 'identity'):
+        return None
+    if content_encoding not in ENCODINGS:
+        raise PayloadError(f"unsupported content_encoding {content_encoding!r}")
+    return content_encoding
+
+
+def check_supported(content_type=JSON, content_encoding=None):
+    """
+    Raises PayloadError if a content type or encoding is unknown or needs a library that is not installed.
+
+    Returns:
+        tuple: The canonical (content_type, content_encoding).
+    """
+    content_type, content_encoding = _content_type(content_type), _encoding(content_encoding)
+    if content_type == MSGPACK and msgpack is None:
+        raise PayloadError("msgpack payloads need the msgpack package (pip install msgpack)")
+    if content_encoding == 'zstd' and zstandard is None:
+        raise PayloadError("zstd payloads need the zstandard package (pip install zstandard)")
+    return content_type, content_encoding
+
+
+def _zstd(kind):
+    """Returns this thread's reusable zstd compressor or decompressor (they are not thread-safe)."""
+    context = getattr(_local, kind, None)
+    if context is None:
+        if kind == 'compressor':
+            context = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        else:
+            context = zstandard.ZstdDecompressor()
+        setattr(_local, kind, context)
+    return context
+
+
+def _inflate(body, content_encoding, limit):
+    if content_encoding == 'gzip':
+        inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        data = inflater.decompress(body, limit + 1)
+        if len(data) <= limit and not inflater.eof:
+            raise PayloadError("truncated gzip data")
+    else:
+        with _zstd('decompressor').stream_reader(io.BytesIO(body)) as reader:
+            data = reader.read(limit + 1)
+    if len(data) > limit:
+        raise PayloadError(f"{content_encoding} payload inflates to more than {limit} bytes")
+    return data
+
+
+def loads(body, content_type=None, content_encoding=None, limit=None):
+    """
+    Decodes a message body according to its AMQP content_type and content_encoding.
+
+    Args:
+        body (bytes): The raw body.
+        content_type (str): JSON (also when None) or msgpack.
+        content_encoding (str): None/'identity', 'gzip' or 'zstd'.
+        limit (int): Largest allowed decompressed size (PAYLOAD_MAX_BYTES by default).
+
+    Raises:
+        PayloadError: With the reason the body could not be decoded.
+    """
+    content_type, content_encoding = check_supported(content_type, content_encoding)
+    if content_encoding is not None:
+        try:
+            body = _inflate(body, content_encoding, PAYLOAD_MAX_BYTES if limit is None else limit)
+        except PayloadError:
+            raise
+        except Exception as e:
+            raise PayloadError(f"invalid {content_encoding} data: {e}") from None
+    try:
+        if content_type == MSGPACK:
+            return msgpack.unpackb(body, raw=False)
+        if FAST_JSON and orjson is not None:
+            return orjson.loads(body)
+        return json.loads(body)
+    except Exception as e:
+        raise PayloadError(f"invalid {'msgpack' if content_type == MSGPACK else 'JSON'}: {e}") from None
+
+
+def dumps(data, content_type=JSON, content_encoding=None, min_compress_bytes=0):
+    """
+    Encodes `data` as a message body.
+
+    Bodies shorter than `min_compress_bytes` once serialized are left
+    uncompressed, since compression would only add framing overhead.
+
+    Returns:
+        tuple: (body, content_encoding actually applied, or None).
+    """
+    content_type, content_encoding = check_supported(content_type, content_encoding)
+    if content_type == MSGPACK:
+        body = msgpack.packb(data, use_bin_type=True)
+    elif FAST_JSON and orjson is not None:
+        body = orjson.dumps(data)
+    else:
+        body = json.dumps(data).encode('utf-8')
+
+    if content_encoding is None or len(body) < min_compress_bytes:
+        return body, None
+    if content_encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), 'gzip'
+    return _zstd('compressor').compress(body), 'zstd'
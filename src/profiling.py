@@ -0,0 +1,304 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Profiling Configuration
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+# 'sample' (stack sampling of every thread, written as collapsed stacks) or 'cprofile'
+PROFILE_MODE = os.getenv('PROFILE_MODE', 'sample').lower()
+# A session ends after this many messages or seconds, whichever comes first (0 = no limit).
+PROFILE_MESSAGES = int(os.getenv('PROFILE_MESSAGES', '1000'))
+PROFILE_SECONDS = float(os.getenv('PROFILE_SECONDS', '60'))
+PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.005'))
+# Also trace allocations during a session and report them per message.
+PROFILE_TRACEMALLOC = os.getenv('PROFILE_TRACEMALLOC', 'false').lower() == 'true'
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv('PROFILE_TRACEMALLOC_FRAMES', '1'))
+# Sending this signal to a worker starts a session (or ends the running one early).
+PROFILE_SIGNAL = os.getenv('PROFILE_SIGNAL', 'SIGUSR2')
+# Start a session as soon as the consumer starts.
+PROFILE_ON_START = os.getenv('PROFILE_ON_START', 'false').lower() == 'true'
+
+MODES = ('sample', 'cprofile')
+
+
+def _frame_label(code):
+    # Flamegraph tools split frames on ';', so keep it out of the labels.
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+
+
+class StackSampler:
+    """
+    Samples the stacks of every other thread in the process every `interval` seconds.
+
+    Stacks are counted by their (thread name, frames) so the result can be
+    written as collapsed stacks, one "thread;outer;...;inner count" line each.
+    """
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._thread = None
+        self._labels = {}  # code object -> frame label
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def sample(self):
+        """Records the current stack of every thread except the calling one."""
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        labels = self._labels
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = _frame_label(code)
+                stack.append(label)
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)).replace(';', ':'))
+            self.stacks[tuple(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def write_collapsed(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+
+
+class Profiler:
+    """
+    On-demand profiling of a running consumer.
+
+    A session is started with start() (from a signal handler, or at startup) and
+    ends after `messages` deliveries or `seconds`, whichever comes first, or on
+    stop(). Results are written to `directory`:
+
+      - sample mode: `<name>-<pid>-<time>.collapsed`, collapsed stacks of every
+        thread (flamegraph.pl, speedscope, inferno);
+      - cprofile mode: `.pstats` (snakeviz, flameprof) and a `.txt` summary of the
+        top functions by cumulative time. cProfile only sees the thread that
+        handles deliveries, so it is enabled at the next delivery boundary;
+      - with `trace_allocations`, `.tracemalloc` (a tracemalloc snapshot) and
+        `-allocations.txt`, the lines that allocated most during the session
+        divided by the number of messages.
+
+    Consumers call message_done() once per delivery, which is all an idle
+    profiler costs. The signal handler, toggle(), only sets a flag; a control
+    thread started by listen() does the actual start or stop, so a signal that
+    lands in the middle of stop() on the delivery thread cannot deadlock it.
+    """
+
+    def __init__(self, directory=PROFILE_DIR, mode=PROFILE_MODE, messages=PROFILE_MESSAGES, seconds=PROFILE_SECONDS,
+                 interval=PROFILE_SAMPLE_INTERVAL, trace_allocations=PROFILE_TRACEMALLOC, name='consumer'):
+        if mode not in MODES:
+            raise ValueError(f"PROFILE_MODE must be one of {MODES}, got {mode!r}")
+        self.directory = directory
+        self.mode = mode
+        self.messages = messages
+        self.seconds = seconds
+        self.interval = interval
+        self.trace_allocations = trace_allocations
+        self.name = name
+        self.active = False
+        self._lock = threading.RLock()
+        self._count = 0
+        self._started_at = 0.0
+        self._sampler = None
+        self._profile = None
+        self._profile_thread = None
+        self._deadline = None
+        self._baseline = None
+        self._stop_tracing = False
+        self._stop_requested = False
+        self._toggle_requested = threading.Event()
+        self._control = None
+
+    def listen(self):
+        """Starts the control thread that acts on toggle() requests."""
+        if self._control is None:
+            self._control = threading.Thread(target=self._run_control, name='profile-control', daemon=True)
+            self._control.start()
+
+    def _run_control(self):
+        while True:
+            self._toggle_requested.wait()
+            self._toggle_requested.clear()
+            try:
+                if self.active:
+                    self.stop()
+                else:
+                    self.start()
+            except Exception as e:
+                logger.error(f"Profiling toggle failed: {e}", exc_info=True)
+
+    def start(self):
+        """Starts a session unless one is running. Returns True if it started."""
+        with self._lock:
+            if self.active:
+                return False
+            self.active = True
+            self._stop_requested = False
+            self._count = 0
+            self._started_at = time.monotonic()
+            if self.trace_allocations:
+                self._stop_tracing = not tracemalloc.is_tracing()
+                if self._stop_tracing:
+                    tracemalloc.start(PROFILE_TRACEMALLOC_FRAMES)
+                self._baseline = tracemalloc.take_snapshot()
+            if self.mode == 'sample':
+                self._sampler = StackSampler(self.interval)
+                self._sampler.start()
+            if self.seconds:
+                # Ends an idle session too; cProfile's own data is collected at the next delivery.
+                self._deadline = threading.Timer(self.seconds, self.stop)
+                self._deadline.daemon = True
+                self._deadline.start()
+        logger.info(f"Profiling started ({self.mode}, up to {self.messages or 'unlimited'} messages / "
+                    f"{self.seconds or 'unlimited'}s, allocations {'on' if self.trace_allocations else 'off'}).")
+        return True
+
+    def message_done(self):
+        """Counts a delivery, and ends the session once it reaches its message or time limit."""
+        if not self.active:
+            return
+        if self.mode == 'cprofile' and self._profile is None:
+            with self._lock:
+                if self.active and self._profile is None:
+                    self._profile = cProfile.Profile()
+                    self._profile_thread = threading.get_ident()
+                    self._profile.enable()
+                    return
+        self._count += 1
+        if (self._stop_requested or (self.messages and self._count >= self.messages)
+                or (self.seconds and time.monotonic() - self._started_at >= self.seconds)):
+            self.stop()
+
+    def stop(self):
+        """
+        Ends the running session and writes its results.
+
+        Returns:
+            list: The paths written (empty if no session was running).
+        """
+        with self._lock:
+            if not self.active:
+                return []
+            if self._profile is not None and threading.get_ident() != self._profile_thread:
+                # cProfile can only be disabled from the thread it profiles; finish at the next delivery.
+                self._stop_requested = True
+                return []
+            self.active = False
+            if self._deadline is not None:
+                self._deadline.cancel()
+                self._deadline = None
+            elapsed = time.monotonic() - self._started_at
+            messages = self._count
+            sampler, profile, baseline = self._sampler, self._profile, self._baseline
+            self._sampler = self._profile = self._baseline = None
+
+            # Stop collecting before writing anything, so the output is not profiled itself.
+            if sampler is not None:
+                sampler.stop()
+            if profile is not None:
+                profile.disable()
+            allocations = None
+            if baseline is not None:
+                allocations = tracemalloc.take_snapshot()
+                if self._stop_tracing:
+                    tracemalloc.stop()
+
+        # Written outside the lock so a new session, or message_done(), is not held up by the disk.
+        os.makedirs(self.directory, exist_ok=True)
+        prefix = os.path.join(self.directory, f"{self.name}-{os.getpid()}-{time.strftime('%Y%m%dT%H%M%S')}")
+        paths = []
+        if allocations is not None:
+            paths += self._write_allocations(prefix, allocations, baseline, messages)
+        if sampler is not None:
+            sampler.write_collapsed(f"{prefix}.collapsed")
+            paths.append(f"{prefix}.collapsed")
+        if profile is not None:
+            profile.dump_stats(f"{prefix}.pstats")
+            summary = io.StringIO()
+            pstats.Stats(profile, stream=summary).sort_stats('cumulative').print_stats(40)
+            with open(f"{prefix}.txt", 'w') as f:
+                f.write(summary.getvalue())
+            paths += [f"{prefix}.pstats", f"{prefix}.txt"]
+
+        logger.info(f"Profiling finished after {messages} messages in {elapsed:.1f}s; wrote {', '.join(paths)}.")
+        return paths
+
+    def _write_allocations(self, prefix, snapshot, baseline, messages):
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+        snapshot.dump(f"{prefix}.tracemalloc")
+        per_message = max(messages, 1)
+        with open(f"{prefix}-allocations.txt", 'w') as f:
+            f.write(f"# Net allocations per message over {messages} messages, by line\n")
+            f.write("# bytes/msg  blocks/msg  line\n")
+            for stat in snapshot.compare_to(baseline, 'lineno')[:50]:
+                if stat.size_diff == 0:
+                    continue
+                f.write(f"{stat.size_diff / per_message:>11.1f}  {stat.count_diff / per_message:>10.2f}  "
+                        f"{stat.traceback}\n")
+        return [f"{prefix}.tracemalloc", f"{prefix}-allocations.txt"]
+
+    def toggle(self, *args):
+        """
+        Signal handler: asks the control thread to start a session, or end the running one early.
+
+        It runs on the main thread between any two bytecodes, possibly inside
+        start() or stop(), so it only sets a flag (see listen()).
+        """
+        self._toggle_requested.set()
+
+
+profiler = None
+
+
+def install(name='consumer', signal_name=PROFILE_SIGNAL, on_start=PROFILE_ON_START):
+    """
+    Creates the process-wide profiler and arms its triggers.
+
+    Must be called from the main thread, where signal handlers are installed.
+
+    Returns:
+        Profiler: The profiler, whose message_done() the consumer calls per delivery.
+    """
+    global profiler
+    profiler = Profiler(name=name)
+    if signal_name:
+        profiler.listen()
+        signal.signal(getattr(signal, signal_name), profiler.toggle)
+        logger.info(f"Profiling on demand: kill -{signal_name.removeprefix('SIG')} {os.getpid()} "
+                    f"(results in {os.path.abspath(profiler.directory)}).")
+    if on_start:
+        profiler.start()
+    return profiler
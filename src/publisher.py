@@ -1,23 +1,63 @@
-import json
 import logging
+import os
+import time
+from collections import OrderedDict
+
 import pika
 
+from src.payloads import check_supported, dumps
+
 logger = logging.getLogger(__name__)
 
+# Event Encoding Configuration: plain JSON by default, for existing subscribers
+EVENT_CONTENT_TYPE = os.getenv('EVENT_CONTENT_TYPE', 'application/json')
+EVENT_CONTENT_ENCODING = os.getenv('EVENT_CONTENT_ENCODING', '')
+# Events smaller than this are sent uncompressed even when an encoding is configured.
+EVENT_COMPRESS_MIN_BYTES = int(os.getenv('EVENT_COMPRESS_MIN_BYTES', '512'))
+
+# Publisher Confirm Configuration
+PUBLISH_CONFIRM_WINDOW = int(os.getenv('PUBLISH_CONFIRM_WINDOW', '256'))
+PUBLISH_CONFIRM_TIMEOUT = float(os.getenv('PUBLISH_CONFIRM_TIMEOUT', '30'))
+
+
+class PublishNackedError(Exception):
+    """Raised when the broker nacks an event, or does not confirm it in time."""
+
+
 class EventPublisher:
-    def __init__(self, channel, exchange_name='review_events', routing_key='review.processed'):
+    def __init__(self, channel, exchange_name='review_events', routing_key='review.processed',
+                 content_type=EVENT_CONTENT_TYPE, content_encoding=EVENT_CONTENT_ENCODING,
+                 compress_min_bytes=EVENT_COMPRESS_MIN_BYTES):
         """
         Initializes the EventPublisher.
-        
+
         Args:
             channel: The RabbitMQ channel to use for publishing.
             exchange_name (str): The name of the exchange to publish to.
             routing_key (str): The routing key for the messages.
+            content_type (str): 'application/json' or 'application/msgpack'.
+            content_encoding (str): '' (none), 'gzip' or 'zstd'.
+            compress_min_bytes (int): Events smaller than this are not compressed.
+
+        Raises:
+            PayloadError: If the content type or encoding is unknown or its library is not installed.
         """
         self.channel = channel
         self.exchange_name = exchange_name
         self.routing_key = routing_key
-        
+        self.content_type, self.content_encoding = check_supported(content_type, content_encoding)
+        self.compress_min_bytes = compress_min_bytes
+        # Every event shares the same properties, so build them once.
+        self.properties = pika.BasicProperties(
+            delivery_mode=2,  # Make message persistent
+            content_type=self.content_type
+        )
+        self.compressed_properties = pika.BasicProperties(
+            delivery_mode=2,
+            content_type=self.content_type,
+            content_encoding=self.content_encoding
+        )
+
         # Declare the exchange to ensure it exists
         try:
             self.channel.exchange_declare(exchange=self.exchange_name, exchange_type='topic', durable=True)
@@ -26,6 +66,15 @@ class EventPublisher:
             logger.error(f"Failed to declare exchange '{self.exchange_name}': {e}")
             raise
 
+    def _basic_publish(self, event_data):
+        body, encoding = dumps(event_data, self.content_type, self.content_encoding, self.compress_min_bytes)
+        self.channel.basic_publish(
+            exchange=self.exchange_name,
+            routing_key=self.routing_key,
+            body=body,
+            properties=self.compressed_properties if encoding else self.properties
+        )
+
     def publish(self, event_data):
         """
         Publishes an event to the configured exchange.
@@ -34,19 +83,141 @@ class EventPublisher:
             event_data (dict): The dictionary containing the event data.
         """
         try:
-            message_body = json.dumps(event_data)
-            
-            self.channel.basic_publish(
-                exchange=self.exchange_name,
-                routing_key=self.routing_key,
-                body=message_body,
-                properties=pika.BasicProperties(
-                    delivery_mode=2,  # Make message persistent
-                    content_type='application/json'
-                )
-            )
-            logger.info(f"Published event to '{self.exchange_name}' with key '{self.routing_key}': {event_data.get('reviewId', 'unknown')}")
+            self._basic_publish(event_data)
+            logger.debug(f"Published event to '{self.exchange_name}' with key '{self.routing_key}': {event_data.get('reviewId', 'unknown')}")
         except Exception as e:
             logger.error(f"Failed to publish event: {e}")
             # Depending on requirements, we might want to re-raise this to trigger a retry in the consumer
             raise
+
+    def publish_many(self, events):
+        """
+        Publishes events one after another.
+
+        Args:
+            events (list): Event dictionaries, published in order.
+
+        Returns:
+            list: The positions in `events` of the events that could not be published.
+        """
+        failed = []
+        for position, event in enumerate(events):
+            try:
+                self.publish(event)
+            except Exception:
+                failed.append(position)
+        return failed
+
+
+class ConfirmingEventPublisher(EventPublisher):
+    """
+    An EventPublisher that runs the channel in publisher-confirm mode and pipelines publishes.
+
+    Up to `window` events may be awaiting the broker's Basic.Ack/Basic.Nack at once;
+    confirms are matched to events by delivery tag (honouring `multiple`). Events the
+    broker nacks, or does not confirm within `timeout` seconds, are reported back so
+    the caller can hold back the acks of the deliveries that produced them.
+
+    BlockingChannel.confirm_delivery() makes every basic_publish wait for its own
+    confirm, so confirms are enabled on the underlying pika Channel instead and the
+    blocking channel is only used to pump I/O while waiting. pika has no public API
+    for either, so this relies on BlockingChannel._impl and _flush_output, as of the
+    pika release pinned in requirements.txt; check both before upgrading pika.
+
+    The broker numbers confirms per channel and counts every publish on it, so the
+    channel must carry nothing but this publisher's events; consumers give it a
+    channel of its own rather than the one they consume and republish retries on.
+
+    Args:
+        channel: A pika BlockingChannel.
+        window (int): Maximum number of unconfirmed events.
+        timeout (float): Seconds to wait for outstanding confirms.
+        **encoding: content_type, content_encoding and compress_min_bytes, as for EventPublisher.
+    """
+
+    def __init__(self, channel, exchange_name='review_events', routing_key='review.processed',
+                 window=PUBLISH_CONFIRM_WINDOW, timeout=PUBLISH_CONFIRM_TIMEOUT, **encoding):
+        super().__init__(channel, exchange_name, routing_key, **encoding)
+        self.window = max(window, 1)
+        self.timeout = timeout
+        self._next_tag = 1
+        self._outstanding = OrderedDict()  # delivery tag -> position in the publish_many batch
+        self._nacked = []
+
+        if not hasattr(channel, '_impl') or not hasattr(channel, '_flush_output'):
+            raise RuntimeError(f"pika {pika.__version__} lacks the BlockingChannel internals publisher confirms "
+                               f"rely on; use the pika version pinned in requirements.txt.")
+        selected = []
+        channel._impl.confirm_delivery(ack_nack_callback=self._on_confirm, callback=selected.append)
+        self._wait_until(lambda: bool(selected))
+        if not selected:
+            raise PublishNackedError("Broker did not enable publisher confirms.")
+        logger.info(f"Publisher confirms enabled (window {self.window}).")
+
+    def _on_confirm(self, frame):
+        method = frame.method
+        nacked = isinstance(method, pika.spec.Basic.Nack)
+        if method.multiple:
+            tags = [tag for tag in self._outstanding if tag <= method.delivery_tag]
+        else:
+            tags = [method.delivery_tag]
+        for tag in tags:
+            position = self._outstanding.pop(tag, None)
+            if position is not None and nacked:
+                self._nacked.append(position)
+
+    def _wait_until(self, predicate):
+        """Pumps connection I/O until predicate() holds or the timeout expires."""
+        deadline = time.monotonic() + self.timeout
+        # Wake the I/O loop at the deadline even if the broker stays silent.
+        timer = self.channel.connection.call_later(self.timeout, lambda: None)
+        try:
+            while not predicate() and time.monotonic() < deadline:
+                self.channel._flush_output(lambda: predicate() or time.monotonic() >= deadline)
+        finally:
+            self.channel.connection.remove_timeout(timer)
+        return predicate()
+
+    def publish_many(self, events):
+        """
+        Publishes events and waits until the broker has confirmed all of them.
+
+        Args:
+            events (list): Event dictionaries, published in order.
+
+        Returns:
+            list: The positions in `events` of the events that were nacked or not
+            confirmed within the timeout, in ascending order.
+        """
+        for position, event in enumerate(events):
+            if len(self._outstanding) >= self.window:
+                self._wait_until(lambda: len(self._outstanding) < self.window)
+                if len(self._outstanding) >= self.window:
+                    self._expire_outstanding()
+            self._basic_publish(event)
+            self._outstanding[self._next_tag] = position
+            self._next_tag += 1
+
+        if not self._wait_until(lambda: not self._outstanding):
+            self._expire_outstanding()
+
+        nacked, self._nacked = sorted(self._nacked), []
+        if nacked:
+            logger.warning(f"Broker did not confirm {len(nacked)} of {len(events)} events.")
+        logger.info(f"Published {len(events) - len(nacked)} confirmed events to '{self.exchange_name}' with key '{self.routing_key}'.")
+        return nacked
+
+    def _expire_outstanding(self):
+        logger.warning(f"Timed out waiting for {len(self._outstanding)} publisher confirms.")
+        self._nacked.extend(self._outstanding.values())
+        self._outstanding.clear()
+
+    def publish(self, event_data):
+        """
+        Publishes a single event and waits for its confirm.
+
+        Raises:
+            PublishNackedError: If the broker nacked the event or did not confirm it.
+        """
+        if self.publish_many([event_data]):
+            raise PublishNackedError(f"Event for review {event_data.get('reviewId', 'unknown')} was not confirmed.")
@@ -0,0 +1,93 @@
+import argparse
+import logging
+import os
+import sys
+
+import pika
+
+# Add the current directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.consumer import BULK_QUEUE_NAME, DLQ_NAME, QUEUE_NAME, connect, setup_queues
+from src.logs import configure_logging
+from src.retry import REJECT_REASON_HEADER, RETRY_ERROR_HEADER, RETRY_HEADER
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+LANES = {'live': QUEUE_NAME, 'bulk': BULK_QUEUE_NAME}
+# Headers describing a previous failure; a replayed message starts afresh.
+FAILURE_HEADERS = ('x-death', 'x-first-death-exchange', 'x-first-death-queue', 'x-first-death-reason',
+                   'x-last-death-exchange', 'x-last-death-queue', 'x-last-death-reason',
+                   RETRY_HEADER, RETRY_ERROR_HEADER, REJECT_REASON_HEADER)
+
+
+def replay(channel, queue, source=DLQ_NAME, limit=None):
+    """
+    Moves messages from the DLQ back onto a consumer queue.
+
+    Each message is republished with its body, content type and encoding, minus
+    the headers recording its earlier failure, and removed from `source` only once
+    the broker has confirmed the republish. A message that cannot be republished
+    is returned to `source` and the replay stops.
+
+    Args:
+        channel: A channel with publisher confirms enabled.
+        queue (str): The lane to replay into.
+        source (str): The queue to drain.
+        limit (int): Stop after this many messages (all of them by default).
+
+    Returns:
+        int: The number of messages replayed.
+    """
+    replayed = 0
+    while limit is None or replayed < limit:
+        method, properties, body = channel.basic_get(queue=source, auto_ack=False)
+        if method is None:
+            break
+        headers = {key: value for key, value in (properties.headers or {}).items() if key not in FAILURE_HEADERS}
+        try:
+            channel.basic_publish(
+                exchange='',
+                routing_key=queue,
+                body=body,
+                properties=pika.BasicProperties(
+                    delivery_mode=2,
+                    content_type=properties.content_type,
+                    content_encoding=properties.content_encoding,
+                    headers=headers or None,
+                ),
+                mandatory=True,
+            )
+        except Exception as e:
+            logger.error(f"Could not replay message to {queue}: {e}. Leaving it on {source}.")
+            channel.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            break
+        channel.basic_ack(delivery_tag=method.delivery_tag)
+        replayed += 1
+    return replayed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay dead-lettered reviews onto a consumer queue.")
+    parser.add_argument('--lane', choices=sorted(LANES), default='bulk',
+                        help="Replay into the live queue or the lower-priority bulk lane (default)")
+    parser.add_argument('--limit', type=int, help="Replay at most this many messages")
+    args = parser.parse_args(argv)
+
+    connection = connect()
+    try:
+        channel = connection.channel()
+        setup_queues(channel)
+        channel.confirm_delivery()
+        replayed = replay(channel, LANES[args.lane], limit=args.limit)
+        logger.info(f"Replayed {replayed} messages from {DLQ_NAME} to {LANES[args.lane]}.")
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print('Interrupted')
@@ -0,0 +1,163 @@
+import logging
+import os
+from concurrent.futures import BrokenExecutor
+
+import pika
+from sqlalchemy.exc import DBAPIError, DisconnectionError, OperationalError, TimeoutError as PoolTimeoutError
+
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+# Retry Configuration: one TTL-delayed retry queue per delay (seconds), tried in order
+RETRY_DELAYS = [int(delay) for delay in os.getenv('RETRY_DELAYS', '1,10,60').split(',') if delay.strip()]
+RETRY_HEADER = 'x-retry-count'
+RETRY_ERROR_HEADER = 'x-last-error'
+REJECT_REASON_HEADER = 'x-reject-reason'
+
+# Failures of a dependency that are expected to clear up on their own.
+TRANSIENT_ERRORS = (
+    OperationalError,      # connection refused/lost, deadlocks, serialization failures, admin shutdown
+    DisconnectionError,
+    PoolTimeoutError,      # connection pool exhausted
+    ConnectionError,
+    TimeoutError,
+    BrokenExecutor,        # a scoring pool worker died (e.g. OOM-killed); the pool is replaced
+    pika.exceptions.AMQPConnectionError,
+    pika.exceptions.AMQPChannelError,
+)
+
+
+def retry_queue_name(queue, delay):
+    return f"{queue}.retry.{delay}s"
+
+
+def setup_retry_queues(channel, queue, delays=None):
+    """
+    Declares one retry queue per delay for `queue`.
+
+    Each retry queue holds messages for its x-message-ttl and then dead-letters
+    them through the default exchange back onto `queue`. Nothing consumes the
+    retry queues, so waiting messages cost the consumers nothing.
+    """
+    for delay in RETRY_DELAYS if delays is None else delays:
+        channel.queue_declare(queue=retry_queue_name(queue, delay), durable=True, arguments={
+            'x-message-ttl': delay * 1000,
+            'x-dead-letter-exchange': '',
+            'x-dead-letter-routing-key': queue,
+        })
+
+
+def is_transient(error):
+    """Returns True if `error` is worth retrying later, False if retrying cannot help."""
+    if isinstance(error, DBAPIError) and error.connection_invalidated:
+        return True
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+def retry_count(properties):
+    """Returns how many times a delivery has already been retried."""
+    headers = getattr(properties, 'headers', None) or {}
+    return int(headers.get(RETRY_HEADER, 0))
+
+
+def retry_or_reject(channel, delivery_tag, properties, body, error, queue, delays=None):
+    """
+    Settles a delivery that failed with `error`.
+
+    Transient failures are republished to the next retry tier with the
+    x-retry-count header incremented, then the original is acked. Permanent
+    failures, retries that have used up every tier, and deliveries that could not
+    be republished are rejected to the DLQ.
+
+    Args:
+        channel: The channel the delivery arrived on.
+        delivery_tag (int): The failed delivery.
+        properties: Its pika BasicProperties (may be None).
+        body (bytes): Its body, republished unchanged.
+        error (Exception): Why it failed.
+        queue (str): The queue the retry returns to.
+        delays (list[int]): Retry tier delays in seconds (RETRY_DELAYS by default).
+
+    Returns:
+        bool: True if the delivery was scheduled for a retry, False if it was dead-lettered.
+    """
+    delays = RETRY_DELAYS if delays is None else delays
+    attempt = retry_count(properties)
+    if not is_transient(error) or attempt >= len(delays):
+        reason = "permanent error" if not is_transient(error) else f"still failing after {attempt} retries"
+        logger.error(f"Rejecting delivery {delivery_tag} (to DLQ): {reason}: {error}")
+        channel.basic_reject(delivery_tag=delivery_tag, requeue=False)
+        return False
+
+    headers = dict(getattr(properties, 'headers', None) or {})
+    headers[RETRY_HEADER] = attempt + 1
+    headers[RETRY_ERROR_HEADER] = str(error)[:256]
+    retry_queue = retry_queue_name(queue, delays[attempt])
+    try:
+        channel.basic_publish(
+            exchange='',
+            routing_key=retry_queue,
+            body=body,
+            properties=pika.BasicProperties(
+                delivery_mode=2,
+                content_type=getattr(properties, 'content_type', None),
+                content_encoding=getattr(properties, 'content_encoding', None),
+                headers=headers,
+            ),
+        )
+    except Exception as publish_error:
+        logger.error(f"Could not schedule retry of delivery {delivery_tag}: {publish_error}. Rejecting (to DLQ).")
+        channel.basic_reject(delivery_tag=delivery_tag, requeue=False)
+        return False
+
+    if isinstance(channel, metrics.MeteredChannel):
+        # Counted as retried rather than acked.
+        channel.ack_retried(delivery_tag)
+    else:
+        channel.basic_ack(delivery_tag=delivery_tag)
+    metrics.RETRIES.inc()
+    logger.warning(f"Transient error on delivery {delivery_tag}: {error}. Retry {attempt + 1} in {delays[attempt]}s.")
+    return True
+
+
+def dead_letter(channel, delivery_tag, properties, body, reason, exchange, routing_key='dead_letter'):
+    """
+    Sends an invalid delivery to the DLQ with the reason in its x-reject-reason header.
+
+    basic_reject cannot add headers, so the body is republished to the
+    dead-letter exchange and the original acked. If the republish fails the
+    delivery is rejected instead, which still dead-letters it, without the reason.
+
+    Args:
+        channel: The channel the delivery arrived on.
+        delivery_tag (int): The invalid delivery.
+        properties: Its pika BasicProperties (may be None).
+        body (bytes): Its body, republished unchanged.
+        reason (str): Why it was rejected.
+        exchange (str): The dead-letter exchange.
+        routing_key (str): The DLQ's binding key on `exchange`.
+    """
+    headers = dict(getattr(properties, 'headers', None) or {})
+    headers[REJECT_REASON_HEADER] = str(reason)[:256]
+    try:
+        channel.basic_publish(
+            exchange=exchange,
+            routing_key=routing_key,
+            body=body,
+            properties=pika.BasicProperties(
+                delivery_mode=2,
+                content_type=getattr(properties, 'content_type', None),
+                content_encoding=getattr(properties, 'content_encoding', None),
+                headers=headers,
+            ),
+        )
+    except Exception as publish_error:
+        logger.error(f"Could not republish delivery {delivery_tag} to the DLQ: {publish_error}. Rejecting instead.")
+        channel.basic_reject(delivery_tag=delivery_tag, requeue=False)
+        return
+    if isinstance(channel, metrics.MeteredChannel):
+        # Counted as dead-lettered rather than acked.
+        channel.ack_dead_lettered(delivery_tag)
+    else:
+        channel.basic_ack(delivery_tag=delivery_tag)
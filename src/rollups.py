@@ -0,0 +1,39 @@
+import argparse
+import json
+import logging
+import os
+import sys
+
+# Add the current directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.database import SessionLocal, get_product_stats, init_db, rebuild_product_rollups
+from src.logs import configure_logging
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain and query the per-product sentiment rollup.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('rebuild', help="Recompute product_sentiment_rollup from processed_reviews")
+    stats = commands.add_parser('stats', help="Print a product's review statistics")
+    stats.add_argument('product_id')
+    args = parser.parse_args(argv)
+
+    init_db()
+    session = SessionLocal()
+    try:
+        if args.command == 'rebuild':
+            products = rebuild_product_rollups(session)
+            session.commit()
+            logger.info(f"Rebuilt rollups for {products} products.")
+        else:
+            print(json.dumps(get_product_stats(session, args.product_id), default=str))
+    finally:
+        session.close()
+
+
+if __name__ == '__main__':
+    main()
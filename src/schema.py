@@ -0,0 +1,124 @@
+import os
+
+from src.payloads import PayloadError, loads
+
+# Message Schema Configuration
+REVIEW_MAX_COMMENT_LENGTH = int(os.getenv('REVIEW_MAX_COMMENT_LENGTH', '10000'))
+REVIEW_MIN_RATING = int(os.getenv('REVIEW_MIN_RATING', '1'))
+REVIEW_MAX_RATING = int(os.getenv('REVIEW_MAX_RATING', '5'))
+
+# Matches the String(255) id columns of processed_reviews.
+MAX_ID_LENGTH = 255
+REQUIRED_FIELDS = ('productId', 'userId', 'rating', 'reviewId', 'comment')
+
+
+class InvalidMessage(ValueError):
+    """
+    A delivery that can never be processed, with the reason it was rejected.
+
+    Args:
+        reason (str): Why the payload is invalid, e.g. "rating must be an integer from 1 to 5".
+        review_id: The payload's reviewId, if it had one.
+    """
+
+    def __init__(self, reason, review_id=None):
+        super().__init__(reason)
+        self.reason = reason
+        self.review_id = review_id
+
+
+class ReviewMessage:
+    """
+    A validated review payload.
+
+    Slotted and built straight from the decoded JSON object, so a review is
+    carried from decode to persistence as one small object holding references to
+    the decoded strings; row() produces the insert parameters once scored.
+    """
+
+    __slots__ = ('review_id', 'product_id', 'user_id', 'rating', 'comment', 'timestamp')
+
+    def __init__(self, review_id, product_id, user_id, rating, comment, timestamp=None):
+        self.review_id = review_id
+        self.product_id = product_id
+        self.user_id = user_id
+        self.rating = rating
+        self.comment = comment
+        self.timestamp = timestamp
+
+    def __repr__(self):
+        return f"ReviewMessage(review_id={self.review_id!r}, product_id={self.product_id!r})"
+
+    @classmethod
+    def decode(cls, body, properties=None):
+        """
+        Decodes and validates a delivery body.
+
+        Args:
+            body (bytes): The raw body.
+            properties: The delivery's pika BasicProperties; its content_type and
+                content_encoding select the format (plain JSON when unset).
+
+        Raises:
+            InvalidMessage: If the body cannot be decoded or fails validation.
+        """
+        try:
+            data = loads(body, getattr(properties, 'content_type', None), getattr(properties, 'content_encoding', None))
+        except PayloadError as e:
+            raise InvalidMessage(str(e)) from None
+        return cls.from_dict(data)
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Validates a decoded payload and returns it as a ReviewMessage.
+
+        Checks run in a fixed order and the first failure is reported: required
+        fields present and non-empty, id types and lengths, rating an integer in
+        range, comment a string within REVIEW_MAX_COMMENT_LENGTH.
+
+        Raises:
+            InvalidMessage: With the precise reason.
+        """
+        if data.__class__ is not dict:
+            raise InvalidMessage("payload is not a JSON object")
+        review_id = data.get('reviewId')
+        missing_fields = [field for field in REQUIRED_FIELDS if not data.get(field) and data.get(field) != 0]
+        if missing_fields:
+            raise InvalidMessage(f"missing fields {missing_fields}", review_id)
+
+        product_id = data['productId']
+        user_id = data['userId']
+        for field, value in (('reviewId', review_id), ('productId', product_id), ('userId', user_id)):
+            if value.__class__ is not str or len(value) > MAX_ID_LENGTH:
+                raise InvalidMessage(f"{field} must be a string of at most {MAX_ID_LENGTH} characters", review_id)
+
+        rating = data['rating']
+        if rating.__class__ is not int or not REVIEW_MIN_RATING <= rating <= REVIEW_MAX_RATING:
+            raise InvalidMessage(
+                f"rating must be an integer from {REVIEW_MIN_RATING} to {REVIEW_MAX_RATING}, got {rating!r}", review_id
+            )
+
+        comment = data['comment']
+        if comment.__class__ is not str:
+            raise InvalidMessage("comment must be a string", review_id)
+        if len(comment) > REVIEW_MAX_COMMENT_LENGTH:
+            raise InvalidMessage(
+                f"comment is {len(comment)} characters, more than {REVIEW_MAX_COMMENT_LENGTH}", review_id
+            )
+
+        timestamp = data.get('timestamp')
+        return cls(review_id, product_id, user_id, rating, comment,
+                   timestamp if timestamp.__class__ is str else None)
+
+    def row(self, sentiment, processed_timestamp):
+        """Returns the processed_reviews insert parameters for this review."""
+        return {
+            'review_id': self.review_id,
+            'product_id': self.product_id,
+            'user_id': self.user_id,
+            'rating': self.rating,
+            'comment': self.comment,
+            'sentiment': sentiment,
+            'processed_timestamp': processed_timestamp,
+        }
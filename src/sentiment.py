@@ -1,19 +1,301 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
 from textblob import TextBlob
+from textblob.exceptions import MissingCorpusError
 
-def analyze_sentiment(text: str) -> str:
+from src import metrics
+from src.lexicon import get_lexicon
+
+logger = logging.getLogger(__name__)
+
+# Cache Configuration (SENTIMENT_CACHE_SIZE=0 disables caching)
+SENTIMENT_CACHE_SIZE = int(os.getenv('SENTIMENT_CACHE_SIZE', '10000'))
+SENTIMENT_CACHE_TTL = float(os.getenv('SENTIMENT_CACHE_TTL', '0'))
+SENTIMENT_CACHE_SNAPSHOT = os.getenv('SENTIMENT_CACHE_SNAPSHOT', '')
+SENTIMENT_CACHE_SNAPSHOT_INTERVAL = float(os.getenv('SENTIMENT_CACHE_SNAPSHOT_INTERVAL', '60'))
+
+# NLTK corpora fetched only if TextBlob reports one missing. Polarity scoring
+# (PatternAnalyzer) reads its own bundled lexicon and needs none of them.
+SENTIMENT_NLTK_CORPORA = [c for c in os.getenv('SENTIMENT_NLTK_CORPORA', 'punkt').split(',') if c]
+
+# Cascade Configuration: the lexicon tier labels comments whose quick score is more than
+# SENTIMENT_CASCADE_MARGIN from both +/-0.1 thresholds; the rest go to TextBlob. Off by default,
+# since a small fraction of its labels differ from TextBlob's.
+SENTIMENT_CASCADE = os.getenv('SENTIMENT_CASCADE', 'false').lower() == 'true'
+SENTIMENT_CASCADE_MARGIN = float(os.getenv('SENTIMENT_CASCADE_MARGIN', '0.05'))
+# Fraction of lexicon-tier labels also computed with TextBlob to measure agreement.
+SENTIMENT_CASCADE_AUDIT_RATE = float(os.getenv('SENTIMENT_CASCADE_AUDIT_RATE', '0.01'))
+
+POLARITY_THRESHOLD = 0.1
+
+_LEXICON_TIER = metrics.SENTIMENT_TIERS.labels('lexicon')
+_TEXTBLOB_TIER = metrics.SENTIMENT_TIERS.labels('textblob')
+_AUDIT_AGREE = metrics.SENTIMENT_AUDITS.labels('agree')
+_AUDIT_DISAGREE = metrics.SENTIMENT_AUDITS.labels('disagree')
+
+
+def normalize_text(text: str) -> str:
+    """Collapses runs of whitespace so trivially different comments share a cache entry."""
+    return ' '.join(text.split())
+
+
+class SentimentCache:
     """
-    Analyzes the sentiment of a given text using TextBlob.
-    Returns: 'POSITIVE', 'NEGATIVE', or 'NEUTRAL'
+    A size-bounded LRU of sentiment labels keyed by a hash of the normalized comment.
+
+    Entries optionally expire after `ttl` seconds. When `snapshot_path` is set the
+    cache can be saved to and restored from disk so a restarted consumer starts warm;
+    start_snapshots() saves it every `snapshot_interval` seconds from a background
+    thread, off the message path.
     """
-    if not text:
-        return 'NEUTRAL'
-        
-    analysis = TextBlob(text)
-    polarity = analysis.sentiment.polarity
 
-    if polarity > 0.1:
+    def __init__(self, max_size=SENTIMENT_CACHE_SIZE, ttl=SENTIMENT_CACHE_TTL,
+                 snapshot_path=SENTIMENT_CACHE_SNAPSHOT or None,
+                 snapshot_interval=SENTIMENT_CACHE_SNAPSHOT_INTERVAL):
+        self.max_size = max_size
+        self.ttl = ttl or None
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (label, stored_at)
+        self._lock = threading.Lock()
+        self._snapshot_thread = None
+        self._snapshots_stopped = threading.Event()
+
+    @staticmethod
+    def make_key(normalized_text: str) -> str:
+        return hashlib.blake2b(normalized_text.encode('utf-8'), digest_size=16).hexdigest()
+
+    def get(self, key):
+        """Returns the cached label for `key`, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and time.time() - entry[1] > self.ttl:
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, label, stored_at=None):
+        """Stores a label, evicting the least recently used entries beyond max_size."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (label, stored_at if stored_at is not None else time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """Drops every entry and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Returns hit/miss/eviction counters and the current size."""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+        }
+
+    def save_snapshot(self, path=None):
+        """Atomically writes the cache contents to `path` (defaults to snapshot_path)."""
+        path = path or self.snapshot_path
+        if not path:
+            return
+        with self._lock:
+            entries = [[key, label, stored_at] for key, (label, stored_at) in self._entries.items()]
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Failed to save sentiment cache snapshot to {path}: {e}")
+
+    def load_snapshot(self, path=None):
+        """Restores entries saved by save_snapshot. Returns the number of entries loaded."""
+        path = path or self.snapshot_path
+        if not path or not os.path.exists(path):
+            return 0
+        try:
+            with open(path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable sentiment cache snapshot {path}: {e}")
+            return 0
+
+        now = time.time()
+        loaded = 0
+        for key, label, stored_at in entries:
+            if self.ttl and now - stored_at > self.ttl:
+                continue
+            self.put(key, label, stored_at)
+            loaded += 1
+        logger.info(f"Loaded {loaded} sentiment cache entries from {path}.")
+        return loaded
+
+    def start_snapshots(self):
+        """Starts a daemon thread that saves a snapshot every snapshot_interval seconds."""
+        if not self.snapshot_path or self.snapshot_interval <= 0 or self._snapshot_thread is not None:
+            return
+        self._snapshots_stopped.clear()
+        self._snapshot_thread = threading.Thread(target=self._run_snapshots, name='sentiment-cache-snapshot',
+                                                 daemon=True)
+        self._snapshot_thread.start()
+
+    def stop_snapshots(self):
+        """Stops the snapshot thread and writes a final snapshot."""
+        self._snapshots_stopped.set()
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+            self._snapshot_thread = None
+        self.save_snapshot()
+
+    def _run_snapshots(self):
+        while not self._snapshots_stopped.wait(self.snapshot_interval):
+            self.save_snapshot()
+
+
+sentiment_cache = SentimentCache()
+
+
+_corpora_downloaded = False
+
+
+def _download_corpora():
+    global _corpora_downloaded
+    import nltk
+
+    logger.info(f"Downloading NLTK corpora: {', '.join(SENTIMENT_NLTK_CORPORA)}")
+    for corpus in SENTIMENT_NLTK_CORPORA:
+        nltk.download(corpus, quiet=True)
+    _corpora_downloaded = True
+
+
+def _textblob_polarity(text: str) -> float:
+    try:
+        return TextBlob(text).sentiment.polarity
+    except MissingCorpusError:
+        if _corpora_downloaded:
+            raise
+        _download_corpora()
+        return TextBlob(text).sentiment.polarity
+
+
+def _label(polarity: float) -> str:
+    if polarity > POLARITY_THRESHOLD:
         return 'POSITIVE'
-    elif polarity < -0.1:
+    elif polarity < -POLARITY_THRESHOLD:
         return 'NEGATIVE'
     else:
         return 'NEUTRAL'
+
+
+def _classify(text: str) -> str:
+    """
+    Labels a normalized comment with the two-tier cascade.
+
+    The lexicon tier (CompiledLexicon.quick_polarity, about an eighth of
+    TextBlob's cost) decides when its score is more than SENTIMENT_CASCADE_MARGIN
+    away from both thresholds; borderline comments, where its approximations
+    could flip the label, are escalated to TextBlob. A sampled fraction of
+    lexicon-tier labels is re-checked against TextBlob.
+    """
+    if not SENTIMENT_CASCADE:
+        return _label(_textblob_polarity(text))
+
+    score = get_lexicon().quick_polarity(text)
+    if abs(abs(score) - POLARITY_THRESHOLD) <= SENTIMENT_CASCADE_MARGIN:
+        _TEXTBLOB_TIER.inc()
+        return _label(_textblob_polarity(text))
+
+    _LEXICON_TIER.inc()
+    label = _label(score)
+    if SENTIMENT_CASCADE_AUDIT_RATE > 0 and random.random() < SENTIMENT_CASCADE_AUDIT_RATE:
+        polarity = _textblob_polarity(text)
+        if _label(polarity) == label:
+            _AUDIT_AGREE.inc()
+        else:
+            _AUDIT_DISAGREE.inc()
+            logger.info(f"Sentiment cascade disagreement: lexicon tier said {label} (score {score:.3f}), "
+                        f"TextBlob {_label(polarity)} ({polarity:.3f}).")
+    return label
+
+
+def warm_up(vectorized=False):
+    """
+    Primes the sentiment analyzers so the first review does not pay their load cost.
+
+    Args:
+        vectorized (bool): Also load the compiled lexicon used by analyze_sentiment_batch.
+
+    Returns:
+        float: Seconds spent warming up.
+    """
+    started = time.monotonic()
+    _textblob_polarity("warm up")
+    if SENTIMENT_CASCADE:
+        get_lexicon().quick_polarity("warm up")
+    if vectorized:
+        get_lexicon().polarity_batch(["warm up"])
+    return time.monotonic() - started
+
+
+def analyze_sentiment(text: str) -> str:
+    """
+    Analyzes the sentiment of a given text with TextBlob, or with the lexicon/TextBlob
+    cascade when SENTIMENT_CASCADE is set (see _classify).
+    Results are memoized in `sentiment_cache` by normalized comment text.
+    Returns: 'POSITIVE', 'NEGATIVE', or 'NEUTRAL'
+    """
+    if not text:
+        return 'NEUTRAL'
+
+    normalized = normalize_text(text)
+    key = SentimentCache.make_key(normalized)
+    label = sentiment_cache.get(key)
+    if label is None:
+        label = _classify(normalized)
+        sentiment_cache.put(key, label)
+    return label
+
+
+def analyze_sentiment_batch(texts) -> list:
+    """
+    Classifies a batch of texts with the vectorized lexicon engine (src/lexicon.py).
+
+    Uses the same polarity data, tokenization and assessment rules as TextBlob's
+    PatternAnalyzer and the same +/-0.1 thresholds as analyze_sentiment, scoring
+    the whole batch with NumPy array operations instead of one TextBlob per text.
+    Returns: one of 'POSITIVE', 'NEGATIVE', or 'NEUTRAL' per text.
+    """
+    if not texts:
+        return []
+    polarity = get_lexicon().polarity_batch(texts)
+    labels = np.where(polarity > POLARITY_THRESHOLD, 'POSITIVE',
+                      np.where(polarity < -POLARITY_THRESHOLD, 'NEGATIVE', 'NEUTRAL'))
+    return labels.tolist()
@@ -0,0 +1,240 @@
+import sys
+import os
+import time
+import signal
+import logging
+import multiprocessing
+
+import pika
+
+# Add the current directory to sys.path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src import consumer, metrics, profiling
+from src.consumer import QUEUE_NAME, SHARD_EXCHANGE, connect, setup_queues, setup_shard_queues, shard_queue_name
+from src.logs import configure_logging, stop_logging
+from src.replay import replay
+from src.retry import RETRY_DELAYS, retry_queue_name
+from src.sentiment import sentiment_cache
+
+logger = logging.getLogger(__name__)
+
+# Supervisor Configuration
+WORKERS = int(os.getenv('WORKERS', str(os.cpu_count() or 1)))
+SHARDED_QUEUES = os.getenv('SHARDED_QUEUES', 'false').lower() == 'true'
+RESTART_BACKOFF_MAX = float(os.getenv('RESTART_BACKOFF_MAX', '30'))
+
+# A worker that ran at least this long before dying is restarted without delay.
+HEALTHY_UPTIME = 60.0
+
+
+def worker_queues(index, sharded):
+    """
+    Returns the queues worker `index` consumes.
+
+    A sharded worker owns one shard queue and also drains the shared main queue,
+    so producers that still publish to product_reviews directly are served.
+    """
+    if sharded:
+        return [shard_queue_name(index), QUEUE_NAME]
+    return [QUEUE_NAME]
+
+
+def _message_count(connection, queue):
+    """Returns the number of ready messages on `queue`, or None if it does not exist."""
+    # A passive declare of a missing queue closes the channel, so each probe gets its own.
+    channel = connection.channel()
+    try:
+        return channel.queue_declare(queue=queue, passive=True).method.message_count
+    except pika.exceptions.ChannelClosedByBroker:
+        return None
+    finally:
+        if channel.is_open:
+            channel.close()
+
+
+def retire_shard_queues(connection, first):
+    """
+    Retires the shard queues from index `first` up, left over from a run with more workers.
+
+    Each one is unbound from SHARD_EXCHANGE so it receives nothing new, and its
+    backlog is moved to the main queue, which every worker drains. Once its retry
+    queues are empty too it is deleted with them; otherwise it is kept (retries
+    still return to it) and finished off on the next start.
+
+    Returns:
+        int: The number of messages moved to the main queue.
+    """
+    moved = 0
+    index = first
+    while _message_count(connection, shard_queue_name(index)) is not None:
+        queue = shard_queue_name(index)
+        channel = connection.channel()
+        try:
+            channel.queue_unbind(queue=queue, exchange=SHARD_EXCHANGE, routing_key='1')
+            channel.confirm_delivery()
+            moved += replay(channel, QUEUE_NAME, source=queue)
+            retry_queues = [retry_queue_name(queue, delay) for delay in RETRY_DELAYS]
+            waiting = sum(_message_count(connection, retry_queue) or 0 for retry_queue in retry_queues)
+            if waiting:
+                logger.warning(f"Shard queue {queue} is unbound but has {waiting} retries pending; "
+                               f"it will be drained on the next start.")
+            else:
+                for retry_queue in retry_queues:
+                    channel.queue_delete(queue=retry_queue, if_empty=True)
+                channel.queue_delete(queue=queue, if_empty=True)
+                logger.info(f"Retired shard queue {queue}.")
+        except pika.exceptions.ChannelClosedByBroker as e:
+            # e.g. a message arrived before the if_empty delete; the next start tries again.
+            logger.warning(f"Could not retire shard queue {queue}: {e}")
+        finally:
+            if channel.is_open:
+                channel.close()
+        index += 1
+    if moved:
+        logger.info(f"Moved {moved} messages from retired shard queues to {QUEUE_NAME}.")
+    return moved
+
+
+def run_worker(index, queues):
+    """Entry point of a forked worker process."""
+    if sentiment_cache.snapshot_path:
+        # Workers own different key ranges, so each keeps its own snapshot.
+        sentiment_cache.snapshot_path = f"{sentiment_cache.snapshot_path}.{index}"
+    if metrics.METRICS_PORT:
+        # One /metrics endpoint per worker: METRICS_PORT, METRICS_PORT + 1, ...
+        metrics.METRICS_PORT += index
+    # The supervisor's log listener thread does not survive the fork; start this worker's own.
+    configure_logging()
+    logger.info(f"Worker {index} (pid {os.getpid()}) consuming {', '.join(queues)}")
+    try:
+        consumer.main(queues=queues)
+    finally:
+        # multiprocessing skips atexit in children, so flush queued records here.
+        stop_logging()
+
+
+def _bootstrap(target, index, queues):
+    # Forked children inherit the supervisor's handlers; exit cleanly instead so
+    # atexit hooks (e.g. the sentiment cache snapshot) still run.
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    if profiling.PROFILE_SIGNAL:
+        # Not the supervisor's forwarding handler; ignored until the worker installs its profiler.
+        signal.signal(getattr(signal, profiling.PROFILE_SIGNAL), signal.SIG_IGN)
+    target(index, queues)
+
+
+class Supervisor:
+    """
+    Forks `workers` consumer processes and restarts any that exit.
+
+    Workers that crash repeatedly are restarted with exponential backoff (capped at
+    `backoff_max` seconds). SIGTERM/SIGINT stop all workers and the supervisor;
+    PROFILE_SIGNAL is forwarded to every worker, toggling their profilers.
+
+    Args:
+        workers (int): Number of worker processes.
+        sharded (bool): Give each worker its own productId shard queue.
+        target: Worker entry point, called as target(index, queues).
+    """
+
+    def __init__(self, workers=WORKERS, sharded=SHARDED_QUEUES, target=run_worker,
+                 backoff_max=RESTART_BACKOFF_MAX, context=None):
+        self.workers = max(workers, 1)
+        self.sharded = sharded
+        self.target = target
+        self.backoff_max = backoff_max
+        self.context = context or multiprocessing.get_context('fork')
+        self.processes = {}   # index -> Process
+        self.started_at = {}  # index -> monotonic start time
+        self.failures = {}    # index -> consecutive quick failures
+        self.restart_at = {}  # index -> earliest monotonic restart time
+        self.stopping = False
+
+    def declare_topology(self):
+        """
+        Declares the queues once, before forking, so workers never race on it.
+
+        Shard queues beyond the current worker count (all of them when sharding is
+        off) are retired, so a shrunk pool leaves no bound, unconsumed shards behind.
+        """
+        connection = connect()
+        try:
+            channel = connection.channel()
+            setup_queues(channel)
+            if self.sharded:
+                setup_shard_queues(channel, self.workers)
+            retire_shard_queues(connection, self.workers if self.sharded else 0)
+        finally:
+            connection.close()
+
+    def spawn(self, index):
+        process = self.context.Process(
+            target=_bootstrap, args=(self.target, index, worker_queues(index, self.sharded)),
+            name=f"review-worker-{index}"
+        )
+        process.start()
+        self.processes[index] = process
+        self.started_at[index] = time.monotonic()
+        logger.info(f"Started worker {index} (pid {process.pid}).")
+
+    def check_workers(self):
+        """Restarts workers that have exited once their backoff has passed. Returns the number restarted."""
+        now = time.monotonic()
+        restarted = 0
+        for index, process in list(self.processes.items()):
+            if process.is_alive():
+                continue
+            if index not in self.restart_at:
+                uptime = now - self.started_at[index]
+                failures = 0 if uptime >= HEALTHY_UPTIME else self.failures.get(index, 0) + 1
+                self.failures[index] = failures
+                delay = min(2 ** failures - 1, self.backoff_max)
+                logger.warning(f"Worker {index} (pid {process.pid}) exited with code {process.exitcode}; restarting in {delay:.0f}s.")
+                self.restart_at[index] = now + delay
+            if now >= self.restart_at[index]:
+                del self.restart_at[index]
+                self.spawn(index)
+                restarted += 1
+        return restarted
+
+    def stop(self, *args):
+        self.stopping = True
+
+    def forward_signal(self, signum, frame=None):
+        for process in self.processes.values():
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    def shutdown(self, timeout=10):
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self.processes.values():
+            process.join(timeout)
+        logger.info("All workers stopped.")
+
+    def run(self, poll_interval=1.0):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        if profiling.PROFILE_SIGNAL:
+            signal.signal(getattr(signal, profiling.PROFILE_SIGNAL), self.forward_signal)
+        self.declare_topology()
+        for index in range(self.workers):
+            self.spawn(index)
+        try:
+            while not self.stopping:
+                self.check_workers()
+                time.sleep(poll_interval)
+        finally:
+            self.shutdown()
+
+
+def main():
+    logger.info(f"Starting supervisor with {WORKERS} workers (sharded queues: {SHARDED_QUEUES}).")
+    Supervisor().run()
+
+
+if __name__ == '__main__':
+    main()
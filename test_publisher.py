@@ -10,6 +10,8 @@ RABBITMQ_HOST = os.getenv('RABBITMQ_HOST', 'localhost')
 RABBITMQ_USER = os.getenv('RABBITMQ_USER', 'guest')
 RABBITMQ_PASS = os.getenv('RABBITMQ_PASS', 'guest')
 QUEUE_NAME = 'product_reviews'
+BULK_QUEUE_NAME = 'product_reviews.bulk'
+SHARD_EXCHANGE = 'product_reviews_sharded'
 
 def connect():
     credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASS)
@@ -18,6 +20,13 @@ def connect():
 
 def main():
     mode = sys.argv[1] if len(sys.argv) > 1 else "success"
+    # "sharded" routes by productId through the supervisor's consistent-hash exchange
+    sharded = "sharded" in sys.argv[2:]
+    # "bulk" sends to the low-priority bulk lane, as replays and re-scoring jobs do
+    queue = BULK_QUEUE_NAME if "bulk" in sys.argv[2:] else QUEUE_NAME
+    # "msgpack" and "gzip"/"zstd" send the review in that format, declared in the AMQP headers
+    content_type = 'application/msgpack' if "msgpack" in sys.argv[2:] else 'application/json'
+    content_encoding = next((flag for flag in ("gzip", "zstd") if flag in sys.argv[2:]), None)
     
     connection = connect()
     channel = connection.channel()
@@ -26,7 +35,7 @@ def main():
         'x-dead-letter-exchange': 'product_reviews_dlx',
         'x-dead-letter-routing-key': 'dead_letter'
     }
-    channel.queue_declare(queue=QUEUE_NAME, durable=True, arguments=arguments)
+    channel.queue_declare(queue=queue, durable=True, arguments=arguments)
 
     review_id = f"rv_{uuid.uuid4().hex[:8]}"
     
@@ -44,15 +53,21 @@ def main():
             "comment": "This product is amazing! I love it.",
             "timestamp": datetime.datetime.utcnow().isoformat()
         }
-        body = json.dumps(message)
-        print(f" [x] Sent review {review_id}")
+        if content_type == 'application/json' and content_encoding is None:
+            body = json.dumps(message)
+        else:
+            from src.payloads import dumps
+            body, content_encoding = dumps(message, content_type, content_encoding)
+        print(f" [x] Sent review {review_id} ({content_type}{', ' + content_encoding if content_encoding else ''})")
 
     channel.basic_publish(
-        exchange='',
-        routing_key=QUEUE_NAME,
+        exchange=SHARD_EXCHANGE if sharded else '',
+        routing_key="prod_123" if sharded else queue,
         body=body,
         properties=pika.BasicProperties(
             delivery_mode=2,  # make message persistent
+            content_type=content_type if mode != "malformed" else None,
+            content_encoding=content_encoding if mode != "malformed" else None,
         ))
     
     connection.close()
@@ -0,0 +1,149 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src import metrics
+from src.adaptive import AIMD, AdaptiveTuner
+from src.consumer import BULK_QUEUE_NAME, QUEUE_NAME, LaneConsumers, lane_prefetch
+
+
+class QosChannel:
+    """
+    Models RabbitMQ's per-consumer basic.qos: a consumer can be sent as many
+    unacked messages as the prefetch_count in force when it started.
+    """
+
+    def __init__(self):
+        self.unsettled = 0
+        self.cancels = 0
+        self._next_window = 0
+        self.windows = {}  # consumer tag -> window
+
+    def basic_qos(self, prefetch_count=0, global_qos=False):
+        assert not global_qos, "global qos is not used"
+        self._next_window = prefetch_count
+
+    def basic_consume(self, queue, on_message_callback, consumer_tag):
+        self.windows[consumer_tag] = self._next_window
+        return consumer_tag
+
+    def basic_cancel(self, consumer_tag):
+        del self.windows[consumer_tag]
+        self.cancels += 1
+        return []
+
+    def deliverable(self, queue):
+        """How many messages of a backlog on `queue` the broker would hand its consumer."""
+        return self.windows[queue]
+
+
+class TestAIMD(unittest.TestCase):
+
+    def test_respects_floor_and_ceiling(self):
+        value = AIMD(10, floor=4, ceiling=20, step=8, factor=0.5)
+        self.assertEqual(value.increase(), 18)
+        self.assertEqual(value.increase(), 20)
+        self.assertEqual(value.decrease(), 10)
+        self.assertEqual(value.decrease(), 5)
+        self.assertEqual(value.decrease(), 4)
+
+
+class TestAdaptiveTuner(unittest.TestCase):
+
+    def setUp(self):
+        self.channel = QosChannel()
+        self.consumers = LaneConsumers(self.channel, [QUEUE_NAME], [BULK_QUEUE_NAME], MagicMock())
+        self.consumers.set_prefetch(20)
+        self.batcher = MagicMock()
+        self.tuner = AdaptiveTuner(
+            MagicMock(), self.channel, AIMD(20, 1, 100, 10), self.consumers, batcher=self.batcher,
+            batch=AIMD(20, 1, 100, 10), target_latency_ms=100, target_commit_ms=50, restart_interval=0,
+        )
+        self.tuner.start()
+
+    def settle(self, count, latency, commit=0.001):
+        for _ in range(count):
+            metrics.PROCESSING_SECONDS.labels().observe(latency)
+        metrics.STAGE_COMMIT.observe(commit)
+
+    def test_grows_while_prefetch_is_the_bottleneck(self):
+        self.channel.unsettled = 18
+        self.settle(50, 0.01)
+
+        self.assertEqual(self.tuner.adjust(), ('increase', 'saturated'))
+        # The running consumers are restarted, so the broker really delivers more.
+        self.assertEqual(self.channel.deliverable(QUEUE_NAME), lane_prefetch(30)[0])
+        self.assertEqual(self.channel.deliverable(BULK_QUEUE_NAME), lane_prefetch(30)[1])
+        self.assertEqual(self.batcher.max_size, 30)
+        self.assertEqual(metrics.PREFETCH.labels().get(), 30)
+
+    def test_batch_never_exceeds_what_the_broker_delivers(self):
+        self.tuner.batch = AIMD(20, 1, 500, 100)
+        self.channel.unsettled = 18
+        self.settle(50, 0.01)
+
+        self.tuner.adjust()
+
+        self.assertEqual(self.tuner.batch.value, self.channel.deliverable(QUEUE_NAME))
+        self.assertEqual(self.batcher.max_size, self.channel.deliverable(QUEUE_NAME))
+
+    def test_backs_off_on_slow_commits_or_latency(self):
+        self.channel.unsettled = 20
+        self.settle(5, 0.01, commit=0.2)
+        self.assertEqual(self.tuner.adjust(), ('decrease', 'commit'))
+        self.settle(5, 0.5)
+        self.assertEqual(self.tuner.adjust(), ('decrease', 'latency'))
+
+        self.assertEqual(self.channel.deliverable(QUEUE_NAME), 5)
+        self.assertEqual(self.batcher.max_size, 5)
+
+    def test_holds_when_idle_or_underutilised(self):
+        self.assertEqual(self.tuner.adjust(), ('hold', 'idle'))
+        self.channel.unsettled = 2
+        self.settle(5, 0.01)
+        self.assertEqual(self.tuner.adjust(), ('hold', 'underutilised'))
+        self.assertEqual(self.tuner.prefetch.value, 20)
+        self.assertEqual(self.channel.deliverable(QUEUE_NAME), 20)
+
+    @patch('src.adaptive.time.monotonic')
+    def test_restarts_consumers_only_on_meaningful_changes(self, monotonic):
+        monotonic.return_value = 1000.0
+        channel = QosChannel()
+        consumers = LaneConsumers(channel, [QUEUE_NAME], [BULK_QUEUE_NAME], MagicMock())
+        tuner = AdaptiveTuner(MagicMock(), channel, AIMD(100, 1, 500, 5), consumers,
+                              target_latency_ms=100, restart_ratio=0.25, restart_interval=60)
+        tuner.start()
+        channel.unsettled = 100
+
+        # +5 every step: nothing is restarted until the change reaches 25% and 60s have passed.
+        for _ in range(5):
+            monotonic.return_value += 5
+            self.settle(10, 0.01)
+            self.assertEqual(tuner.adjust(), ('increase', 'saturated'))
+        self.assertEqual((channel.cancels, tuner.prefetch.value), (0, 125))
+        self.assertEqual(channel.deliverable(QUEUE_NAME), lane_prefetch(100)[0])
+        monotonic.return_value += 60
+        self.settle(10, 0.01)
+        tuner.adjust()
+        self.assertEqual(channel.cancels, 2)  # one restart of both lanes
+        self.assertEqual(channel.deliverable(QUEUE_NAME), lane_prefetch(130)[0])
+        self.assertEqual(metrics.PREFETCH.labels().get(), 130)
+
+        # Overload is shed straight away, but the next increase waits for the interval again.
+        self.settle(10, 0.5)
+        self.assertEqual(tuner.adjust(), ('decrease', 'latency'))
+        self.assertEqual((channel.cancels, tuner.applied), (4, 65))
+        channel.unsettled = 65
+        for _ in range(4):
+            monotonic.return_value += 5
+            self.settle(10, 0.01)
+            tuner.adjust()
+        self.assertEqual((channel.cancels, tuner.applied, tuner.prefetch.value), (4, 65, 85))
+
+
+if __name__ == '__main__':
+    unittest.main()
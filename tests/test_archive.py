@@ -0,0 +1,52 @@
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+from datetime import datetime
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.archive import (cold_partitions, decode_columns, encode_columns, maintain_partitions, read_archive,
+                         write_archive_file)
+
+
+class TestArchive(unittest.TestCase):
+
+    def test_columns_round_trip(self):
+        rows = [
+            ('rv_1', 'prod_1', 'user_1', 5, 'Très bien — 👍', 'POSITIVE', datetime(2024, 1, 2, 3, 4, 5, 678901)),
+            ('rv_2', 'prod_1', 'user_2', 1, '', 'NEGATIVE', datetime(2024, 1, 31, 23, 59, 59)),
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            write_archive_file(os.path.join(directory, 'p.0000.npz'), rows)
+            with open(os.path.join(directory, 'p.json'), 'w') as f:
+                f.write('{"files": ["p.0000.npz"]}')
+
+            restored = list(read_archive(directory, 'p'))
+
+        self.assertEqual([tuple(review.values()) for review in restored], rows)
+        self.assertEqual(decode_columns(encode_columns([])), [])
+
+    def test_cold_partitions(self):
+        partitions = [(datetime(2023, month, 1), f"p{month}") for month in (9, 10, 11)]
+
+        cold = cold_partitions(partitions, after_months=12, now=datetime(2024, 10, 15))
+
+        self.assertEqual([name for _, name in cold], ['p9'])
+
+    def test_maintenance_creates_partitions_every_interval(self):
+        sleep = MagicMock(side_effect=[None, None, KeyboardInterrupt])
+        with patch('src.archive.database.ensure_review_partitions',
+                   side_effect=[['processed_reviews_y2024m11'], ConnectionError("db restarting"), []]) as ensure:
+            with self.assertRaises(KeyboardInterrupt):
+                maintain_partitions(MagicMock(), interval=3600, sleep=sleep)
+
+        # The failed second pass did not stop the loop.
+        self.assertEqual(ensure.call_count, 3)
+        self.assertEqual([c.args for c in sleep.call_args_list], [(3600,)] * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
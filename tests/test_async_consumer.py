@@ -0,0 +1,149 @@
+import asyncio
+import json
+import unittest
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.async_consumer import AsyncReviewPipeline, Delivery, PikaBroker
+from src.database import Base, OutboxEvent, ProcessedReview, ProcessedReviewId
+
+
+class InMemoryBroker:
+    """Stands in for PikaBroker: replays a fixed list of bodies and records the outcome of each."""
+
+    def __init__(self, bodies, fail_publish_for=()):
+        self.bodies = bodies
+        self.fail_publish_for = set(fail_publish_for)
+        self.acked = []
+        self.rejected = []
+        self.published = []
+
+    async def deliveries(self):
+        for tag, body in enumerate(self.bodies, start=1):
+            yield Delivery(tag, body, None)
+
+    async def ack(self, delivery_tag):
+        self.acked.append(delivery_tag)
+
+    async def reject(self, delivery_tag, requeue=False):
+        self.rejected.append(delivery_tag)
+
+    async def dead_letter(self, delivery, reason):
+        self.rejected.append(delivery.delivery_tag)
+
+    async def retry_or_reject(self, delivery, error):
+        # Outcome of src.retry.retry_or_reject with no retry tiers left.
+        self.rejected.append(delivery.delivery_tag)
+
+    async def publish_event(self, event):
+        if event['reviewId'] in self.fail_publish_for:
+            raise RuntimeError("broker unavailable")
+        self.published.append(event)
+
+
+def review(review_id, comment="This product is great!"):
+    return json.dumps({
+        "reviewId": review_id,
+        "productId": "prod_1",
+        "userId": "user_1",
+        "rating": 5,
+        "comment": comment,
+        "timestamp": "2023-10-27T10:00:00Z"
+    }).encode()
+
+
+class TestAsyncReviewPipeline(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(bind=engine)
+        session = self.Session()
+        session.add(ProcessedReview(
+            review_id="rv_old", product_id="p", user_id="u",
+            rating=5, comment="c", sentiment="POSITIVE"
+        ))
+        session.add(ProcessedReviewId(review_id="rv_old"))
+        session.commit()
+        session.close()
+
+    def run_pipeline(self, broker, **kwargs):
+        pipeline = AsyncReviewPipeline(broker, session_factory=self.Session, queue_size=4,
+                                       score_concurrency=2, persist_batch=3, **kwargs)
+        asyncio.run(pipeline.run())
+
+    def stored_ids(self):
+        session = self.Session()
+        try:
+            return {row.review_id for row in session.query(ProcessedReview)}
+        finally:
+            session.close()
+
+    def test_mixed_stream(self):
+        malformed = b"{bad json"
+        missing = json.dumps({"reviewId": "rv_x", "productId": "p"}).encode()
+        broker = InMemoryBroker([review("rv_1"), malformed, review("rv_old"), missing, review("rv_2", "Terrible.")])
+
+        self.run_pipeline(broker)
+
+        self.assertEqual(sorted(broker.rejected), [2, 4])
+        self.assertEqual(sorted(broker.acked), [1, 3, 5])
+        events = {event['reviewId']: event['sentiment'] for event in broker.published}
+        self.assertEqual(events, {"rv_1": "POSITIVE", "rv_2": "NEGATIVE"})
+        self.assertEqual(self.stored_ids(), {"rv_old", "rv_1", "rv_2"})
+
+    def test_redelivery_within_stream_publishes_once(self):
+        broker = InMemoryBroker([review("rv_1"), review("rv_1")])
+
+        self.run_pipeline(broker)
+
+        self.assertEqual(sorted(broker.acked), [1, 2])
+        self.assertEqual([event['reviewId'] for event in broker.published], ["rv_1"])
+
+    def test_publish_failure_rejects_delivery(self):
+        broker = InMemoryBroker([review("rv_1"), review("rv_2")], fail_publish_for={"rv_2"})
+
+        self.run_pipeline(broker)
+
+        self.assertEqual(broker.acked, [1])
+        self.assertEqual(broker.rejected, [2])
+
+    def test_outbox_mode_acks_without_publishing(self):
+        broker = InMemoryBroker([review("rv_1"), review("rv_1"), review("rv_2")])
+
+        self.run_pipeline(broker, outbox=True)
+
+        self.assertEqual(sorted(broker.acked), [1, 2, 3])
+        self.assertEqual(broker.published, [])
+        session = self.Session()
+        try:
+            self.assertEqual(sorted(row.review_id for row in session.query(OutboxEvent)), ["rv_1", "rv_2"])
+        finally:
+            session.close()
+
+
+class TestPikaBroker(unittest.TestCase):
+
+    def test_startup_failure_is_raised_from_start(self):
+        def connect():
+            raise ConnectionError("broker unreachable")
+
+        broker = PikaBroker(connect, setup_queues=None, queue_names=["product_reviews"], publisher_factory=None,
+                            prefetch_count=10)
+
+        async def start():
+            await asyncio.wait_for(broker.start(), timeout=5)
+
+        with self.assertRaisesRegex(ConnectionError, "broker unreachable"):
+            asyncio.run(start())
+
+
+if __name__ == '__main__':
+    unittest.main()
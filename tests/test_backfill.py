@@ -0,0 +1,104 @@
+import json
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from src.backfill import Backfill, load_checkpoint, read_records
+from src.database import Base, OutboxEvent, ProcessedReview
+
+
+def review(i, comment="This product is amazing! I love it."):
+    return {"reviewId": f"rv_{i}", "productId": "prod_123", "userId": "user_456", "rating": 5, "comment": comment}
+
+
+class TestBackfill(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(bind=engine)
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.checkpoint = os.path.join(self.dir.name, 'reviews.checkpoint')
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(self.executor.shutdown)
+
+    def write_jsonl(self, lines):
+        path = os.path.join(self.dir.name, 'reviews.jsonl')
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        return path
+
+    def backfill(self, **kwargs):
+        return Backfill(session_factory=self.Session, executor=self.executor, chunk_size=2,
+                        checkpoint_path=self.checkpoint, **kwargs)
+
+    def count(self, model):
+        session = self.Session()
+        try:
+            return session.execute(select(func.count()).select_from(model)).scalar()
+        finally:
+            session.close()
+
+    def test_loads_valid_records_and_skips_the_rest(self):
+        path = self.write_jsonl([
+            json.dumps(review(0)),
+            'not json',
+            json.dumps({"reviewId": "rv_missing"}),
+            '',
+            json.dumps(review(1, "Terrible. Broke after a day.")),
+            json.dumps(review(0)),
+        ])
+
+        stats = self.backfill(events='outbox').run(path)
+
+        self.assertEqual(stats['inserted'], 2)
+        self.assertEqual(stats['invalid'], 2)
+        self.assertEqual(stats['duplicates'], 1)
+        session = self.Session()
+        sentiments = dict(session.execute(select(ProcessedReview.review_id, ProcessedReview.sentiment)).all())
+        session.close()
+        self.assertEqual(sentiments, {'rv_0': 'POSITIVE', 'rv_1': 'NEGATIVE'})
+        self.assertEqual(self.count(OutboxEvent), 2)
+        self.assertEqual(load_checkpoint(self.checkpoint), 6)
+
+    def test_resumes_from_checkpoint(self):
+        path = self.write_jsonl([json.dumps(review(i)) for i in range(5)])
+        publisher = MagicMock()
+        publisher.publish_many.return_value = []
+        with open(self.checkpoint, 'w') as f:
+            json.dump({'offset': 3}, f)
+
+        stats = self.backfill(events='publish', publisher=publisher).run(path)
+
+        self.assertEqual(stats['read'], 2)
+        self.assertEqual(stats['published'], 2)
+        published = [event['reviewId'] for call in publisher.publish_many.call_args_list for event in call[0][0]]
+        self.assertEqual(published, ['rv_3', 'rv_4'])
+        self.assertEqual(load_checkpoint(self.checkpoint), 5)
+
+    def test_reads_csv(self):
+        path = os.path.join(self.dir.name, 'reviews.csv')
+        with open(path, 'w') as f:
+            f.write('reviewId,productId,userId,rating,comment\n')
+            f.write('rv_0,prod_1,user_1,4,"Good, works well"\n')
+            f.write('rv_1,prod_1,user_2,five,Bad\n')
+
+        records = list(read_records(path))
+
+        self.assertEqual(records[0], (0, {'reviewId': 'rv_0', 'productId': 'prod_1', 'userId': 'user_1',
+                                          'rating': 4, 'comment': 'Good, works well'}))
+        self.assertEqual(records[1], (1, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
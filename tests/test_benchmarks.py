@@ -0,0 +1,83 @@
+import json
+import unittest
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from benchmarks.corpus import generate_reviews
+from benchmarks.payloads import run as run_payloads
+from benchmarks.run import compare, run_scenario
+
+
+def result(msgs_per_sec, p95, p99):
+    return {'msgs_per_sec': msgs_per_sec, 'latency_ms': {'p50': 1.0, 'p95': p95, 'p99': p99}}
+
+
+class TestCorpus(unittest.TestCase):
+
+    def test_is_repeatable_and_honours_rates(self):
+        bodies = generate_reviews(500, seed=3, duplicate_rate=0.1, malformed_rate=0.1)
+        self.assertEqual(len(bodies), 500)
+        again = generate_reviews(500, seed=3, duplicate_rate=0.1, malformed_rate=0.1)
+
+        decoded = []
+        for body, other in zip(bodies, again):
+            try:
+                review = json.loads(body)
+            except ValueError:
+                self.assertEqual(body, other)
+                continue
+            # Same reviews apart from the send timestamp.
+            self.assertEqual(review['comment'], json.loads(other)['comment'])
+            decoded.append(review['reviewId'])
+        self.assertTrue(20 < 500 - len(decoded) < 80)
+        self.assertTrue(20 < len(decoded) - len(set(decoded)) < 80)
+
+    def test_fixed_distribution(self):
+        body = json.loads(generate_reviews(1, distribution='fixed', mean_words=12)[0])
+        self.assertEqual(len(body['comment'].split()), 12)
+
+
+class TestCompare(unittest.TestCase):
+
+    def test_flags_throughput_and_tail_latency_regressions(self):
+        baseline = {'results': {'single': result(1000, 5.0, 8.0), 'batch': result(5000, 50.0, 60.0)}}
+        current = {'results': {'single': result(850, 5.2, 9.5), 'batch': result(4800, 52.0, 61.0),
+                               'sentiment': result(1, 1, 1)}}
+
+        regressions = compare(current, baseline, tolerance=0.10)
+
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(regressions[0].startswith('single: throughput'))
+        self.assertTrue(regressions[1].startswith('single: p99'))
+
+
+class TestScenarios(unittest.TestCase):
+
+    def test_smoke(self):
+        options = {'messages': 40, 'seed': 1, 'distribution': 'uniform', 'mean_words': 10, 'max_words': 50,
+                   'duplicate_rate': 0.1, 'malformed_rate': 0.05, 'batch_size': 16, 'database_url': ''}
+        for name in ('single', 'batch', 'sentiment_batch'):
+            summary = run_scenario(name, options)
+            self.assertGreater(summary['msgs_per_sec'], 0)
+            self.assertLessEqual(summary['latency_ms']['p50'], summary['latency_ms']['p99'])
+            self.assertGreater(summary['peak_rss_mb'], 0)
+
+
+class TestPayloadBenchmark(unittest.TestCase):
+
+    def test_reports_size_ratio_and_cost(self):
+        report = run_payloads(messages=50, mean_words=(60,), formats=[('application/json', None),
+                                                                        ('application/json', 'gzip')])
+
+        self.assertEqual(set(report), {'reviews_60w', 'events'})
+        plain, gzipped = report['reviews_60w']['application/json+identity'], report['reviews_60w']['application/json+gzip']
+        self.assertEqual(plain['ratio'], 1.0)
+        self.assertLess(gzipped['ratio'], 1.0)
+        self.assertGreater(gzipped['encode_us'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
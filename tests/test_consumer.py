@@ -1,7 +1,8 @@
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import ANY, MagicMock, patch
 import sys
 import os
+import gzip
 import json
 
 # Add project root to path
@@ -37,18 +38,38 @@ sys.modules['src.sentiment'] = mock_sentiment
 mock_publisher = MagicMock()
 sys.modules['src.publisher'] = mock_publisher
 
+mock_retry = MagicMock()
+sys.modules['src.retry'] = mock_retry
+
 # --- AGGRESSIVE MOCKING END ---
 
 # Now import the module under test
 import src.consumer
 
+
+def _raise(error):
+    raise error
+
+
+def delivery_properties(content_type=None, content_encoding=None):
+    """BasicProperties stand-in; plain JSON unless told otherwise."""
+    return MagicMock(content_type=content_type, content_encoding=content_encoding)
+
 class TestConsumerLogicV2(unittest.TestCase):
     
     def setUp(self):
         self.mock_ch = MagicMock()
         self.mock_method = MagicMock()
-        self.mock_properties = MagicMock()
+        self.mock_properties = delivery_properties()
         self.mock_publisher = MagicMock()
+        mock_retry.dead_letter.reset_mock()
+
+    def assert_dead_lettered(self, body, reason):
+        mock_retry.dead_letter.assert_called_with(
+            self.mock_ch, self.mock_method.delivery_tag, self.mock_properties, body, ANY, src.consumer.DLX_NAME
+        )
+        self.assertIn(reason, mock_retry.dead_letter.call_args[0][4])
+        mock_retry.dead_letter.reset_mock()
         
     def test_process_valid_message(self):
         # Trigger the callback
@@ -56,19 +77,20 @@ class TestConsumerLogicV2(unittest.TestCase):
         
         # Setup specific mocks for this test
         # We need to mock what src.consumer uses: 
-        #   src.database.get_db_session
+        #   src.database.get_db_connection / fetch_existing_review_ids / bulk_insert_reviews
         #   src.sentiment.analyze_sentiment
         #   src.publisher.EventPublisher (actually passed in, so we use self.mock_publisher)
         
-        mock_session = MagicMock()
-        # get_db_session is a generator
-        mock_database.get_db_session.return_value = iter([mock_session])
+        mock_connection = MagicMock()
+        mock_database.get_db_connection.return_value = mock_connection
         
         # Analyze sentiment returns string
         mock_sentiment.analyze_sentiment.return_value = 'POSITIVE'
         
-        # Database query returns None (no existing review)
-        mock_session.query.return_value.filter_by.return_value.first.return_value = None
+        # No existing review, and the insert goes through
+        mock_database.fetch_existing_review_ids.return_value = set()
+        mock_database.bulk_insert_reviews.reset_mock(side_effect=True)
+        mock_database.bulk_insert_reviews.return_value = {"rv_v2_1"}
         
         body = json.dumps({
             "reviewId": "rv_v2_1",
@@ -85,11 +107,12 @@ class TestConsumerLogicV2(unittest.TestCase):
         # Verifications
         mock_sentiment.analyze_sentiment.assert_called_with("Nice!")
         
-        mock_session.add.assert_called()
-        args, _ = mock_session.add.call_args
-        # The object added should be an instance of ProcessedReview (which is a mock)
-        # We can check its attributes if the mock constructor stored them, but MagicMock defaults don't simplify that.
-        # usually verify that it was called.
+        mock_database.bulk_insert_reviews.assert_called_once()
+        connection, rows = mock_database.bulk_insert_reviews.call_args[0]
+        self.assertIs(connection, mock_connection)
+        self.assertEqual(rows[0]['review_id'], "rv_v2_1")
+        self.assertEqual(rows[0]['sentiment'], "POSITIVE")
+        mock_connection.begin.assert_called()
         
         self.mock_publisher.publish.assert_called()
         pub_args = self.mock_publisher.publish.call_args[0][0]
@@ -98,12 +121,38 @@ class TestConsumerLogicV2(unittest.TestCase):
         
         self.mock_ch.basic_ack.assert_called()
 
+    def test_process_gzip_compressed_message(self):
+        mock_database.fetch_existing_review_ids.return_value = set()
+        mock_database.bulk_insert_reviews.reset_mock(side_effect=True)
+        mock_database.bulk_insert_reviews.return_value = {"rv_gz"}
+        body = gzip.compress(json.dumps({
+            "reviewId": "rv_gz",
+            "productId": "prod_1",
+            "userId": "user_1",
+            "rating": 3,
+            "comment": "Compressed " * 50
+        }).encode('utf-8'))
+
+        src.consumer.process_message(self.mock_ch, self.mock_method, delivery_properties('application/json', 'gzip'),
+                                     body, self.mock_publisher)
+
+        rows = mock_database.bulk_insert_reviews.call_args[0][1]
+        self.assertEqual(rows[0]['comment'], "Compressed " * 50)
+        self.mock_ch.basic_ack.assert_called_with(delivery_tag=self.mock_method.delivery_tag)
+
+    def test_unsupported_encoding_is_dead_lettered(self):
+        body = b"\x00\x01"
+        self.mock_properties = delivery_properties('application/json', 'br')
+
+        src.consumer.process_message(self.mock_ch, self.mock_method, self.mock_properties, body, self.mock_publisher)
+
+        self.assert_dead_lettered(body, "unsupported content_encoding 'br'")
+
     def test_process_duplicate(self):
-        mock_session = MagicMock()
-        mock_database.get_db_session.return_value = iter([mock_session])
+        mock_database.bulk_insert_reviews.reset_mock(side_effect=True)
         
-        # Database query returns Something
-        mock_session.query.return_value.filter_by.return_value.first.return_value = MagicMock()
+        # Database lookup finds the review
+        mock_database.fetch_existing_review_ids.return_value = {"rv_dup"}
         
         body = json.dumps({
             "reviewId": "rv_dup",
@@ -115,17 +164,34 @@ class TestConsumerLogicV2(unittest.TestCase):
         
         src.consumer.process_message(self.mock_ch, self.mock_method, self.mock_properties, body, self.mock_publisher)
         
-        mock_session.add.assert_not_called()
+        mock_database.bulk_insert_reviews.assert_not_called()
         self.mock_publisher.publish.assert_not_called()
         self.mock_ch.basic_ack.assert_called()
 
+    def test_insert_conflict_is_acked_as_duplicate(self):
+        # Not seen by the lookup, but inserted by another consumer in the meantime.
+        mock_database.fetch_existing_review_ids.return_value = set()
+        mock_database.bulk_insert_reviews.reset_mock(side_effect=True)
+        mock_database.bulk_insert_reviews.return_value = set()
+        body = json.dumps({
+            "reviewId": "rv_race",
+            "productId": "prod_1",
+            "userId": "user_1",
+            "rating": 5,
+            "comment": "Raced"
+        }).encode('utf-8')
+
+        src.consumer.process_message(self.mock_ch, self.mock_method, self.mock_properties, body, self.mock_publisher)
+
+        self.mock_publisher.publish.assert_not_called()
+        self.mock_ch.basic_ack.assert_called_with(delivery_tag=self.mock_method.delivery_tag)
+
     def test_malformed_json(self):
         body = b"invalid json"
         src.consumer.process_message(self.mock_ch, self.mock_method, self.mock_properties, body, self.mock_publisher)
         
-        # Should reject
-        # Should reject
-        self.mock_ch.basic_reject.assert_called_with(delivery_tag=self.mock_method.delivery_tag, requeue=False)
+        # Should dead-letter, saying why
+        self.assert_dead_lettered(body, "invalid JSON")
 
     def test_missing_fields(self):
         body = json.dumps({
@@ -137,7 +203,21 @@ class TestConsumerLogicV2(unittest.TestCase):
         src.consumer.process_message(self.mock_ch, self.mock_method, self.mock_properties, body, self.mock_publisher)
         
         # Should reject to DLQ
-        self.mock_ch.basic_reject.assert_called_with(delivery_tag=self.mock_method.delivery_tag, requeue=False)
+        self.assert_dead_lettered(body, "missing fields ['productId', 'userId', 'rating']")
+
+    def test_out_of_range_rating(self):
+        body = json.dumps({
+            "reviewId": "rv_rating",
+            "productId": "prod_1",
+            "userId": "user_1",
+            "rating": 11,
+            "comment": "Off the scale"
+        }).encode('utf-8')
+
+        src.consumer.process_message(self.mock_ch, self.mock_method, self.mock_properties, body, self.mock_publisher)
+
+        self.assert_dead_lettered(body, "rating must be an integer from 1 to 5, got 11")
+        self.mock_publisher.publish.assert_not_called()
 
     def test_missing_critical_fields(self):
         # Test missing reviewId
@@ -149,10 +229,7 @@ class TestConsumerLogicV2(unittest.TestCase):
         }).encode('utf-8')
         
         src.consumer.process_message(self.mock_ch, self.mock_method, self.mock_properties, body_no_id, self.mock_publisher)
-        self.mock_ch.basic_reject.assert_called_with(delivery_tag=self.mock_method.delivery_tag, requeue=False)
-        
-        # Reset mocks
-        self.mock_ch.reset_mock()
+        self.assert_dead_lettered(body_no_id, "missing fields ['reviewId']")
         
         # Test missing comment
         body_no_comment = json.dumps({
@@ -163,18 +240,39 @@ class TestConsumerLogicV2(unittest.TestCase):
         }).encode('utf-8')
         
         src.consumer.process_message(self.mock_ch, self.mock_method, self.mock_properties, body_no_comment, self.mock_publisher)
-        self.mock_ch.basic_reject.assert_called_with(delivery_tag=self.mock_method.delivery_tag, requeue=False)
+        self.assert_dead_lettered(body_no_comment, "missing fields ['comment']")
+
+    def test_processing_error_goes_through_retry_policy(self):
+        mock_database.fetch_existing_review_ids.return_value = set()
+        mock_database.bulk_insert_reviews.reset_mock(side_effect=True)
+        mock_database.bulk_insert_reviews.side_effect = error = RuntimeError("connection lost")
+        mock_retry.retry_or_reject.reset_mock()
+        body = json.dumps({
+            "reviewId": "rv_retry",
+            "productId": "prod_1",
+            "userId": "user_1",
+            "rating": 5,
+            "comment": "Retry me"
+        }).encode('utf-8')
+
+        # sqlalchemy is mocked out, so give the IntegrityError handler a real exception class.
+        with patch.object(src.consumer, 'IntegrityError', type('IntegrityError', (Exception,), {})):
+            src.consumer.process_message(self.mock_ch, self.mock_method, self.mock_properties, body, self.mock_publisher)
+        mock_database.bulk_insert_reviews.side_effect = None
+
+        mock_retry.retry_or_reject.assert_called_once_with(
+            self.mock_ch, self.mock_method.delivery_tag, self.mock_properties, body, error, src.consumer.QUEUE_NAME
+        )
+        self.mock_ch.basic_reject.assert_not_called()
+        self.mock_publisher.publish.assert_not_called()
 
     def test_integrity_error(self):
         """Test that IntegrityError triggers an Ack (treating as duplicate)."""
-        mock_session = MagicMock()
-        mock_database.get_db_session.return_value = iter([mock_session])
+        # Database lookup finds nothing (so it tries to insert)
+        mock_database.fetch_existing_review_ids.return_value = set()
         
-        # Database query returns None (so it tries to insert)
-        mock_session.query.return_value.filter_by.return_value.first.return_value = None
-        
-        # Simulate IntegrityError on commit
-        mock_session.commit.side_effect = src.sqlalchemy.exc.IntegrityError(None, None, None)
+        # Simulate IntegrityError on insert
+        mock_database.bulk_insert_reviews.side_effect = src.sqlalchemy.exc.IntegrityError(None, None, None)
         
         body = json.dumps({
             "reviewId": "rv_integrity_fail",
@@ -192,5 +290,244 @@ class TestConsumerLogicV2(unittest.TestCase):
         self.mock_ch.basic_nack.assert_not_called()
 
 
+class TestBatchProcessing(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_ch = MagicMock()
+        self.mock_publisher = MagicMock()
+        self.mock_connection = MagicMock()
+        mock_database.get_db_connection.return_value = self.mock_connection
+        mock_database.bulk_insert_reviews.reset_mock(side_effect=True)
+        mock_sentiment.analyze_sentiment.return_value = 'POSITIVE'
+
+    def _delivery(self, tag, payload):
+        method = MagicMock()
+        method.delivery_tag = tag
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+        return (method, delivery_properties(), body)
+
+    def _review(self, review_id):
+        return {
+            "reviewId": review_id,
+            "productId": "prod_1",
+            "userId": "user_1",
+            "rating": 4,
+            "comment": "Batch review"
+        }
+
+    def test_batch_single_insert_and_multi_ack(self):
+        mock_database.bulk_insert_reviews.return_value = {"rv_b1", "rv_b2"}
+        deliveries = [self._delivery(1, self._review("rv_b1")), self._delivery(2, self._review("rv_b2"))]
+
+        src.consumer.process_batch(self.mock_ch, deliveries, self.mock_publisher)
+
+        mock_database.bulk_insert_reviews.assert_called_once()
+        rows = mock_database.bulk_insert_reviews.call_args[0][1]
+        self.assertEqual([row['review_id'] for row in rows], ["rv_b1", "rv_b2"])
+        self.mock_connection.begin.assert_called_once()
+        events = self.mock_publisher.publish_many.call_args[0][0]
+        self.assertEqual([event['reviewId'] for event in events], ["rv_b1", "rv_b2"])
+        self.mock_ch.basic_ack.assert_called_once_with(delivery_tag=2, multiple=True)
+        self.mock_ch.basic_reject.assert_not_called()
+
+    def test_batch_holds_back_acks_for_nacked_events(self):
+        mock_database.bulk_insert_reviews.return_value = {"rv_n1", "rv_n2", "rv_n3"}
+        self.mock_publisher.publish_many.side_effect = lambda events: [
+            position for position, e in enumerate(events) if e['reviewId'] == "rv_n3"
+        ]
+        deliveries = [self._delivery(tag, self._review(f"rv_n{tag}")) for tag in (1, 2, 3)]
+
+        mock_retry.retry_or_reject.reset_mock()
+
+        src.consumer.process_batch(self.mock_ch, deliveries, self.mock_publisher)
+
+        # The nacked event's delivery goes through the retry policy; the rest are acked.
+        mock_retry.retry_or_reject.assert_called_once_with(
+            self.mock_ch, 3, deliveries[2][1], deliveries[2][2], ANY, ANY
+        )
+        self.mock_ch.basic_reject.assert_not_called()
+        self.mock_ch.basic_ack.assert_called_once_with(delivery_tag=2, multiple=True)
+
+    def test_batch_scoring_failure_goes_through_retry_policy(self):
+        mock_database.bulk_insert_reviews.return_value = {"rv_s1"}
+        mock_retry.retry_or_reject.reset_mock()
+        error = ConnectionError("scorer unavailable")
+        mock_sentiment.analyze_sentiment.side_effect = lambda comment: 'POSITIVE' if comment == "Fine" else _raise(error)
+        deliveries = [self._delivery(1, dict(self._review("rv_s1"), comment="Fine")),
+                      self._delivery(2, self._review("rv_s2"))]
+        try:
+            src.consumer.process_batch(self.mock_ch, deliveries, self.mock_publisher)
+        finally:
+            mock_sentiment.analyze_sentiment.side_effect = None
+
+        mock_retry.retry_or_reject.assert_called_once_with(
+            self.mock_ch, 2, deliveries[1][1], deliveries[1][2], error, src.consumer.QUEUE_NAME
+        )
+        self.mock_ch.basic_reject.assert_not_called()
+        self.mock_ch.basic_ack.assert_called_once_with(delivery_tag=1, multiple=True)
+
+    def test_batch_rejects_poison_individually(self):
+        mock_database.bulk_insert_reviews.return_value = {"rv_b3"}
+        mock_retry.dead_letter.reset_mock()
+        deliveries = [
+            self._delivery(1, b"not json"),
+            self._delivery(2, self._review("rv_b3")),
+            self._delivery(3, {"reviewId": "rv_incomplete"}),
+        ]
+
+        src.consumer.process_batch(self.mock_ch, deliveries, self.mock_publisher)
+
+        self.assertEqual([call[0][1] for call in mock_retry.dead_letter.call_args_list], [1, 3])
+        self.mock_ch.basic_reject.assert_not_called()
+        self.mock_ch.basic_ack.assert_called_once_with(delivery_tag=2, multiple=True)
+
+    def test_batch_skips_publish_for_existing_reviews(self):
+        # Nothing inserted: every review already existed.
+        mock_database.bulk_insert_reviews.return_value = set()
+        deliveries = [self._delivery(5, self._review("rv_old"))]
+
+        src.consumer.process_batch(self.mock_ch, deliveries, self.mock_publisher)
+
+        self.mock_publisher.publish.assert_not_called()
+        self.mock_publisher.publish_many.assert_not_called()
+        self.mock_ch.basic_ack.assert_called_once_with(delivery_tag=5, multiple=True)
+
+    def test_batch_dedup_skips_known_reviews(self):
+        mock_database.bulk_insert_reviews.return_value = {"rv_new"}
+        mock_dedup = MagicMock()
+        mock_dedup.find_existing.return_value = {"rv_known"}
+        deliveries = [self._delivery(1, self._review("rv_known")), self._delivery(2, self._review("rv_new"))]
+
+        src.consumer.process_batch(self.mock_ch, deliveries, self.mock_publisher, mock_dedup)
+
+        rows = mock_database.bulk_insert_reviews.call_args[0][1]
+        self.assertEqual([row['review_id'] for row in rows], ["rv_new"])
+        mock_dedup.mark_processed.assert_called_once_with({"rv_new"})
+        self.assertEqual(len(self.mock_publisher.publish_many.call_args[0][0]), 1)
+        self.mock_ch.basic_ack.assert_called_once_with(delivery_tag=2, multiple=True)
+
+    def test_batcher_flushes_when_full(self):
+        mock_database.bulk_insert_reviews.return_value = {"rv_f1", "rv_f2"}
+        mock_connection = MagicMock()
+        batcher = src.consumer.ReviewBatcher(mock_connection, self.mock_ch, self.mock_publisher, max_size=2, max_wait_ms=100)
+
+        batcher.on_message(self.mock_ch, *self._delivery(1, self._review("rv_f1")))
+        mock_connection.call_later.assert_called_once()
+        self.mock_ch.basic_ack.assert_not_called()
+
+        batcher.on_message(self.mock_ch, *self._delivery(2, self._review("rv_f2")))
+        mock_connection.remove_timeout.assert_called_once()
+        self.mock_ch.basic_ack.assert_called_once_with(delivery_tag=2, multiple=True)
+        self.assertEqual(batcher.pending, [])
+
+
+class TestScoringOffloader(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_ch = MagicMock()
+        self.mock_method = MagicMock()
+        self.mock_publisher = MagicMock()
+        self.mock_connection = MagicMock()
+        # Run thread-safe callbacks immediately, as the connection thread would.
+        self.mock_connection.add_callback_threadsafe.side_effect = lambda callback: callback()
+        self.mock_executor = MagicMock()
+
+        def submit(fn, *args):
+            future = MagicMock()
+            future.result.return_value = 'NEGATIVE'
+            future.add_done_callback.side_effect = lambda callback: callback(future)
+            return future
+        self.mock_executor.submit.side_effect = submit
+
+        self.offloader = src.consumer.ScoringOffloader(
+            self.mock_connection, self.mock_publisher, executor=self.mock_executor
+        )
+
+    def test_scores_in_pool_and_acks_on_connection_thread(self):
+        mock_database.fetch_existing_review_ids.return_value = set()
+        mock_database.bulk_insert_reviews.reset_mock(side_effect=True)
+        mock_database.bulk_insert_reviews.return_value = {"rv_pool"}
+
+        body = json.dumps({
+            "reviewId": "rv_pool",
+            "productId": "prod_1",
+            "userId": "user_1",
+            "rating": 2,
+            "comment": "Slow and flimsy"
+        }).encode('utf-8')
+        self.offloader.on_message(self.mock_ch, self.mock_method, delivery_properties(), body)
+
+        self.mock_executor.submit.assert_called_once_with(mock_sentiment.analyze_sentiment, "Slow and flimsy")
+        self.mock_connection.add_callback_threadsafe.assert_called_once()
+        mock_database.bulk_insert_reviews.assert_called_once()
+        pub_args = self.mock_publisher.publish.call_args[0][0]
+        self.assertEqual(pub_args['sentiment'], 'NEGATIVE')
+        self.mock_ch.basic_ack.assert_called_with(delivery_tag=self.mock_method.delivery_tag)
+
+    def test_invalid_message_is_not_submitted(self):
+        mock_retry.dead_letter.reset_mock()
+        self.offloader.on_message(self.mock_ch, self.mock_method, delivery_properties(), b"not json")
+
+        self.mock_executor.submit.assert_not_called()
+        mock_retry.dead_letter.assert_called_once()
+
+    def test_broken_pool_is_replaced_and_delivery_retried(self):
+        mock_database.fetch_existing_review_ids.return_value = set()
+        mock_retry.retry_or_reject.reset_mock()
+        broken = src.consumer.BrokenExecutor("A process in the process pool was terminated abruptly")
+        self.mock_executor.submit.side_effect = broken
+        replacement = MagicMock()
+
+        body = json.dumps({
+            "reviewId": "rv_oom",
+            "productId": "prod_1",
+            "userId": "user_1",
+            "rating": 2,
+            "comment": "Slow and flimsy"
+        }).encode('utf-8')
+        with patch.object(self.offloader, '_new_executor', return_value=replacement):
+            self.offloader.on_message(self.mock_ch, self.mock_method, delivery_properties(), body)
+
+        mock_retry.retry_or_reject.assert_called_once_with(
+            self.mock_ch, self.mock_method.delivery_tag, ANY, body, broken, ANY
+        )
+        self.mock_executor.shutdown.assert_called_once()
+        self.assertIs(self.offloader.executor, replacement)
+
+
+class TestPriorityLanes(unittest.TestCase):
+
+    def test_lane_prefetch_keeps_live_share(self):
+        self.assertEqual(src.consumer.lane_prefetch(100, share=0.2), (100, 25))
+        # A bulk window of one still leaves live traffic 80% of the deliveries.
+        self.assertEqual(src.consumer.lane_prefetch(1, share=0.2), (4, 1))
+        self.assertEqual(src.consumer.lane_prefetch(10, share=0.5), (10, 10))
+
+    def test_bulk_deliveries_retry_into_bulk_lane(self):
+        self.assertEqual(src.consumer.source_queue(MagicMock(routing_key=src.consumer.BULK_QUEUE_NAME)),
+                         src.consumer.BULK_QUEUE_NAME)
+        self.assertEqual(src.consumer.source_queue(MagicMock(routing_key=src.consumer.QUEUE_NAME)),
+                         src.consumer.QUEUE_NAME)
+        self.assertEqual(src.consumer.source_queue(MagicMock(routing_key='prod_123')), src.consumer.QUEUE_NAME)
+
+    def test_shard_deliveries_retry_into_their_shard(self):
+        # Sharded deliveries are routed by productId; the consumer tag names the shard queue.
+        method = MagicMock(routing_key='prod_123', consumer_tag='product_reviews.shard.3')
+        self.assertEqual(src.consumer.source_queue(method), 'product_reviews.shard.3')
+        method = MagicMock(routing_key='prod_123', consumer_tag='ctag1.abc')
+        self.assertEqual(src.consumer.source_queue(method), src.consumer.QUEUE_NAME)
+
+
+class TestStartupMetrics(unittest.TestCase):
+
+    def test_time_to_first_message_logged_once(self):
+        report = src.consumer.first_message_reporter(0.0)
+        with self.assertLogs(src.consumer.logger, level='INFO') as logs:
+            report()
+            report()
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("time_to_first_message=", logs.output[0])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,91 @@
+import time
+import unittest
+from unittest.mock import patch
+import sys
+import os
+from datetime import datetime
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy.pool import StaticPool
+
+from src import database
+
+
+def row(review_id):
+    return {'review_id': review_id, 'product_id': 'prod_1', 'user_id': 'user_1', 'rating': 4,
+            'comment': 'Fine', 'sentiment': 'NEUTRAL'}
+
+
+class TestCoreWritePath(unittest.TestCase):
+
+    def setUp(self):
+        self.original_engine = database.engine
+        database.configure_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+        database.init_db()
+
+    def tearDown(self):
+        database.get_db_connection().close()
+        database.engine = self.original_engine
+        database.SessionLocal.configure(bind=self.original_engine)
+
+    def test_connection_is_long_lived_and_replaced_when_closed(self):
+        connection = database.get_db_connection()
+        self.assertIs(database.get_db_connection(), connection)
+
+        connection.close()
+        self.assertIsNot(database.get_db_connection(), connection)
+
+    def test_idle_connection_goes_back_to_the_pool(self):
+        connection = database.get_db_connection()
+        with patch.object(database.time, 'monotonic', return_value=time.monotonic() + database.DB_CONNECTION_MAX_IDLE):
+            replacement = database.get_db_connection()
+        self.assertIsNot(replacement, connection)
+        self.assertTrue(connection.closed)
+
+        # Never inside a transaction.
+        with replacement.begin():
+            with patch.object(database.time, 'monotonic', return_value=time.monotonic() + database.DB_POOL_RECYCLE):
+                self.assertIs(database.get_db_connection(), replacement)
+
+    def test_bulk_insert_returns_only_new_ids(self):
+        connection = database.get_db_connection()
+        with connection.begin():
+            self.assertEqual(database.bulk_insert_reviews(connection, [row('rv_1'), row('rv_2')]), {'rv_1', 'rv_2'})
+        with connection.begin():
+            self.assertEqual(database.bulk_insert_reviews(connection, [row('rv_2'), row('rv_3')]), {'rv_3'})
+            self.assertEqual(database.fetch_existing_review_ids(connection, ['rv_1', 'rv_4']), {'rv_1'})
+
+    def test_archived_ids_stay_duplicates(self):
+        connection = database.get_db_connection()
+        with connection.begin():
+            database.bulk_insert_reviews(connection, [row('rv_1'), row('rv_1')])
+        # Archiving removes the review itself but keeps its id registered.
+        with connection.begin():
+            connection.execute(database.delete(database.ProcessedReview))
+        with connection.begin():
+            self.assertEqual(database.bulk_insert_reviews(connection, [row('rv_1'), row('rv_2')]), {'rv_2'})
+            self.assertEqual(database.fetch_existing_review_ids(connection, ['rv_1']), {'rv_1'})
+            self.assertEqual(list(database.iter_review_ids(connection)), ['rv_1', 'rv_2'])
+
+    def test_init_db_registers_existing_reviews(self):
+        connection = database.get_db_connection()
+        with connection.begin():
+            connection.execute(database.insert(database.ProcessedReview), [row('rv_old')])
+        database.ProcessedReviewId.__table__.drop(bind=database.engine)
+
+        database.init_db()
+
+        with connection.begin():
+            self.assertEqual(database.fetch_existing_review_ids(connection, ['rv_old', 'rv_new']), {'rv_old'})
+
+    def test_month_arithmetic(self):
+        self.assertEqual(database.add_months(datetime(2024, 11, 1), 3), datetime(2025, 2, 1))
+        self.assertEqual(database.add_months(datetime(2024, 1, 1), -13), datetime(2022, 12, 1))
+        self.assertEqual(database.month_start(datetime(2024, 3, 31, 23, 59)), datetime(2024, 3, 1))
+        self.assertEqual(database.review_partition_name(datetime(2024, 3, 1)), 'processed_reviews_y2024m03')
+
+
+if __name__ == '__main__':
+    unittest.main()
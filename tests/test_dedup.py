@@ -0,0 +1,85 @@
+import unittest
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.database import Base, ProcessedReview, ProcessedReviewId
+from src.dedup import BloomFilter, LRUSet, ReviewDeduplicator
+
+
+class TestLRUSet(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        lru = LRUSet(2)
+        lru.add("a")
+        lru.add("b")
+        self.assertIn("a", lru)  # touch "a" so "b" becomes the oldest
+        lru.add("c")
+        self.assertIn("a", lru)
+        self.assertNotIn("b", lru)
+        self.assertEqual(len(lru), 2)
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(1000, 0.01)
+        ids = [f"rv_{i}" for i in range(1000)]
+        for review_id in ids:
+            bloom.add(review_id)
+        self.assertTrue(all(review_id in bloom for review_id in ids))
+
+    def test_false_positive_rate_near_target(self):
+        bloom = BloomFilter(1000, 0.01)
+        for i in range(1000):
+            bloom.add(f"rv_{i}")
+        false_positives = sum(f"other_{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives / 10000, 0.03)
+
+    def test_max_bytes_caps_memory(self):
+        bloom = BloomFilter(1000000, 0.001, max_bytes=1024)
+        self.assertEqual(bloom.size_bytes, 1024)
+
+
+class TestReviewDeduplicator(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(bind=engine)
+        self.session = sessionmaker(bind=engine)()
+        for review_id in ("rv_1", "rv_2"):
+            self.session.add(ProcessedReview(
+                review_id=review_id, product_id="p", user_id="u",
+                rating=5, comment="c", sentiment="POSITIVE"
+            ))
+            self.session.add(ProcessedReviewId(review_id=review_id))
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_seed_and_find_existing(self):
+        dedup = ReviewDeduplicator(lru_size=10, bloom_capacity=100, bloom_fp_rate=0.01)
+        self.assertEqual(dedup.seed(self.session), 2)
+        self.assertEqual(dedup.find_existing(self.session, ["rv_1", "rv_3"]), {"rv_1"})
+        # rv_1 is now in the LRU and resolves without a query.
+        self.assertIn("rv_1", dedup.recent)
+
+    def test_unseeded_ids_skip_the_database(self):
+        dedup = ReviewDeduplicator(lru_size=10, bloom_capacity=100, bloom_fp_rate=0.01)
+        # Without seeding, the Bloom filter reports every id as new.
+        self.assertEqual(dedup.find_existing(self.session, ["rv_1"]), set())
+
+    def test_mark_processed(self):
+        dedup = ReviewDeduplicator(lru_size=10, bloom_capacity=100, bloom_fp_rate=0.01)
+        dedup.mark_processed(["rv_9"])
+        self.assertEqual(dedup.find_existing(self.session, ["rv_9"]), {"rv_9"})
+
+
+if __name__ == '__main__':
+    unittest.main()
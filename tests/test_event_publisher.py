@@ -0,0 +1,163 @@
+import json
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import pika
+
+from src.async_consumer import PikaBroker
+from src.payloads import loads
+from src.publisher import ConfirmingEventPublisher, EventPublisher, PublishNackedError
+from src.retry import retry_or_reject
+
+
+class FakeImplChannel:
+    def __init__(self):
+        self.ack_nack_callback = None
+        self.select_ok = None
+
+    def confirm_delivery(self, ack_nack_callback, callback=None):
+        self.ack_nack_callback = ack_nack_callback
+        self.select_ok = callback
+
+
+class FakeBlockingChannel:
+    """
+    Mimics the parts of pika's BlockingChannel the confirming publisher uses.
+
+    `confirm` decides how the simulated broker answers: called with the list of
+    unconfirmed delivery tags whenever I/O is pumped, it returns
+    (method class, delivery_tag, multiple) frames to deliver.
+    """
+
+    def __init__(self, confirm):
+        self._impl = FakeImplChannel()
+        self.connection = MagicMock()
+        self.confirm = confirm
+        self.published = []
+        self.flushes = 0
+        self._confirmed_upto = 0
+
+    def exchange_declare(self, **kwargs):
+        pass
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        self.published.append(json.loads(body))
+
+    def _flush_output(self, *waiters):
+        self.flushes += 1
+        if self._impl.select_ok is not None:
+            callback, self._impl.select_ok = self._impl.select_ok, None
+            callback(SimpleNamespace(method=pika.spec.Confirm.SelectOk()))
+            return
+        pending = list(range(self._confirmed_upto + 1, len(self.published) + 1))
+        for method_class, tag, multiple in self.confirm(pending):
+            frame = SimpleNamespace(method=method_class(delivery_tag=tag, multiple=multiple))
+            self._impl.ack_nack_callback(frame)
+        if pending:
+            self._confirmed_upto = pending[-1]
+
+
+def events(*review_ids):
+    return [{"reviewId": review_id, "sentiment": "POSITIVE"} for review_id in review_ids]
+
+
+class TestConfirmingEventPublisher(unittest.TestCase):
+
+    def test_multiple_ack_confirms_pipelined_events(self):
+        channel = FakeBlockingChannel(lambda pending: [(pika.spec.Basic.Ack, pending[-1], True)] if pending else [])
+        publisher = ConfirmingEventPublisher(channel, window=10)
+
+        nacked = publisher.publish_many(events("rv_1", "rv_2", "rv_3"))
+
+        self.assertEqual(nacked, [])
+        self.assertEqual([e["reviewId"] for e in channel.published], ["rv_1", "rv_2", "rv_3"])
+        # One flush enables confirms, one collects all three confirms.
+        self.assertEqual(channel.flushes, 2)
+
+    def test_reports_nacked_events(self):
+        def confirm(pending):
+            return [(pika.spec.Basic.Nack if tag in (2, 5) else pika.spec.Basic.Ack, tag, False) for tag in pending]
+
+        publisher = ConfirmingEventPublisher(FakeBlockingChannel(confirm))
+
+        nacked = publisher.publish_many(events("rv_1", "rv_2", "rv_3"))
+
+        self.assertEqual(nacked, [1])
+        # Tag 4 is acked, tag 5 is not.
+        publisher.publish(events("rv_4")[0])
+        with self.assertRaises(PublishNackedError):
+            publisher.publish(events("rv_5")[0])
+
+    def test_window_bounds_unconfirmed_events(self):
+        outstanding_at_flush = []
+
+        def confirm(pending):
+            outstanding_at_flush.append(len(pending))
+            return [(pika.spec.Basic.Ack, tag, False) for tag in pending]
+
+        publisher = ConfirmingEventPublisher(FakeBlockingChannel(confirm), window=2)
+
+        self.assertEqual(publisher.publish_many(events(*[f"rv_{i}" for i in range(5)])), [])
+        self.assertLessEqual(max(outstanding_at_flush), 2)
+
+    def test_unconfirmed_events_time_out_as_nacked(self):
+        publisher = ConfirmingEventPublisher(FakeBlockingChannel(lambda pending: []), timeout=0.05)
+
+        with self.assertRaises(PublishNackedError):
+            publisher.publish(events("rv_1")[0])
+
+    def test_retry_publishes_do_not_shift_event_confirms(self):
+        connection = MagicMock()
+
+        def open_channel():
+            channel = FakeBlockingChannel(None)
+            # The broker numbers publishes per channel and nacks whichever one carries rv_2.
+            channel.confirm = lambda pending: [
+                (pika.spec.Basic.Nack if channel.published[tag - 1]["reviewId"] == "rv_2" else pika.spec.Basic.Ack,
+                 tag, False) for tag in pending
+            ]
+            channel.basic_qos = MagicMock()
+            channel.basic_consume = MagicMock()
+            channel.basic_ack = MagicMock()
+            return channel
+
+        connection.channel.side_effect = open_channel
+        broker = PikaBroker(lambda: connection, setup_queues=MagicMock(), queue_names=["product_reviews"],
+                            publisher_factory=lambda channel: ConfirmingEventPublisher(channel, timeout=0.05),
+                            prefetch_count=10, retry_queue="product_reviews")
+        broker._open()
+
+        retry_or_reject(broker.channel, 1, None, b'{"reviewId": "rv_0"}', ConnectionError("db down"),
+                        "product_reviews", delays=[1, 10])
+        self.assertEqual(broker.publisher.publish_many(events("rv_1", "rv_2", "rv_3")), [1])
+        retry_or_reject(broker.channel, 2, None, b'{"reviewId": "rv_9"}', ConnectionError("db down"),
+                        "product_reviews", delays=[1, 10])
+        self.assertEqual(broker.publisher.publish_many(events("rv_2", "rv_4")), [0])
+
+
+class TestEventEncoding(unittest.TestCase):
+
+    def test_compresses_events_above_threshold(self):
+        channel = MagicMock()
+        publisher = EventPublisher(channel, content_encoding='gzip', compress_min_bytes=200)
+        large = {"reviewId": "rv_big", "sentiment": "POSITIVE", "note": "x" * 500}
+
+        publisher.publish(events("rv_small")[0])
+        publisher.publish(large)
+
+        (small_call, large_call) = channel.basic_publish.call_args_list
+        self.assertIsNone(small_call.kwargs['properties'].content_encoding)
+        self.assertEqual(json.loads(small_call.kwargs['body']), events("rv_small")[0])
+        properties = large_call.kwargs['properties']
+        self.assertEqual((properties.content_type, properties.content_encoding), ('application/json', 'gzip'))
+        self.assertEqual(loads(large_call.kwargs['body'], properties.content_type, properties.content_encoding), large)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import json
+import logging
+import queue
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src import logs
+from src.logs import JsonFormatter
+
+
+class TestJsonLogging(unittest.TestCase):
+
+    def _record(self, msg, exc_info=None, **extra):
+        record = logging.LogRecord('src.consumer', logging.INFO, __file__, 1, msg, None, exc_info)
+        record.__dict__.update(extra)
+        return record
+
+    def test_messages_with_quotes_and_extras_are_valid_json(self):
+        record = self._record('Comment was "great"\nreally', review_id='r1', stage_ms={'commit': 1.5})
+
+        entry = json.loads(JsonFormatter().format(record))
+
+        self.assertEqual(entry['message'], 'Comment was "great"\nreally')
+        self.assertEqual(entry['level'], 'INFO')
+        self.assertEqual(entry['logger'], 'src.consumer')
+        self.assertEqual(entry['review_id'], 'r1')
+        self.assertEqual(entry['stage_ms'], {'commit': 1.5})
+        self.assertNotIn('args', entry)
+
+    def test_queued_records_keep_message_and_traceback(self):
+        records = queue.SimpleQueue()
+        handler = logs._DeferredQueueHandler(records)
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            record = logging.LogRecord('x', logging.ERROR, __file__, 1, 'failed %s', ('r1',), sys.exc_info())
+
+        handler.emit(record)
+        entry = json.loads(JsonFormatter().format(records.get_nowait()))
+
+        self.assertEqual(entry['message'], 'failed r1')
+        self.assertIn('ValueError: boom', entry['exc_info'])
+
+    def test_sampling(self):
+        with patch.object(logs, 'LOG_SAMPLE_RATE', 0.0):
+            self.assertFalse(any(logs.sampled() for _ in range(100)))
+        with patch.object(logs, 'LOG_SAMPLE_RATE', 1.0):
+            self.assertTrue(all(logs.sampled() for _ in range(100)))
+
+
+if __name__ == '__main__':
+    unittest.main()
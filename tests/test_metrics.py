@@ -0,0 +1,99 @@
+import socket
+import unittest
+import urllib.request
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src import metrics
+from src.metrics import Counter, Gauge, Histogram, MeteredChannel, Registry, start_metrics_server
+
+
+class TestPrometheusRendering(unittest.TestCase):
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = Registry()
+        histogram = Histogram('stage_seconds', 'Stage time.', labelnames=('stage',), buckets=(0.1, 1.0), registry=registry)
+        child = histogram.labels('decode')
+        for value in (0.05, 0.5, 5.0):
+            child.observe(value)
+
+        text = registry.render()
+        self.assertIn('# TYPE stage_seconds histogram', text)
+        self.assertIn('stage_seconds_bucket{stage="decode",le="0.1"} 1', text)
+        self.assertIn('stage_seconds_bucket{stage="decode",le="1.0"} 2', text)
+        self.assertIn('stage_seconds_bucket{stage="decode",le="+Inf"} 3', text)
+        self.assertIn('stage_seconds_count{stage="decode"} 3', text)
+        self.assertIn('stage_seconds_sum{stage="decode"} 5.55', text)
+
+    def test_counter_and_gauge(self):
+        registry = Registry()
+        counter = Counter('messages_total', 'Messages.', labelnames=('outcome',), registry=registry)
+        gauge = Gauge('in_flight', 'In flight.', registry=registry)
+        counter.labels('acked').inc(3)
+        gauge.set_function(lambda: 7)
+
+        text = registry.render()
+        self.assertIn('messages_total{outcome="acked"} 3', text)
+        self.assertIn('in_flight 7', text)
+
+
+class TestMeteredChannel(unittest.TestCase):
+
+    def test_counts_outcomes_and_in_flight(self):
+        raw = MagicMock()
+        channel = MeteredChannel(raw)
+        acked, dead_lettered = metrics.ACKED.value, metrics.DEAD_LETTERED.value
+        for tag in (1, 2, 3, 4):
+            channel.track(tag)
+        self.assertEqual(metrics.IN_FLIGHT.labels().get(), 4)
+
+        channel.basic_reject(delivery_tag=2, requeue=False)
+        channel.basic_ack(delivery_tag=3, multiple=True)
+
+        raw.basic_ack.assert_called_once_with(delivery_tag=3, multiple=True)
+        self.assertEqual(metrics.ACKED.value - acked, 2)
+        self.assertEqual(metrics.DEAD_LETTERED.value - dead_lettered, 1)
+        self.assertEqual(metrics.IN_FLIGHT.labels().get(), 1)
+        # Everything else passes through.
+        channel.basic_qos(prefetch_count=5)
+        raw.basic_qos.assert_called_once_with(prefetch_count=5)
+
+    def test_retried_deliveries_are_not_counted_as_acked(self):
+        from src.retry import retry_or_reject
+        from sqlalchemy.exc import OperationalError
+        raw = MagicMock()
+        channel = MeteredChannel(raw)
+        acked, retried = metrics.ACKED.value, metrics.RETRIED.value
+        channel.track(1)
+        self.assertTrue(retry_or_reject(channel, 1, None, b'{}', OperationalError('insert', {}, Exception('down')),
+                                        'product_reviews', delays=[1]))
+        raw.basic_ack.assert_called_once_with(delivery_tag=1)
+        self.assertEqual(metrics.ACKED.value - acked, 0)
+        self.assertEqual(metrics.RETRIED.value - retried, 1)
+        self.assertEqual(channel.unsettled, 0)
+
+
+class TestMetricsEndpoint(unittest.TestCase):
+
+    def test_serves_metrics(self):
+        with socket.socket() as sock:
+            sock.bind(('', 0))
+            port = sock.getsockname()[1]
+        registry = Registry()
+        Counter('served_total', 'Served.', registry=registry).inc()
+        server = start_metrics_server(port, registry)
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+                self.assertIn('text/plain', response.headers['Content-Type'])
+                self.assertIn('served_total 1', response.read().decode())
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
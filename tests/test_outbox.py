@@ -0,0 +1,89 @@
+import unittest
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from src.database import Base, OutboxEvent, add_outbox_events
+from src.outbox_relay import OutboxRelay
+
+
+class TestOutboxRelay(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(bind=engine)
+        session = self.Session()
+        add_outbox_events(session, [
+            {"reviewId": f"rv_{i}", "sentiment": "POSITIVE", "processedTimestamp": "2023-10-27T10:00:00"}
+            for i in range(5)
+        ])
+        session.commit()
+        session.close()
+        self.publisher = MagicMock()
+
+    def unsent_ids(self):
+        session = self.Session()
+        try:
+            return [row.review_id for row in session.execute(
+                select(OutboxEvent).where(OutboxEvent.sent_at.is_(None)).order_by(OutboxEvent.id)
+            ).scalars()]
+        finally:
+            session.close()
+
+    def test_relays_in_batches_and_marks_sent(self):
+        self.publisher.publish_many.return_value = []
+        relay = OutboxRelay(self.publisher, session_factory=self.Session, batch_size=3)
+
+        self.assertEqual(relay.relay_once(), 3)
+        self.assertEqual(relay.relay_once(), 2)
+        self.assertEqual(relay.relay_once(), 0)
+
+        batches = [[event["reviewId"] for event in call[0][0]] for call in self.publisher.publish_many.call_args_list]
+        self.assertEqual(batches, [["rv_0", "rv_1", "rv_2"], ["rv_3", "rv_4"]])
+        self.assertEqual(self.unsent_ids(), [])
+
+    def test_unpublished_events_stay_in_outbox(self):
+        self.publisher.publish_many.side_effect = lambda events: [
+            position for position, e in enumerate(events) if e["reviewId"] == "rv_1"
+        ]
+        relay = OutboxRelay(self.publisher, session_factory=self.Session, batch_size=10)
+
+        self.assertEqual(relay.relay_once(), 4)
+        self.assertEqual(self.unsent_ids(), ["rv_1"])
+
+    def test_publish_error_leaves_batch_unsent(self):
+        self.publisher.publish_many.side_effect = ConnectionError("broker down")
+        relay = OutboxRelay(self.publisher, session_factory=self.Session, batch_size=10)
+
+        self.assertEqual(relay.relay_once(), 0)
+        self.assertEqual(len(self.unsent_ids()), 5)
+
+    def test_reconnects_after_losing_the_broker(self):
+        self.publisher.publish_many.side_effect = ConnectionError("connection reset")
+        fresh = MagicMock()
+        fresh.publish_many.return_value = []
+        pauses = []
+
+        def sleep(seconds):
+            pauses.append(seconds)
+            if len(pauses) == 2:
+                raise KeyboardInterrupt
+
+        relay = OutboxRelay(self.publisher, session_factory=self.Session, batch_size=10,
+                            reconnect=lambda: (fresh, sleep))
+        with self.assertRaises(KeyboardInterrupt):
+            relay.run(sleep, poll_interval=0)
+
+        self.assertIs(relay.publisher, fresh)
+        self.assertEqual(self.unsent_ids(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
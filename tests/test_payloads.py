@@ -0,0 +1,68 @@
+import gzip
+import unittest
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src import payloads
+from src.payloads import MSGPACK, PayloadError, dumps, loads
+
+EVENT = {"reviewId": "rv_1", "sentiment": "POSITIVE", "comment": "Really solid build quality. " * 40}
+
+
+class TestPayloads(unittest.TestCase):
+
+    def test_json_is_the_default_and_gzip_round_trips(self):
+        body, encoding = dumps(EVENT)
+        self.assertIsNone(encoding)
+        self.assertEqual(loads(body), EVENT)
+        self.assertEqual(loads(body, 'application/json; charset=utf-8', 'identity'), EVENT)
+
+        compressed, encoding = dumps(EVENT, content_encoding='gzip')
+        self.assertEqual(encoding, 'gzip')
+        self.assertLess(len(compressed), len(body) / 4)
+        self.assertEqual(loads(compressed, None, 'gzip'), EVENT)
+
+    def test_small_bodies_are_not_compressed(self):
+        body, encoding = dumps({"reviewId": "rv_1"}, content_encoding='gzip', min_compress_bytes=512)
+        self.assertIsNone(encoding)
+        self.assertEqual(loads(body), {"reviewId": "rv_1"})
+
+    def test_rejects_unsupported_corrupt_and_oversized_bodies(self):
+        with self.assertRaisesRegex(PayloadError, "unsupported content_type 'text/plain'"):
+            loads(b'{}', 'text/plain')
+        with self.assertRaisesRegex(PayloadError, "unsupported content_encoding 'br'"):
+            loads(b'{}', None, 'br')
+        with self.assertRaisesRegex(PayloadError, "invalid gzip data"):
+            loads(b'not gzip', None, 'gzip')
+        with self.assertRaisesRegex(PayloadError, "truncated gzip data"):
+            loads(gzip.compress(b'{"a": 1}')[:-10], None, 'gzip')
+        # A small body that would inflate past the limit is refused without inflating it all.
+        bomb = gzip.compress(b' ' * 10000)
+        with self.assertRaisesRegex(PayloadError, "inflates to more than 1000 bytes"):
+            loads(bomb, None, 'gzip', limit=1000)
+
+    @unittest.skipUnless(payloads.msgpack, "msgpack is not installed")
+    def test_msgpack_round_trips(self):
+        body, _ = dumps(EVENT, MSGPACK)
+        self.assertEqual(loads(body, 'application/x-msgpack'), EVENT)
+
+    @unittest.skipUnless(payloads.zstandard, "zstandard is not installed")
+    def test_zstd_round_trips(self):
+        body, encoding = dumps(EVENT, content_encoding='zstd')
+        self.assertEqual(encoding, 'zstd')
+        self.assertEqual(loads(body, None, 'zstd'), EVENT)
+
+    def test_missing_library_is_reported(self):
+        if payloads.zstandard is None:
+            with self.assertRaisesRegex(PayloadError, "pip install zstandard"):
+                payloads.check_supported(None, 'zstd')
+        if payloads.msgpack is None:
+            with self.assertRaisesRegex(PayloadError, "pip install msgpack"):
+                payloads.check_supported(MSGPACK)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import pstats
+import signal
+import tempfile
+import threading
+import time
+import tracemalloc
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.profiling import Profiler, StackSampler
+
+
+def busy_scoring(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_sampled_session_writes_collapsed_stacks(self):
+        profiler = Profiler(self.tmp.name, mode='sample', messages=3, seconds=0, interval=0.001)
+        stop = threading.Event()
+        worker = threading.Thread(target=busy_scoring, args=(stop,), name='worker')
+        worker.start()
+        try:
+            self.assertTrue(profiler.start())
+            self.assertFalse(profiler.start())
+            time.sleep(0.05)
+            for _ in range(3):
+                profiler.message_done()
+        finally:
+            stop.set()
+            worker.join()
+
+        self.assertFalse(profiler.active)
+        [path] = [os.path.join(self.tmp.name, name) for name in os.listdir(self.tmp.name)]
+        self.assertTrue(path.endswith('.collapsed'))
+        with open(path) as f:
+            lines = f.read().splitlines()
+        stack, count = lines[0].rsplit(' ', 1)
+        self.assertTrue(stack.startswith('worker;'))
+        self.assertGreater(int(count), 0)
+        self.assertTrue(any('busy_scoring (test_profiling.py:' in line for line in lines))
+
+    def test_cprofile_session_with_allocations(self):
+        profiler = Profiler(self.tmp.name, mode='cprofile', messages=2, seconds=0, trace_allocations=True)
+        profiler.start()
+        profiler.message_done()  # cProfile starts at the delivery boundary
+        kept = []
+        for _ in range(2):
+            kept.append([str(i) for i in range(1000)])
+            profiler.message_done()
+
+        self.assertFalse(profiler.active)
+        self.assertFalse(tracemalloc.is_tracing())
+        names = sorted(os.listdir(self.tmp.name))
+        self.assertEqual([name.rsplit('.', 1)[1] for name in names], ['txt', 'pstats', 'tracemalloc', 'txt'])
+        stats = pstats.Stats(os.path.join(self.tmp.name, names[1]))
+        self.assertTrue(any(func[2] == 'message_done' for func in stats.stats))
+        with open(os.path.join(self.tmp.name, names[0])) as f:
+            self.assertIn('test_profiling.py', f.read())
+
+    def test_session_ends_after_its_time_limit(self):
+        profiler = Profiler(self.tmp.name, mode='sample', messages=0, seconds=0.05)
+        profiler.start()
+        self.assertTrue(profiler.active)
+        time.sleep(0.3)
+        self.assertFalse(profiler.active)
+        self.assertEqual(len(os.listdir(self.tmp.name)), 1)
+
+    def test_toggle_is_handled_by_the_control_thread(self):
+        profiler = Profiler(self.tmp.name, mode='sample', messages=0, seconds=0)
+        profiler.toggle()
+        self.assertFalse(profiler.active)  # only a request until the control thread runs
+        profiler.listen()
+        self.assertTrue(wait_for(lambda: profiler.active))
+        profiler.toggle()
+        self.assertTrue(wait_for(lambda: not profiler.active))
+        self.assertTrue(wait_for(lambda: len(os.listdir(self.tmp.name)) == 1))
+
+    def test_signal_during_stop_does_not_deadlock(self):
+        profiler = Profiler(self.tmp.name, mode='sample', messages=0, seconds=0)
+        previous = signal.signal(signal.SIGUSR2, profiler.toggle)
+        self.addCleanup(signal.signal, signal.SIGUSR2, previous)
+        profiler.listen()
+        write_collapsed = StackSampler.write_collapsed
+
+        def signalled_write(sampler, path):
+            # The handler runs on this (main) thread while stop() is still in progress.
+            os.kill(os.getpid(), signal.SIGUSR2)
+            time.sleep(0.05)
+            write_collapsed(sampler, path)
+
+        profiler.start()
+        with patch.object(StackSampler, 'write_collapsed', signalled_write):
+            paths = profiler.stop()
+            self.assertEqual(len(paths), 1)
+            # The signal started a new session once stop() had returned.
+            self.assertTrue(wait_for(lambda: profiler.active))
+        profiler.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import pika
+
+from src.replay import replay
+from src.retry import REJECT_REASON_HEADER, RETRY_HEADER
+
+
+def dead_lettered(tag, headers):
+    return MagicMock(delivery_tag=tag), pika.BasicProperties(
+        content_type='application/json', content_encoding='gzip', headers=headers), b'body'
+
+
+class TestReplay(unittest.TestCase):
+
+    def test_replays_to_lane_without_failure_headers(self):
+        channel = MagicMock()
+        channel.basic_get.side_effect = [
+            dead_lettered(1, {'x-death': [{}], RETRY_HEADER: 3, REJECT_REASON_HEADER: 'bad', 'trace': 't1'}),
+            dead_lettered(2, None),
+            (None, None, None),
+        ]
+
+        self.assertEqual(replay(channel, 'product_reviews.bulk'), 2)
+
+        first = channel.basic_publish.call_args_list[0].kwargs
+        self.assertEqual(first['routing_key'], 'product_reviews.bulk')
+        self.assertEqual(first['properties'].headers, {'trace': 't1'})
+        self.assertEqual(first['properties'].content_encoding, 'gzip')
+        self.assertIsNone(channel.basic_publish.call_args_list[1].kwargs['properties'].headers)
+        self.assertEqual([c.kwargs['delivery_tag'] for c in channel.basic_ack.call_args_list], [1, 2])
+
+    def test_stops_and_requeues_when_republish_fails(self):
+        channel = MagicMock()
+        channel.basic_get.side_effect = [dead_lettered(1, None), dead_lettered(2, None)]
+        channel.basic_publish.side_effect = pika.exceptions.UnroutableError([])
+
+        self.assertEqual(replay(channel, 'product_reviews', limit=5), 0)
+
+        channel.basic_nack.assert_called_once_with(delivery_tag=1, requeue=True)
+        channel.basic_ack.assert_not_called()
+        self.assertEqual(channel.basic_get.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+from unittest.mock import MagicMock
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import pika
+from sqlalchemy.exc import DataError, OperationalError
+
+from src.retry import REJECT_REASON_HEADER, RETRY_HEADER, dead_letter, is_transient, retry_or_reject, setup_retry_queues
+
+DELAYS = [1, 10, 60]
+
+
+def properties(retries=None):
+    headers = {RETRY_HEADER: retries} if retries is not None else None
+    return pika.BasicProperties(content_type='application/json', headers=headers)
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.channel = MagicMock()
+
+    def test_classifies_errors(self):
+        self.assertTrue(is_transient(OperationalError("SELECT 1", {}, Exception("server closed the connection"))))
+        self.assertTrue(is_transient(ConnectionResetError()))
+        self.assertFalse(is_transient(DataError("INSERT", {}, Exception("value too long"))))
+        self.assertFalse(is_transient(KeyError('comment')))
+
+    def test_transient_error_moves_to_next_tier(self):
+        error = OperationalError("INSERT", {}, Exception("could not connect"))
+
+        self.assertTrue(retry_or_reject(self.channel, 7, properties(1), b'{}', error, 'product_reviews', DELAYS))
+
+        kwargs = self.channel.basic_publish.call_args.kwargs
+        self.assertEqual(kwargs['exchange'], '')
+        self.assertEqual(kwargs['routing_key'], 'product_reviews.retry.10s')
+        self.assertEqual(kwargs['body'], b'{}')
+        self.assertEqual(kwargs['properties'].headers[RETRY_HEADER], 2)
+        self.assertEqual(kwargs['properties'].delivery_mode, 2)
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=7)
+        self.channel.basic_reject.assert_not_called()
+
+    def test_permanent_or_exhausted_goes_to_dlq(self):
+        transient = ConnectionResetError()
+        self.assertFalse(retry_or_reject(self.channel, 1, properties(), b'{}', ValueError("bad"), 'q', DELAYS))
+        self.assertFalse(retry_or_reject(self.channel, 2, properties(3), b'{}', transient, 'q', DELAYS))
+
+        self.channel.basic_publish.assert_not_called()
+        self.channel.basic_reject.assert_any_call(delivery_tag=1, requeue=False)
+        self.channel.basic_reject.assert_any_call(delivery_tag=2, requeue=False)
+
+    def test_dead_letter_records_reason(self):
+        dead_letter(self.channel, 4, properties(1), b'{"rating": 9}', "rating out of range", 'dlx')
+
+        kwargs = self.channel.basic_publish.call_args.kwargs
+        self.assertEqual((kwargs['exchange'], kwargs['routing_key']), ('dlx', 'dead_letter'))
+        self.assertEqual(kwargs['properties'].headers[REJECT_REASON_HEADER], "rating out of range")
+        self.assertEqual(kwargs['properties'].headers[RETRY_HEADER], 1)
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=4)
+
+        self.channel.reset_mock()
+        self.channel.basic_publish.side_effect = ConnectionResetError()
+        dead_letter(self.channel, 5, None, b'x', "invalid JSON", 'dlx')
+        self.channel.basic_reject.assert_called_once_with(delivery_tag=5, requeue=False)
+        self.channel.basic_ack.assert_not_called()
+
+    def test_retry_queues_dead_letter_back_to_source(self):
+        setup_retry_queues(self.channel, 'product_reviews', DELAYS)
+
+        declared = {call.kwargs['queue']: call.kwargs['arguments'] for call in self.channel.queue_declare.call_args_list}
+        self.assertEqual(declared['product_reviews.retry.60s'], {
+            'x-message-ttl': 60000,
+            'x-dead-letter-exchange': '',
+            'x-dead-letter-routing-key': 'product_reviews',
+        })
+        self.assertEqual(len(declared), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import create_engine, delete, select
+from sqlalchemy.orm import sessionmaker
+
+from src.database import (Base, ProductSentimentRollup, bulk_insert_reviews, get_product_stats,
+                          increment_product_rollups, rebuild_product_rollups)
+
+
+def row(review_id, product_id, sentiment, rating):
+    return {'review_id': review_id, 'product_id': product_id, 'user_id': 'user_1', 'rating': rating,
+            'comment': 'x', 'sentiment': sentiment}
+
+
+class TestProductRollups(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(bind=engine)
+        self.session = sessionmaker(bind=engine)()
+        self.addCleanup(self.session.close)
+
+    def insert(self, rows):
+        inserted = bulk_insert_reviews(self.session, rows)
+        increment_product_rollups(self.session, [r for r in rows if r['review_id'] in inserted])
+        self.session.commit()
+
+    def test_increments_per_product(self):
+        self.insert([row('rv_1', 'prod_a', 'POSITIVE', 5), row('rv_2', 'prod_a', 'NEGATIVE', 1),
+                     row('rv_3', 'prod_b', 'NEUTRAL', 3)])
+        # rv_1 is a redelivery and must not be counted again.
+        self.insert([row('rv_1', 'prod_a', 'POSITIVE', 5), row('rv_4', 'prod_a', 'POSITIVE', 3)])
+
+        stats = get_product_stats(self.session, 'prod_a')
+        self.assertEqual((stats['positive'], stats['negative'], stats['neutral'], stats['total']), (2, 1, 0, 3))
+        self.assertAlmostEqual(stats['average_rating'], 3.0)
+        self.assertEqual(get_product_stats(self.session, 'prod_b')['total'], 1)
+        self.assertIsNone(get_product_stats(self.session, 'prod_missing'))
+
+    def test_rebuild_matches_incremental_counts(self):
+        self.insert([row(f'rv_{i}', f'prod_{i % 3}', ('POSITIVE', 'NEGATIVE', 'NEUTRAL')[i % 2], i % 5 + 1)
+                     for i in range(20)])
+        incremental = {p: get_product_stats(self.session, p) for p in ('prod_0', 'prod_1', 'prod_2')}
+        self.session.execute(delete(ProductSentimentRollup))
+        self.session.commit()
+
+        self.assertEqual(rebuild_product_rollups(self.session), 3)
+        self.session.commit()
+
+        for product_id, expected in incremental.items():
+            rebuilt = get_product_stats(self.session, product_id)
+            for key in ('positive', 'negative', 'neutral', 'total', 'average_rating'):
+                self.assertEqual(rebuilt[key], expected[key])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import json
+import unittest
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from src.schema import InvalidMessage, ReviewMessage
+
+
+def body(**overrides):
+    payload = {
+        "reviewId": "rv_1",
+        "productId": "prod_1",
+        "userId": "user_1",
+        "rating": 4,
+        "comment": "Works well",
+        "timestamp": "2023-10-27T10:00:00Z",
+    }
+    payload.update(overrides)
+    return json.dumps({k: v for k, v in payload.items() if v is not None}).encode('utf-8')
+
+
+class TestReviewMessage(unittest.TestCase):
+
+    def assert_invalid(self, raw, reason):
+        with self.assertRaises(InvalidMessage) as raised:
+            ReviewMessage.decode(raw)
+        self.assertIn(reason, raised.exception.reason)
+        return raised.exception
+
+    def test_decodes_valid_review_into_row(self):
+        review = ReviewMessage.decode(body())
+
+        self.assertFalse(hasattr(review, '__dict__'))
+        self.assertEqual(review.timestamp, "2023-10-27T10:00:00Z")
+        self.assertEqual(review.row('POSITIVE', None), {
+            'review_id': "rv_1", 'product_id': "prod_1", 'user_id': "user_1", 'rating': 4,
+            'comment': "Works well", 'sentiment': 'POSITIVE', 'processed_timestamp': None,
+        })
+
+    def test_rejects_with_precise_reason(self):
+        self.assert_invalid(b"not json", "invalid JSON")
+        self.assert_invalid(b"[1, 2]", "payload is not a JSON object")
+        self.assert_invalid(body(userId=None, comment=""), "missing fields ['userId', 'comment']")
+        self.assert_invalid(body(productId=123), "productId must be a string")
+        self.assert_invalid(body(reviewId="r" * 256), "reviewId must be a string of at most 255 characters")
+        self.assert_invalid(body(rating="5"), "rating must be an integer from 1 to 5, got '5'")
+        self.assert_invalid(body(rating=True), "rating must be an integer")
+        error = self.assert_invalid(body(rating=0), "got 0")
+        self.assertEqual(error.review_id, "rv_1")
+        self.assert_invalid(body(comment=["list"]), "comment must be a string")
+        self.assert_invalid(body(comment="x" * 10001), "comment is 10001 characters, more than 10000")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,17 @@
 import unittest
+from unittest.mock import patch
 import sys
 import os
+import tempfile
+import json
+import re
+import time
 
 # Add src to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from src.sentiment import analyze_sentiment
+from src.sentiment import analyze_sentiment, analyze_sentiment_batch, SentimentCache, normalize_text
+import src.sentiment
 
 class TestSentimentAnalysis(unittest.TestCase):
 
@@ -28,5 +34,196 @@ class TestSentimentAnalysis(unittest.TestCase):
         result = analyze_sentiment("")
         self.assertEqual(result, 'NEUTRAL')
 
+    def test_warm_up_reports_duration(self):
+        self.assertGreaterEqual(src.sentiment.warm_up(vectorized=True), 0.0)
+
+class TestSentimentCache(unittest.TestCase):
+
+    def test_repeated_comment_is_memoized(self):
+        cache = SentimentCache(max_size=10)
+        with patch.object(src.sentiment, 'sentiment_cache', cache), \
+                patch.object(src.sentiment, '_classify', wraps=src.sentiment._classify) as classify:
+            self.assertEqual(analyze_sentiment("Great!"), 'POSITIVE')
+            self.assertEqual(analyze_sentiment("  Great!  "), 'POSITIVE')
+            self.assertEqual(classify.call_count, 1)
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1})
+
+    def test_size_bound_evicts_oldest(self):
+        cache = SentimentCache(max_size=2)
+        for key in ("a", "b", "c"):
+            cache.put(key, 'NEUTRAL')
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("c"), 'NEUTRAL')
+        self.assertEqual(cache.evictions, 1)
+
+    def test_ttl_expires_entries(self):
+        cache = SentimentCache(max_size=10, ttl=60)
+        cache.put("old", 'POSITIVE', stored_at=0)
+        self.assertIsNone(cache.get("old"))
+        self.assertEqual(cache.evictions, 1)
+
+    def test_snapshot_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sentiment_cache.json")
+            cache = SentimentCache(max_size=10, snapshot_path=path)
+            key = SentimentCache.make_key(normalize_text("Works as expected"))
+            cache.put(key, 'NEUTRAL')
+            cache.save_snapshot()
+
+            restored = SentimentCache(max_size=10, snapshot_path=path)
+            self.assertEqual(restored.load_snapshot(), 1)
+            self.assertEqual(restored.get(key), 'NEUTRAL')
+
+    def test_snapshots_are_written_off_the_message_path(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sentiment_cache.json")
+            cache = SentimentCache(max_size=10, snapshot_path=path, snapshot_interval=0.05)
+            with patch.object(cache, 'save_snapshot', wraps=cache.save_snapshot) as save:
+                cache.put("a", 'POSITIVE')
+                save.assert_not_called()
+                cache.start_snapshots()
+                for _ in range(100):
+                    if os.path.exists(path):
+                        break
+                    time.sleep(0.01)
+                cache.put("b", 'NEGATIVE')
+                cache.stop_snapshots()
+            self.assertTrue(save.call_count >= 2)
+            restored = SentimentCache(max_size=10, snapshot_path=path)
+            self.assertEqual(restored.load_snapshot(), 2)
+
+
+# Review-like texts exercising the PatternAnalyzer rules the batch engine mirrors:
+# modifiers, negation, "!" boosts, emoticons, contractions and abbreviations.
+PARITY_CORPUS = [
+    "This product is amazing! I love it.",
+    "Great!",
+    "Works as expected",
+    "Terrible quality, broke after two days.",
+    "Not good.",
+    "not bad at all :)",
+    "Really not good",
+    "very very good!!",
+    "It is a product.",
+    "I don't like it, but it's cheap.",
+    "Absolutely fantastic service, highly recommended!!!",
+    "Worst purchase ever :(",
+    "The color is nice but the size is wrong.",
+    "Never buying this again.",
+    "It's okay... not great, not terrible.",
+    "Mr. Smith said it was awful; I think it's fine.",
+    "Fast shipping (!) and a \u201cperfect\u201d fit",
+    "SUPER HAPPY with this!",
+    "meh",
+    "It broke. Disappointing.\n\nCustomer support was helpful though.",
+    "e.g. the battery life is really short",
+    "5/5 would buy again <3",
+    "Quite expensive for what it is.",
+    "",
+]
+
+
+def load_parity_corpus():
+    """The fixed corpus plus every sentence in requests.jsonl when it is present."""
+    corpus = list(PARITY_CORPUS)
+    path = os.path.join(os.path.dirname(__file__), '..', 'requests.jsonl')
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                request = json.loads(line)
+                corpus.append(request['title'])
+                corpus.extend(s for s in re.split(r'(?<=[.!?])\s+', request['body']) if s)
+    return corpus
+
+
+class TestSentimentBatch(unittest.TestCase):
+
+    def test_matches_textblob(self):
+        # Against TextBlob itself, not analyze_sentiment, which goes through the cascade and the cache.
+        corpus = load_parity_corpus()
+        expected = [src.sentiment._label(src.sentiment._textblob_polarity(text)) for text in corpus]
+        actual = analyze_sentiment_batch(corpus)
+        agreement = sum(a == b for a, b in zip(expected, actual)) / len(corpus)
+        self.assertGreaterEqual(agreement, 0.99)
+
+    def test_empty_batch_and_empty_text(self):
+        self.assertEqual(analyze_sentiment_batch([]), [])
+        self.assertEqual(analyze_sentiment_batch(["", "Great!"]), ['NEUTRAL', 'POSITIVE'])
+
+    def test_compiled_lexicon_round_trip(self):
+        from src.lexicon import CompiledLexicon, get_lexicon
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "lexicon.npz")
+            get_lexicon().save(path)
+            restored = CompiledLexicon.load(path)
+        texts = ["not bad at all :)", "very very good!!"]
+        self.assertEqual(list(restored.polarity_batch(texts)), list(get_lexicon().polarity_batch(texts)))
+
+    def test_get_lexicon_prefers_prebuilt_file(self):
+        import src.lexicon
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "lexicon.npz")
+            src.lexicon.get_lexicon().save(path)
+            with patch.object(src.lexicon, 'SENTIMENT_LEXICON_PATH', path), \
+                    patch.object(src.lexicon, '_lexicon', None), \
+                    patch.object(src.lexicon.CompiledLexicon, 'from_textblob') as compile_lexicon:
+                lexicon = src.lexicon.get_lexicon()
+                compile_lexicon.assert_not_called()
+        self.assertEqual(lexicon.words, src.lexicon.get_lexicon().words)
+
+
+class TestSentimentCascade(unittest.TestCase):
+
+    def classify(self, text, margin=0.05, audit_rate=0.0):
+        with patch.object(src.sentiment, 'SENTIMENT_CASCADE', True), \
+                patch.object(src.sentiment, 'SENTIMENT_CASCADE_MARGIN', margin), \
+                patch.object(src.sentiment, 'SENTIMENT_CASCADE_AUDIT_RATE', audit_rate), \
+                patch.object(src.sentiment, '_textblob_polarity', wraps=src.sentiment._textblob_polarity) as textblob:
+            return src.sentiment._classify(text), textblob.call_count
+
+    def test_polarized_comments_skip_textblob(self):
+        lexicon_tier = src.sentiment._LEXICON_TIER.value
+        self.assertEqual(self.classify("Amazing product, I love it!"), ('POSITIVE', 0))
+        self.assertEqual(self.classify("Terrible. Worst purchase ever."), ('NEGATIVE', 0))
+        self.assertEqual(src.sentiment._LEXICON_TIER.value - lexicon_tier, 2)
+
+    def test_borderline_comments_escalate(self):
+        # A margin wider than any score's distance to the thresholds sends everything to TextBlob.
+        self.assertEqual(self.classify("Amazing product, I love it!", margin=2.0), ('POSITIVE', 1))
+
+    def test_sampled_audit_against_textblob(self):
+        agreed = src.sentiment._AUDIT_AGREE.value
+        self.assertEqual(self.classify("Amazing product, I love it!", audit_rate=1.0), ('POSITIVE', 1))
+        self.assertEqual(src.sentiment._AUDIT_AGREE.value - agreed, 1)
+
+    def test_quick_polarity_tracks_batch_scores(self):
+        from src.lexicon import get_lexicon
+        corpus = [normalize_text(text) for text in load_parity_corpus()]
+        exact = get_lexicon().polarity_batch(corpus)
+        quick = [get_lexicon().quick_polarity(text) for text in corpus]
+        close = sum(abs(a - b) < 1e-9 for a, b in zip(exact, quick)) / len(corpus)
+        # Measured: identical on this corpus, and ~99% identical on the synthetic benchmark corpus.
+        self.assertGreaterEqual(close, 0.99)
+
+    def test_contractions_and_glued_emoticons_match_textblob(self):
+        # Lexicon entries like "isn't" never match in TextBlob, which splits them into "is", "n", "'", "t".
+        comments = [
+            "Isn't worth it",
+            "It isn't good",
+            "The strap isn't comfortable",
+            "I don't love it :)",
+            "Wouldn't recommend; doesn't fit and can't be returned",
+            "It's not bad, it's great!",
+            "You won't regret it, they're lovely",
+            "I'm happy with it:)",
+            "Shouldn't have bought it:(",
+            "Didn't work... 'excellent' support though",
+        ]
+        for text in comments:
+            with self.subTest(text=text):
+                label, _ = self.classify(text)
+                self.assertEqual(label, src.sentiment._label(src.sentiment._textblob_polarity(text)))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,139 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import sys
+import os
+
+# Add project root to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import pika
+
+import src.supervisor
+from src.supervisor import Supervisor, retire_shard_queues, worker_queues
+
+
+class FakeContext:
+    """Stands in for a multiprocessing context; processes are MagicMocks that report alive."""
+
+    def __init__(self):
+        self.created = []
+
+    def Process(self, target, args, name):
+        process = MagicMock()
+        process.is_alive.return_value = True
+        process.exitcode = None
+        process.args = args
+        self.created.append(process)
+        return process
+
+
+class FakeBroker:
+    """In-memory queues behind a connection stand-in, enough for retire_shard_queues."""
+
+    def __init__(self, queues):
+        self.queues = {name: list(messages) for name, messages in queues.items()}
+        self.unbound = []
+
+    def channel(self):
+        return FakeChannel(self)
+
+
+class FakeChannel:
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.is_open = True
+
+    def queue_declare(self, queue, passive=False):
+        if queue not in self.broker.queues:
+            self.is_open = False
+            raise pika.exceptions.ChannelClosedByBroker(404, f"NOT_FOUND - no queue '{queue}'")
+        return MagicMock(method=MagicMock(message_count=len(self.broker.queues[queue])))
+
+    def queue_unbind(self, queue, exchange, routing_key):
+        self.broker.unbound.append(queue)
+
+    def confirm_delivery(self):
+        pass
+
+    def basic_get(self, queue, auto_ack=False):
+        if not self.broker.queues[queue]:
+            return None, None, None
+        return MagicMock(delivery_tag=1), pika.BasicProperties(), self.broker.queues[queue].pop(0)
+
+    def basic_publish(self, exchange, routing_key, body, properties, mandatory=False):
+        self.broker.queues[routing_key].append(body)
+
+    def basic_ack(self, delivery_tag):
+        pass
+
+    def queue_delete(self, queue, if_empty=False):
+        self.broker.queues.pop(queue, None)
+
+    def close(self):
+        self.is_open = False
+
+
+class TestSupervisor(unittest.TestCase):
+
+    def setUp(self):
+        self.context = FakeContext()
+        self.supervisor = Supervisor(workers=2, sharded=True, target=MagicMock(), context=self.context)
+        for index in range(2):
+            self.supervisor.spawn(index)
+
+    def crash(self, index):
+        process = self.supervisor.processes[index]
+        process.is_alive.return_value = False
+        process.exitcode = 1
+
+    def test_worker_queues(self):
+        self.assertEqual(worker_queues(1, sharded=True), ["product_reviews.shard.1", "product_reviews"])
+        self.assertEqual(worker_queues(1, sharded=False), ["product_reviews"])
+        # Each worker gets its own shard queue.
+        self.assertEqual(self.context.created[1].args[2], ["product_reviews.shard.1", "product_reviews"])
+
+    def test_crashed_worker_is_restarted(self):
+        self.crash(0)
+        with patch.object(src.supervisor.time, 'monotonic', return_value=self.supervisor.started_at[0] + 120):
+            self.assertEqual(self.supervisor.check_workers(), 1)
+        self.assertEqual(len(self.context.created), 3)
+        self.assertIs(self.supervisor.processes[0], self.context.created[2])
+
+    def test_crash_loop_backs_off(self):
+        start = self.supervisor.started_at[0]
+        self.crash(0)
+        with patch.object(src.supervisor.time, 'monotonic', return_value=start + 1):
+            self.assertEqual(self.supervisor.check_workers(), 0)  # first quick failure: 1s delay
+        with patch.object(src.supervisor.time, 'monotonic', return_value=start + 2):
+            self.assertEqual(self.supervisor.check_workers(), 1)
+
+    def test_retires_shard_queues_beyond_worker_count(self):
+        broker = FakeBroker({
+            'product_reviews': [],
+            'product_reviews.shard.0': [b'kept'],
+            'product_reviews.shard.1': [b'a', b'b'],
+            'product_reviews.shard.1.retry.1s': [],
+            'product_reviews.shard.2': [],
+            'product_reviews.shard.2.retry.10s': [b'waiting'],
+        })
+
+        self.assertEqual(retire_shard_queues(broker, first=1), 2)
+
+        self.assertEqual(broker.unbound, ['product_reviews.shard.1', 'product_reviews.shard.2'])
+        self.assertEqual(broker.queues['product_reviews'], [b'a', b'b'])
+        self.assertEqual(broker.queues['product_reviews.shard.0'], [b'kept'])
+        self.assertNotIn('product_reviews.shard.1', broker.queues)
+        self.assertNotIn('product_reviews.shard.1.retry.1s', broker.queues)
+        # Retries still return to shard 2, so it stays until they are done.
+        self.assertIn('product_reviews.shard.2', broker.queues)
+
+    def test_shutdown_terminates_workers(self):
+        self.supervisor.shutdown(timeout=0)
+        for process in self.context.created:
+            process.terminate.assert_called_once()
+            process.join.assert_called_once_with(0)
+
+
+if __name__ == '__main__':
+    unittest.main()